@@ -0,0 +1,137 @@
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+from src.logs import get_logger
+from src.utils import get_margin_account_kucoin
+
+log = get_logger(__name__)
+
+# Состояние счетов перед сделкой.
+# BalanceLedger держит в памяти свободные балансы каждой биржи, чтобы
+# исполнители определяли объём ордера без запроса баланса на пути сделки.
+# Где есть приватный WebSocket-поток (ccxt.pro watch_balance), баланс
+# обновляется по событиям; пока поток не подключен или оборвался, и для бирж
+# без потока (маржинальный счет KuCoin) баланс периодически опрашивается по
+# REST. После ордера исполнитель списывает потраченное сразу и просит
+# внеочередное обновление. Устаревший баланс ledger не отдает (None) -
+# тогда исполнитель запрашивает его сам, как раньше.
+
+STREAM_VENUES = ('okx', 'bitget', 'mexc', 'gate')
+
+
+def free_balances(balance: dict) -> Dict[str, float]:
+    """Свободные остатки по валютам из баланса ccxt"""
+    return {
+        currency: float(entry.get('free') or 0.0)
+        for currency, entry in balance.items()
+        if isinstance(entry, dict) and currency not in ('info', 'free', 'used', 'total')
+    }
+
+
+class BalanceLedger:
+    def __init__(self, get_exchange, get_session, get_stream_client: Callable, venues: Iterable[str],
+                 streaming: Iterable[str] = STREAM_VENUES, poll_interval: float = 30.0, max_age: float = 90.0,
+                 retry_delay: float = 5.0):
+        self.get_exchange = get_exchange
+        self.get_session = get_session
+        self.get_stream_client = get_stream_client  # биржа -> клиент ccxt.pro
+        self.venues = list(venues)
+        self.streaming = [venue for venue in self.venues if venue in streaming]
+        self.poll_interval = poll_interval
+        self.max_age = max_age  # сколько секунд доверять REST-снимку
+        self.retry_delay = retry_delay
+        self.balances: Dict[str, Dict[str, float]] = {}
+        self.updated_at: Dict[str, float] = {}
+        self.connected: Dict[str, bool] = {}  # поток присылает обновления
+        self.wakeups: Dict[str, asyncio.Event] = {}
+        self.tasks = []
+
+    def free(self, venue: str, currency: str) -> Optional[float]:
+        """Свободный остаток; None, если баланса биржи нет или он устарел"""
+        if venue not in self.balances:
+            return None
+        if not self.connected.get(venue) and time.monotonic() - self.updated_at[venue] > self.max_age:
+            return None
+        return self.balances[venue].get(currency, 0.0)
+
+    def debit(self, venue: str, currency: str, amount: float):
+        """Списать потраченное до прихода обновления с биржи"""
+        balances = self.balances.get(venue)
+        if balances is not None and amount:
+            balances[currency] = max(0.0, balances.get(currency, 0.0) - amount)
+
+    def refresh_soon(self, venue: str):
+        """Внеочередное обновление после ордера (для бирж без живого потока)"""
+        event = self.wakeups.get(venue)
+        if event is not None:
+            event.set()
+
+    def _update(self, venue: str, values: Dict[str, float], merge: bool = False):
+        if merge and venue in self.balances:
+            self.balances[venue].update(values)  # поток присылает только изменившиеся валюты
+        else:
+            self.balances[venue] = dict(values)
+        self.updated_at[venue] = time.monotonic()
+
+    async def fetch(self, venue: str) -> Dict[str, float]:
+        exchange = self.get_exchange(venue)
+        if venue == 'kucoin':
+            # KuCoin торгует с маржинального (cross) счета
+            account = await get_margin_account_kucoin(self.get_session(venue), exchange.apiKey,
+                                                      exchange.secret, exchange.password)
+            if account is None:
+                raise ValueError("маржинальный аккаунт не получен")
+            return {a['currency']: float(a['availableBalance']) for a in account['accounts']}
+        return free_balances(await exchange.fetch_balance())
+
+    async def refresh(self, venue: str):
+        self._update(venue, await self.fetch(venue))
+
+    async def _poll(self, venue: str):
+        event = self.wakeups[venue]
+        while True:
+            event.clear()
+            if not self.connected.get(venue):
+                try:
+                    await self.refresh(venue)
+                except Exception as e:
+                    log.warning(f"{venue.upper()} - ⚠️ Не удалось обновить баланс: {e}")
+            try:
+                await asyncio.wait_for(event.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _stream(self, venue: str):
+        while True:
+            try:
+                client = self.get_stream_client(venue)
+                balance = await client.watch_balance()
+                if not self.connected.get(venue):
+                    log.info(f"{venue.upper()} - 🔌 Баланс обновляется по WebSocket")
+                self.connected[venue] = True
+                self._update(venue, free_balances(balance), merge=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected.get(venue):
+                    log.warning(f"{venue.upper()} - ⚠️ Поток баланса прерван, опрос по REST: {e}")
+                self.connected[venue] = False
+                self.refresh_soon(venue)
+                await asyncio.sleep(self.retry_delay)
+
+    def start(self):
+        if self.tasks:
+            return
+        for venue in self.venues:
+            self.wakeups[venue] = asyncio.Event()
+            self.tasks.append(asyncio.create_task(self._poll(venue)))
+        for venue in self.streaming:
+            self.tasks.append(asyncio.create_task(self._stream(venue)))
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
@@ -0,0 +1,354 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import re
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.fixtures import build_exchanges, build_sessions, load_fixture
+from src.logs import setup_logging
+from src.signals import parse_message
+from src.utils import calculate_average_buy_price, calculate_average_sell_price
+
+# Бенчмарк горячих путей на записанных фикстурах (benchmarks/fixtures/*.json):
+# расчет цен по стакану, разбор сигнала, validate_arbitrage и execute_trades
+# на FixtureExchange/FixtureSession без сети. Печатает пропускную способность
+# и задержки (p50/p95/p99) и сравнивает p50 с сохраненным baseline.
+#
+#   python src/bench.py                      # прогон и сравнение с baseline
+#   python src/bench.py --save-baseline      # записать новый baseline
+#   python src/bench.py record PENGU/USDT okx gate   # записать фикстуру с живых бирж
+#   python src/bench.py parse                # микробенчмарк разбора сообщений из logs/xyz415.log
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT, 'benchmarks', 'fixtures')
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+LOG_PATH = os.path.join(ROOT, 'logs', 'xyz415.log')
+
+
+def percentile(values: List[int], p: float) -> int:
+    return values[min(len(values) - 1, max(0, -(-len(values) * p // 100) - 1))]
+
+
+def summarize(durations_ns: List[int], wall_ns: int) -> dict:
+    values = sorted(durations_ns)
+    return {
+        'iterations': len(values),
+        'ops_per_sec': round(len(values) / (wall_ns / 1e9), 1),
+        'mean_us': round(sum(values) / len(values) / 1e3, 2),
+        'p50_us': round(percentile(values, 50) / 1e3, 2),
+        'p95_us': round(percentile(values, 95) / 1e3, 2),
+        'p99_us': round(percentile(values, 99) / 1e3, 2),
+    }
+
+
+def best(rounds: List[dict]) -> dict:
+    """Лучший из повторных прогонов по p50 - меньше шума от GC и планировщика"""
+    return min(rounds, key=lambda stats: stats['p50_us'])
+
+
+def run_sync(func: Callable, iterations: int, repeats: int = 3) -> dict:
+    rounds = []
+    for _ in range(repeats):
+        durations = []
+        started = time.perf_counter_ns()
+        for _ in range(iterations):
+            t0 = time.perf_counter_ns()
+            func()
+            durations.append(time.perf_counter_ns() - t0)
+        rounds.append(summarize(durations, time.perf_counter_ns() - started))
+    return best(rounds)
+
+
+async def run_async(func: Callable, iterations: int, repeats: int = 3) -> dict:
+    rounds = []
+    for _ in range(repeats):
+        durations = []
+        started = time.perf_counter_ns()
+        for _ in range(iterations):
+            t0 = time.perf_counter_ns()
+            await func()
+            durations.append(time.perf_counter_ns() - t0)
+        rounds.append(summarize(durations, time.perf_counter_ns() - started))
+    return best(rounds)
+
+
+def make_bot(fixture: dict, snapshot_dir: str):
+    """ArbitrageBot на клиентах и HTTP-сессиях фикстуры, без Telegram и WebSocket"""
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    from xyz415 import ArbitrageBot
+
+    bot = ArbitrageBot(client=TelegramClient(StringSession(), 1, 'benchmark'))
+    bot.deposit = fixture.get('deposit', bot.deposit)
+    bot.exchanges.update(build_exchanges(fixture))
+    bot.http.sessions.update(build_sessions(fixture))
+    bot.order_books.enabled = False
+    bot.markets.snapshot_path = os.path.join(snapshot_dir, 'markets_snapshot.json.gz')
+    bot.journal.path = os.path.join(snapshot_dir, 'trades.db')  # запись журнала входит в замер
+    return bot
+
+
+async def bench_fixture(fixture: dict, iterations: int, async_iterations: int, repeats: int = 3) -> Dict[str, dict]:
+    symbol = fixture['symbol']
+    buy_exchange, sell_exchange = fixture['buy_exchange'], fixture['sell_exchange']
+    deposit = fixture.get('deposit', 10)
+    buy_book = fixture['exchanges'][buy_exchange]['order_books'][symbol]
+    sell_book = fixture['exchanges'][sell_exchange]['order_books'][symbol]
+    signals = fixture.get('signals', [])
+
+    def parse():
+        for text in signals:
+            parse_message(text)
+
+    results = {
+        'buy_price': run_sync(lambda: calculate_average_buy_price(deposit, symbol, buy_book), iterations, repeats),
+        'sell_price': run_sync(lambda: calculate_average_sell_price(deposit, symbol, sell_book), iterations, repeats),
+    }
+    if signals:
+        results['parse'] = run_sync(parse, iterations, repeats)
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        bot = make_bot(fixture, snapshot_dir)
+        try:
+            buy_price, sell_price = await bot.calculate_prices(symbol, buy_exchange, sell_exchange)
+            results['calculate_prices'] = await run_async(
+                lambda: bot.calculate_prices(symbol, buy_exchange, sell_exchange), async_iterations, repeats)
+            results['validate_arbitrage'] = await run_async(
+                lambda: bot.validate_arbitrage(symbol, buy_exchange, sell_exchange, buy_price, sell_price),
+                async_iterations, repeats)
+            results['execute_trades'] = await run_async(
+                lambda: bot.execute_trades(symbol, buy_exchange, sell_exchange, buy_price), async_iterations, repeats)
+        finally:
+            await bot.close()
+    return results
+
+
+def compare(results: Dict[str, Dict[str, dict]], baseline: dict, tolerance: float) -> List[str]:
+    """Список регрессий: p50 хуже baseline больше чем на tolerance"""
+    regressions = []
+    for fixture_name, cases in results.items():
+        for case, stats in cases.items():
+            base = baseline.get('results', {}).get(fixture_name, {}).get(case)
+            if not base:
+                continue
+            ratio = stats['p50_us'] / base['p50_us'] if base['p50_us'] else 1.0
+            stats['vs_baseline'] = round(ratio, 2)
+            if ratio > 1 + tolerance:
+                regressions.append(f"{fixture_name}/{case}: p50 {stats['p50_us']} мкс "
+                                   f"против {base['p50_us']} мкс (x{ratio:.2f})")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, dict]]):
+    print(f"{'фикстура/кейс':<42} {'ops/s':>10} {'p50 мкс':>10} {'p95 мкс':>10} {'p99 мкс':>10} {'vs base':>8}")
+    for fixture_name, cases in results.items():
+        for case, s in cases.items():
+            vs = f"x{s['vs_baseline']}" if 'vs_baseline' in s else '-'
+            print(f"{fixture_name + '/' + case:<42} {s['ops_per_sec']:>10} {s['p50_us']:>10} "
+                  f"{s['p95_us']:>10} {s['p99_us']:>10} {vs:>8}")
+
+
+def run(args) -> int:
+    paths = sorted(glob.glob(os.path.join(args.fixtures, '*.json')))
+    if args.only:
+        paths = [p for p in paths if args.only in os.path.basename(p)]
+    if not paths:
+        print(f"❌ Фикстуры не найдены в {args.fixtures}")
+        return 1
+
+    # События бота проходят очередь логов, как в работе, но никуда не пишутся
+    setup_logging(path=None, console=False)
+    results = {}
+    for path in paths:
+        name = os.path.splitext(os.path.basename(path))[0]
+        fixture = load_fixture(path)
+        results[name] = asyncio.run(bench_fixture(fixture, args.iterations, args.async_iterations, args.repeats))
+
+    regressions = []
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'machine': platform.machine(),
+                       'created_at': time.strftime('%Y-%m-%d %H:%M:%S'), 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"💾 Baseline сохранен: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if regressions:
+        print("❌ Регрессии производительности:")
+        for line in regressions:
+            print(f"  - {line}")
+        return 1
+    return 0
+
+
+def log_corpus(path: str) -> List[str]:
+    """Сообщения, которые видел бот, по его логу. Текст сообщений лог не хранит, поэтому сигнал
+    восстанавливается в формате @ArbitrageSmartBot по найденному символу, биржам и ценам,
+    а сообщение без символа - как служебное"""
+    corpus, current = [], None
+
+    def flush():
+        if current and current.get('symbol'):
+            spread = 1.0
+            if current.get('buy') and current.get('sell'):
+                spread = round((current['sell'] / current['buy'] - 1) * 100, 2)
+            corpus.append(signal_text(current['symbol'], current.get('buy_exchange', 'mexc'),
+                                      current.get('sell_exchange', 'gate'), spread))
+
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            # JSON-события (src/logs.py) и старые текстовые строки
+            event = json.loads(line) if line.startswith('{') else None
+            text = event.get('msg', '') if event else line
+            if 'Новое сообщение' in text:
+                flush()
+                current = {}
+            elif 'Символ не найден в сообщении' in text and (event or '❌' not in text):
+                # в текстовом логе строка с ❌ - повтор той же строки ботом
+                flush()
+                current = None
+                corpus.append('📊 Ежедневная сводка @ArbitrageSmartBot: сигналов за сутки 42, средний спред 1.1%')
+            elif current is not None:
+                if event and text in ('Цена покупки', 'Цена продажи') and event.get('price'):
+                    current['buy' if text == 'Цена покупки' else 'sell'] = float(event['price'])
+                elif match := re.search(r'Найден символ: (\S+)', text):
+                    current['symbol'] = match.group(1)
+                elif match := re.search(r'Биржа покупки: (\w+) → Биржа продажи: (\w+)', text):
+                    current['buy_exchange'], current['sell_exchange'] = match.group(1), match.group(2)
+                elif match := re.search(r'Средняя цена (покупки|продажи) для \S+: ([\d.]+)', text):
+                    current['buy' if match.group(1) == 'покупки' else 'sell'] = float(match.group(2))
+    flush()
+    return corpus
+
+
+def _legacy_parse(text: str):
+    """Прежний разбор: два re.search с компиляцией шаблона на каждый вызов (для сравнения)"""
+    symbol = re.search(r'([A-Z]+/[A-Z]+)', text)
+    route = re.search(r'([A-Za-z]+):\s*([A-Za-z]+)[→\-–>]([A-Za-z]+)', text)
+    return (symbol and symbol.group(1)), (route and (route.group(2).lower(), route.group(3).lower()))
+
+
+def bench_parse(args) -> int:
+    """Микробенчмарк разбора на корпусе сообщений из лога, фикстур и записанных сигналов"""
+    corpus = log_corpus(args.log) if os.path.exists(args.log) else []
+    for path in sorted(glob.glob(os.path.join(args.fixtures, '*.json'))):
+        corpus.extend(load_fixture(path).get('signals', []))
+    if args.signals:
+        from src.replay import load_signals
+        corpus.extend(signal.get('text') or '' for signal in load_signals(args.signals))
+    if not corpus:
+        print("❌ Нет сообщений для разбора")
+        return 1
+
+    parsed = [parse_message(text) for text in corpus]
+    signals = sum(1 for signal in parsed if signal is not None and signal.complete)
+    print(f"📨 Сообщений: {len(corpus)}, сигналов: {signals}, отброшено: {len(corpus) - signals}")
+
+    re.purge()  # прежний разбор компилировал шаблоны при каждом вызове, начинаем с пустого кэша re
+    results = {
+        'parse_message': run_sync(lambda: [parse_message(text) for text in corpus], args.iterations, args.repeats),
+        'legacy': run_sync(lambda: [_legacy_parse(text) for text in corpus], args.iterations, args.repeats),
+    }
+    print(f"{'case':<16} {'msg/s':>12} {'p50 мкс':>10} {'p99 мкс':>10} {'на сообщение, мкс':>18}")
+    for case, stats in results.items():
+        print(f"{case:<16} {stats['ops_per_sec'] * len(corpus):>12.0f} {stats['p50_us']:>10} "
+              f"{stats['p99_us']:>10} {stats['p50_us'] / len(corpus):>18.3f}")
+    return 0
+
+
+def signal_text(symbol: str, buy_exchange: str, sell_exchange: str, spread: float = 1.5) -> str:
+    """Сообщение в формате @ArbitrageSmartBot для записанной фикстуры"""
+    return (f"🔥 {symbol}\nExchanges: {buy_exchange.upper()}→{sell_exchange.upper()}\n"
+            f"Spread: {spread}%\nVolume: 10 000 USDT")
+
+
+async def record(symbol: str, buy_exchange: str, sell_exchange: str, template_path: str, out_path: str):
+    """Записать публичные данные бирж (рынок, стаканы, списки маржи) в фикстуру.
+    Приватные ответы (балансы, ордера) берутся из шаблонной фикстуры"""
+    import ccxt.async_support as ccxt
+    from src.markets import MarketIndex
+    from src.http_pool import HttpPool, VENUE_URLS
+
+    fixture = load_fixture(template_path)
+    fixture.update({'symbol': symbol, 'buy_exchange': buy_exchange, 'sell_exchange': sell_exchange})
+    base = symbol.split('/')[0]
+    fixture['signals'] = [signal_text(symbol, buy_exchange, sell_exchange)]
+    fixture['exchanges'] = {}
+    for name in (buy_exchange, sell_exchange):
+        exchange = getattr(ccxt, name)()
+        try:
+            markets = await exchange.load_markets()
+            book = await exchange.fetch_order_book(symbol, 50)
+            fixture['exchanges'][name] = {
+                'markets': [MarketIndex._compact(dict(markets[symbol], info={}))],
+                'order_books': {symbol: {'bids': [lvl[:2] for lvl in book['bids']],
+                                         'asks': [lvl[:2] for lvl in book['asks']]}},
+                'balance': {'USDT': {'free': 1000.0, 'used': 0.0, 'total': 1000.0}},
+            }
+        finally:
+            await exchange.close()
+
+    async with HttpPool() as http:
+        routes = fixture.setdefault('http', {})
+        public = {
+            'gate': ['/api/v4/margin/cross/currencies', f"/api/v4/spot/tickers?currency_pair={base}_USDT"],
+            'kucoin': ['/api/v1/margin/config', f"/api/v1/market/orderbook/level1?symbol={base}-USDT"],
+        }
+        for venue, paths in public.items():
+            for path in paths:
+                async with http.session(venue).get(VENUE_URLS[venue] + path) as response:
+                    routes.setdefault(venue, {})[f"GET {path.split('?')[0]}"] = await response.json(content_type=None)
+
+    with open(out_path, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, ensure_ascii=False)
+    print(f"💾 Фикстура записана: {out_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк горячих путей бота на фикстурах')
+    sub = parser.add_subparsers(dest='command')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='каталог с фикстурами *.json')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='файл baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='записать результаты как новый baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое ухудшение p50 (доля)')
+    parser.add_argument('--iterations', type=int, default=2000, help='итераций синхронных кейсов')
+    parser.add_argument('--async-iterations', type=int, default=200, help='итераций асинхронных кейсов')
+    parser.add_argument('--repeats', type=int, default=3, help='повторов каждого кейса (берется лучший p50)')
+    parser.add_argument('--only', help='только фикстуры, в имени которых есть подстрока')
+    parser.add_argument('--output', help='записать результаты в JSON')
+
+    parse = sub.add_parser('parse', help='микробенчмарк разбора сообщений')
+    parse.add_argument('--log', default=LOG_PATH, help='лог бота с сообщениями @ArbitrageSmartBot')
+    parse.add_argument('--signals', help='JSONL, записанный ботом с RECORD_SIGNALS (настоящие тексты)')
+
+    rec = sub.add_parser('record', help='записать фикстуру с живых бирж (только публичные данные)')
+    rec.add_argument('symbol')
+    rec.add_argument('buy_exchange')
+    rec.add_argument('sell_exchange')
+    rec.add_argument('--template', default=os.path.join(FIXTURES_DIR, 'pengu_okx_gate.json'))
+    rec.add_argument('--out', required=True)
+
+    args = parser.parse_args()
+    if args.command == 'record':
+        asyncio.run(record(args.symbol, args.buy_exchange, args.sell_exchange, args.template, args.out))
+        return
+    if args.command == 'parse':
+        sys.exit(bench_parse(args))
+    sys.exit(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+import asyncio
+import time
+from typing import Dict, FrozenSet, Tuple
+
+from src.logs import get_logger
+from src.utils import get_margin_currencies_gate, get_margin_currencies_kucoin, get_max_borrowable_gate
+
+log = get_logger(__name__)
+
+# Сервис доступности займов для бирж продажи.
+# Списки маржинальных валют Gate и KuCoin загружаются одним запросом на биржу,
+# хранятся во множествах и обновляются по расписанию - проверка сигнала идет
+# без сети за O(1). Максимальный заем Gate зависит от аккаунта и меняется
+# после каждой продажи, поэтому кэшируется ненадолго и сбрасывается после ордера.
+
+GATE_HOST = "https://api.gateio.ws"
+GATE_PREFIX = "/api/v4"
+EMPTY = frozenset()
+
+
+class BorrowabilityService:
+    venues = ('gate', 'kucoin')
+
+    def __init__(self, get_session, refresh_interval: float = 600, retry_delay: float = 30,
+                 max_borrowable_ttl: float = 5):
+        self.get_session = get_session
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.max_borrowable_ttl = max_borrowable_ttl
+        self.currencies: Dict[str, FrozenSet[str]] = {}
+        self.loaded_at: Dict[str, float] = {}
+        self.failed_at: Dict[str, float] = {}
+        self.max_borrowable: Dict[str, Tuple[float, float]] = {}  # валюта -> (сумма, monotonic)
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.task = None
+
+    async def _load(self, venue: str):
+        session = self.get_session(venue)
+        if venue == 'gate':
+            return await get_margin_currencies_gate(session, GATE_HOST, GATE_PREFIX)
+        if venue == 'kucoin':
+            return await get_margin_currencies_kucoin(session)
+        raise ValueError(f"Неизвестная биржа займов: {venue}")
+
+    async def refresh(self, venue: str):
+        """Перезагрузить список маржинальных валют биржи (не больше одного запроса одновременно)"""
+        lock = self.locks.setdefault(venue, asyncio.Lock())
+        if lock.locked():
+            async with lock:
+                return
+        async with lock:
+            try:
+                self.currencies[venue] = frozenset(await self._load(venue))
+                self.loaded_at[venue] = time.monotonic()
+                self.failed_at.pop(venue, None)
+                log.info(f"Загружены маржинальные валюты {venue}: {len(self.currencies[venue])}")
+            except Exception as e:
+                log.error(f"Ошибка загрузки маржинальных валют {venue}: {e}")
+                self.failed_at[venue] = time.monotonic()
+
+    async def is_borrowable(self, venue: str, currency: str) -> bool:
+        """Можно ли занять валюту на бирже; сеть - только если список еще ни разу не загружен"""
+        if venue not in self.currencies:
+            await self.refresh(venue)
+        return currency in self.currencies.get(venue, EMPTY)
+
+    async def get_max_borrowable_gate(self, session, symbol: str, api_key: str, api_secret: str) -> float:
+        """Максимальный заем Gate по паре BASE_USDT с коротким кэшем"""
+        currency = symbol.split('_')[0]
+        cached = self.max_borrowable.get(currency)
+        if cached and time.monotonic() - cached[1] < self.max_borrowable_ttl:
+            return cached[0]
+        amount = await get_max_borrowable_gate(session, symbol, GATE_HOST, GATE_PREFIX, api_key, api_secret)
+        if amount > 0:
+            self.max_borrowable[currency] = (amount, time.monotonic())
+        return amount
+
+    def invalidate_max_borrowable(self, currency: str):
+        """Сбросить кэш максимального займа (после ордера, изменившего долг)"""
+        self.max_borrowable.pop(currency, None)
+
+    def _next_due(self, venue: str) -> float:
+        failed_at = self.failed_at.get(venue)
+        if failed_at is not None:
+            return failed_at + self.retry_delay
+        loaded_at = self.loaded_at.get(venue)
+        if loaded_at is None:
+            return 0.0
+        return loaded_at + self.refresh_interval
+
+    def start(self):
+        """Запустить предзагрузку и обновление списков по расписанию"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            now = time.monotonic()
+            due = [venue for venue in self.venues if self._next_due(venue) <= now]
+            if due:
+                await asyncio.gather(*(self.refresh(venue) for venue in due))
+                continue
+            next_due = min(self._next_due(venue) for venue in self.venues)
+            await asyncio.sleep(max(0.0, next_due - now))
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
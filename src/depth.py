@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+# Проход по глубине стакана без циклов Python: накопленные суммы объёма и
+# стоимости по уровням + searchsorted находят уровень, на котором набирается
+# нужная сумма. Один вызов считает сразу лестницу из многих депозитов.
+
+
+@dataclass
+class DepthWalk:
+    """Результат прохода по стакану; все поля - массивы по числу запрошенных сумм"""
+    vwap: np.ndarray           # средняя цена исполнения
+    worst_price: np.ndarray    # цена последнего задетого уровня
+    levels: np.ndarray         # сколько уровней задето
+    base: np.ndarray           # исполненный объём в базовой валюте
+    quote: np.ndarray          # исполненный объём в квоте
+    slippage_bps: np.ndarray   # отклонение vwap от лучшей цены, б.п.
+    complete: np.ndarray       # хватило ли глубины на всю сумму
+
+    def at(self, i: int = 0) -> dict:
+        """Результат для одной суммы в виде словаря"""
+        return {
+            'vwap': float(self.vwap[i]),
+            'worst_price': float(self.worst_price[i]),
+            'levels': int(self.levels[i]),
+            'base': float(self.base[i]),
+            'quote': float(self.quote[i]),
+            'slippage_bps': float(self.slippage_bps[i]),
+            'complete': bool(self.complete[i]),
+        }
+
+
+def book_side(levels) -> np.ndarray:
+    """Сторона стакана ccxt ([[price, volume, ...], ...]) в массив n x 2"""
+    try:
+        side = np.asarray(levels, dtype=float)
+        if side.ndim == 2 and side.shape[1] >= 2:
+            return side[:, :2]
+    except (TypeError, ValueError):
+        pass
+    # Неровные строки - отбрасываем некорректные уровни
+    return np.array([lvl[:2] for lvl in levels if len(lvl) >= 2], dtype=float).reshape(-1, 2)
+
+
+def walk_book(levels, amounts, by: str = 'quote') -> DepthWalk:
+    """Пройти сторону стакана (лучшая цена первой) на сумму(ы) amounts.
+
+    by='quote' - суммы в квоте (покупка на депозит), by='base' - в базовой валюте.
+    Если глубины не хватает, результат считается по всему стакану, complete=False.
+    """
+    side = book_side(levels)
+    amounts = np.atleast_1d(np.asarray(amounts, dtype=float))
+    prices, volumes = side[:, 0], side[:, 1]
+    n = len(prices)
+
+    if n == 0:
+        nan = np.full(amounts.shape, np.nan)
+        zero = np.zeros(amounts.shape)
+        return DepthWalk(nan, nan, zero.astype(int), zero, zero, nan, np.zeros(amounts.shape, dtype=bool))
+
+    cum_base = np.cumsum(volumes)
+    cum_quote = np.cumsum(prices * volumes)
+    cum_target = cum_quote if by == 'quote' else cum_base
+
+    complete = amounts <= cum_target[-1]
+    target = np.minimum(amounts, cum_target[-1])
+    idx = np.minimum(np.searchsorted(cum_target, target, side='left'), n - 1)
+
+    prev_base = np.where(idx > 0, cum_base[idx - 1], 0.0)
+    prev_quote = np.where(idx > 0, cum_quote[idx - 1], 0.0)
+    if by == 'quote':
+        quote = target
+        base = prev_base + (target - prev_quote) / prices[idx]
+    else:
+        base = target
+        quote = prev_quote + (target - prev_base) * prices[idx]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vwap = np.where(base > 0, quote / base, np.nan)
+    best = prices[0]
+    slippage_bps = np.abs(vwap - best) / best * 1e4
+
+    return DepthWalk(vwap, prices[idx], idx + 1, base, quote, slippage_bps, complete)
@@ -0,0 +1,421 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.depth import walk_book
+from src.fills import new_client_order_id, poll_fill
+from src.logs import get_logger
+from src.tracing import span
+from src.utils import (
+    get_balance, get_price, send_order, get_max_borrowable_gate, is_borrowable_gate,
+    get_price_kucoin, get_margin_account_kucoin, place_margin_order_kucoin, get_order_kucoin,
+)
+
+log = get_logger(__name__)
+
+# Исполнители сделок внутри процесса бота.
+# Каждый исполнитель получает уже прогретый клиент ccxt (ArbitrageBot.get_exchange),
+# поэтому на каждую ногу сделки не тратится запуск интерпретатора, чтение .env
+# и повторный load_markets(). Клиенты - ccxt.async_support, прямые REST-запросы
+# Gate и KuCoin идут через общую aiohttp-сессию бота.
+
+
+@dataclass
+class FillResult:
+    """Результат исполнения одной ноги сделки"""
+    exchange: str
+    symbol: str
+    side: str
+    success: bool
+    filled: float = 0.0
+    average: Optional[float] = None
+    cost: Optional[float] = None
+    order_id: Optional[str] = None
+    error: Optional[str] = None
+    fee: Optional[float] = None
+    raw: dict = field(default_factory=dict, repr=False)
+
+
+class TradeExecutor:
+    """Базовый исполнитель: buy - покупка на квоту, sell - маржинальная продажа базового актива"""
+    name = None
+
+    def __init__(self, exchange, session=None, borrow=None, ledger=None, fills=None):
+        self.exchange = exchange
+        self.session = session
+        self.borrow = borrow  # BorrowabilityService бота; без него (CLI) - прямые запросы
+        self.ledger = ledger  # BalanceLedger бота; без него или при устаревшем балансе - запрос баланса
+        self.fills = fills  # FillTracker бота; без него исполнение подтверждается опросом
+
+    @property
+    def prefix(self) -> str:
+        return self.name.upper()
+
+    async def buy(self, symbol: str, deposit: float) -> FillResult:
+        raise NotImplementedError(f"{self.prefix} не поддерживает покупку")
+
+    async def sell(self, symbol: str, deposit: float, amount: float = None) -> FillResult:
+        raise NotImplementedError(f"{self.prefix} не поддерживает продажу")
+
+    def _fail(self, symbol: str, side: str, error: str) -> FillResult:
+        log.error(f"{self.prefix} - ❌ {error}", venue=self.name, symbol=symbol, side=side)
+        return FillResult(self.name, symbol, side, False, error=error)
+
+    async def _call(self, func, *args, **kwargs):
+        return await func(*args, **kwargs)
+
+    def _new_order(self) -> str:
+        """clientOrderId нового ордера; ожидание исполнения регистрируется до отправки"""
+        client_order_id = new_client_order_id()
+        if self.fills is not None:
+            self.fills.expect(self.name, client_order_id)
+        return client_order_id
+
+    def _discard_order(self, client_order_id: Optional[str]):
+        """Снять ожидание исполнения, если ордер не дошел до подтверждения; после wait - ничего не делает"""
+        if self.fills is not None and client_order_id is not None:
+            self.fills.discard(self.name, client_order_id)
+
+    async def _confirm_fill(self, symbol: str, order: dict, client_order_id: str, fetch=None) -> dict:
+        """Итоговое состояние ордера: из ответа, события потока или опроса REST с паузой"""
+        fetch = fetch or (lambda: self._call(self.exchange.fetch_order, order['id'], symbol))
+        if self.fills is not None:
+            return await self.fills.wait(self.name, order, fetch, client_order_id)
+        return await poll_fill(fetch, order)
+
+    def _cached_balance(self, currency: str) -> Optional[float]:
+        return self.ledger.free(self.name, currency) if self.ledger is not None else None
+
+    def _spent(self, currency: str, amount: Optional[float]):
+        """Учесть ордер в ledger: списать потраченное и запросить свежий баланс"""
+        if self.ledger is not None:
+            self.ledger.debit(self.name, currency, amount or 0.0)
+            self.ledger.refresh_soon(self.name)
+
+    async def _prepare_buy(self, symbol: str, deposit: float):
+        """Общие проверки перед покупкой: рынок, баланс, цена и минимальный объём"""
+        base, quote = symbol.split('/')
+        markets = await self._call(self.exchange.load_markets)
+        if symbol not in markets:
+            raise ValueError(f"пара {symbol} не поддерживается на {self.prefix}")
+
+        free = self._cached_balance(quote)
+        if free is None:
+            # Баланс и тикер независимы - запрашиваем параллельно
+            balance, ticker = await asyncio.gather(
+                self._call(self.exchange.fetch_balance),
+                self._call(self.exchange.fetch_ticker, symbol),
+            )
+            free = balance.get(quote, {}).get('free') or 0
+        else:
+            ticker = await self._call(self.exchange.fetch_ticker, symbol)
+        usdt_available = min(deposit, free)
+        if usdt_available <= 0:
+            raise ValueError(f"Недостаточно {quote}: {usdt_available}")
+
+        price = ticker.get('ask') or ticker.get('last') or ticker.get('bid')
+        if not price:
+            raise ValueError(f"Не удалось получить цену для {symbol}")
+
+        market = markets[symbol]
+        min_amount = market.get('limits', {}).get('amount', {}).get('min') or 0
+        base_available = float(self.exchange.amount_to_precision(symbol, usdt_available / price))
+        if base_available < min_amount:
+            raise ValueError(f"Объём {base_available} {base} ниже минимального ({min_amount})")
+
+        log.info(f"{self.prefix} - Доступно {usdt_available} {quote} — покупаем {base_available} {base}")
+        return usdt_available, base_available
+
+    def _order_result(self, symbol: str, side: str, order: dict) -> FillResult:
+        filled = order.get('filled') or 0.0
+        if not filled:
+            return self._fail(symbol, side, "Сделка не исполнена — недостаточно ликвидности")
+        base, quote = symbol.split('/')
+        self._spent(quote, order.get('cost'))
+        log.info(f"{self.prefix} - ✅ Куплено: {filled} {base} по цене {order.get('average')} USDT", venue=self.name,
+                 symbol=symbol, side=side, order_id=order.get('id'), filled=float(filled), average=order.get('average'))
+        return FillResult(self.name, symbol, side, True, filled=float(filled),
+                          average=order.get('average'), cost=order.get('cost'),
+                          order_id=order.get('id'), raw=order)
+
+
+class BitgetExecutor(TradeExecutor):
+    name = 'bitget'
+
+    async def buy(self, symbol: str, deposit: float) -> FillResult:
+        try:
+            with span(f'order_prepare.{self.name}'):
+                usdt_available, base_available = await self._prepare_buy(symbol, deposit)
+        except Exception as e:
+            return self._fail(symbol, 'buy', str(e))
+
+        client_order_id = None
+        try:
+            # Bitget принимает сумму в квоте для рыночной покупки
+            self.exchange.options['createMarketBuyOrderRequiresPrice'] = False
+            client_order_id = self._new_order()
+            with span(f'order_ack.{self.name}'):
+                order = await self.exchange.create_market_buy_order(
+                    symbol=symbol,
+                    amount=usdt_available,
+                    params={'createMarketBuyOrderRequiresPrice': False, 'clientOrderId': client_order_id}
+                )
+            log.info(f"{self.prefix} - Ордер создан", venue=self.name, symbol=symbol, order_id=order['id'],
+                     client_order_id=client_order_id)
+            with span(f'order_fill.{self.name}'):
+                detailed_order = await self._confirm_fill(symbol, order, client_order_id)
+            return self._order_result(symbol, 'buy', detailed_order)
+        except Exception as e:
+            return self._fail(symbol, 'buy', f"Ошибка при создании ордера: {e.__class__.__name__}: {e}")
+        finally:
+            self._discard_order(client_order_id)
+
+
+class OkxExecutor(TradeExecutor):
+    name = 'okx'
+
+    async def buy(self, symbol: str, deposit: float) -> FillResult:
+        try:
+            with span(f'order_prepare.{self.name}'):
+                usdt_available, base_available = await self._prepare_buy(symbol, deposit)
+        except Exception as e:
+            return self._fail(symbol, 'buy', str(e))
+
+        client_order_id = None
+        try:
+            client_order_id = self._new_order()
+            with span(f'order_ack.{self.name}'):
+                order = await self.exchange.create_market_buy_order(symbol=symbol, amount=base_available,
+                                                                    params={'clientOrderId': client_order_id})
+            with span(f'order_fill.{self.name}'):
+                detailed_order = await self._confirm_fill(symbol, order, client_order_id)
+            return self._order_result(symbol, 'buy', detailed_order)
+        except Exception as e:
+            return self._fail(symbol, 'buy', f"Ошибка при создании ордера: {e.__class__.__name__}: {e}")
+        finally:
+            self._discard_order(client_order_id)
+
+
+class MexcExecutor(TradeExecutor):
+    name = 'mexc'
+    retries = 3
+    retry_delay = 2
+
+    async def _call(self, func, *args, **kwargs):
+        for i in range(self.retries):
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                log.warning(f"{self.prefix} - Ретрай {i+1}/{self.retries}: {e}")
+                await asyncio.sleep(self.retry_delay)
+        raise Exception(f"Не удалось выполнить {func.__name__} после {self.retries} попыток")
+
+    async def buy(self, symbol: str, deposit: float) -> FillResult:
+        try:
+            with span(f'order_prepare.{self.name}'):
+                usdt_available, base_available = await self._prepare_buy(symbol, deposit)
+
+            # Проверка ликвидности
+            orderbook = await self._call(self.exchange.fetch_order_book, symbol)
+            if not walk_book(orderbook.get('asks', []), usdt_available, by='quote').complete[0]:
+                raise ValueError(f"Не хватает ликвидности для покупки на {usdt_available} USDT")
+        except Exception as e:
+            return self._fail(symbol, 'buy', str(e))
+
+        client_order_id = None
+        try:
+            client_order_id = self._new_order()  # повтор создания с тем же id не откроет второй ордер
+            with span(f'order_ack.{self.name}'):
+                order = await self._call(self.exchange.create_market_buy_order, symbol=symbol, amount=base_available,
+                                         params={'clientOrderId': client_order_id})
+            log.info(f"{self.prefix} - Ордер создан", venue=self.name, symbol=symbol, order_id=order['id'],
+                     client_order_id=client_order_id)
+            with span(f'order_fill.{self.name}'):
+                order_details = await self._confirm_fill(symbol, order, client_order_id)
+            if not order_details.get('cost'):
+                return self._fail(symbol, 'buy', "Сделка не исполнена — недостаточно ликвидности")
+            return self._order_result(symbol, 'buy', order_details)
+        except Exception as e:
+            return self._fail(symbol, 'buy', f"Ошибка при создании ордера: {e.__class__.__name__}: {e}")
+        finally:
+            self._discard_order(client_order_id)
+
+
+class GateExecutor(TradeExecutor):
+    name = 'gate'
+    host = "https://api.gateio.ws"
+    api_prefix = "/api/v4"
+
+    async def sell(self, symbol: str, deposit: float, amount: float = None) -> FillResult:
+        symbol_api = symbol.replace("/", "_")
+        base, quote = symbol.split("/")
+        api_key, api_secret = self.exchange.apiKey, self.exchange.secret
+
+        try:
+            balance = self._cached_balance(quote)
+            if balance is None:
+                balance = await get_balance(self.session, quote, self.host, self.api_prefix, api_key, api_secret)
+            available_usdt = min(deposit, balance)
+            if available_usdt <= 0:
+                return self._fail(symbol, 'sell', f"Недостаточно {quote}: {available_usdt}")
+
+            if not amount or amount <= 0:
+                price = await get_price(self.session, symbol_api, self.host, self.api_prefix)
+                if not price:
+                    return self._fail(symbol, 'sell', "Не удалось получить цену актива")
+                amount = round(available_usdt / price, 6)
+
+            log.info(f"{self.prefix} - Доступно {available_usdt} {quote} — продаем {amount} {base}")
+
+            if self.borrow is not None:
+                borrowable = await self.borrow.is_borrowable('gate', base)
+            else:
+                borrowable = await is_borrowable_gate(self.session, symbol_api, self.host, self.api_prefix)
+            if not borrowable:
+                return self._fail(symbol, 'sell', f"Займ для {base} недоступен")
+
+            if self.borrow is not None:
+                max_borrowable = await self.borrow.get_max_borrowable_gate(self.session, symbol_api, api_key, api_secret)
+            else:
+                max_borrowable = await get_max_borrowable_gate(self.session, symbol_api, self.host, self.api_prefix, api_key, api_secret)
+            log.info(f"{self.prefix} - Максимально доступный заем: {max_borrowable} {base}")
+            if amount > max_borrowable:
+                return self._fail(symbol, 'sell', f"Недостаточно заемных средств для {base}: {max_borrowable}")
+
+            with span(f'order_ack.{self.name}'):
+                order = await send_order(self.session, symbol_api, self.host, self.api_prefix, api_key, api_secret, amount)
+            if self.borrow is not None:
+                self.borrow.invalidate_max_borrowable(base)
+            if self.ledger is not None:
+                self.ledger.refresh_soon(self.name)
+        except Exception as e:
+            if 'AUTO_BORROW_TOO_MUCH' in str(e):
+                return self._fail(symbol, 'sell', "Уменьшите сумму ордера или проверьте лимиты маржинального займа")
+            return self._fail(symbol, 'sell', f"Ошибка: {e}")
+
+        if not order or 'amount' not in order:
+            return self._fail(symbol, 'sell', f"Недостаточно заемных средств для {base}: {order}")
+
+        # Gate отдает объёмы строками ("0" - истина для or): исполненное - filled_amount,
+        # в старых ответах без него - amount минус остаток left
+        if order.get('filled_amount') is not None:
+            filled = float(order['filled_amount'])
+        elif order.get('left') is not None:
+            filled = float(order['amount']) - float(order['left'])
+        else:
+            filled = 0.0
+        if filled <= 0:
+            return self._fail(symbol, 'sell', f"Сделка не исполнена — недостаточно ликвидности: {order}")
+        log.info(f"{self.prefix} - ✅ Ордер выполнен: {filled} {order['currency_pair']}", venue=self.name, symbol=symbol,
+                 side='sell', order_id=order.get('id'), filled=filled)
+        return FillResult(self.name, symbol, 'sell', True, filled=filled,
+                          average=float(order['avg_deal_price']) if order.get('avg_deal_price') else None,
+                          cost=float(order['filled_total']) if order.get('filled_total') else None,
+                          order_id=order.get('id'), raw=order)
+
+
+class KucoinExecutor(TradeExecutor):
+    name = 'kucoin'
+
+    def _credentials(self):
+        return self.exchange.apiKey, self.exchange.secret, self.exchange.password
+
+    async def sell(self, symbol: str, deposit: float, amount: float = None) -> FillResult:
+        symbol_api = symbol.replace("/", "-")  # особенность kucoin формат символа PENGU-USDT
+        base = symbol.split("/")[0]
+
+        client_order_id = None
+        try:
+            # Шаг количества и минимальные размеры берем из уже загруженных рынков ccxt
+            market = (await self.exchange.load_markets())[symbol]
+            increment = market['precision']['amount']
+            base_min_size = market['limits']['amount']['min'] or 0
+            quote_min_size = market['limits']['cost']['min'] or 0
+
+            prices = await get_price_kucoin(self.session, symbol_api)
+            if not prices:
+                return self._fail(symbol, 'sell', "Не удалось получить цену актива")
+
+            usdt_balance = self._cached_balance('USDT')
+            if usdt_balance is None:
+                account = await get_margin_account_kucoin(self.session, *self._credentials())
+                if account is None:
+                    return self._fail(symbol, 'sell', "Не удалось получить маржинальный аккаунт")
+                usdt_position = next((a for a in account['accounts'] if a['currency'] == 'USDT'), None)
+                if usdt_position is None:
+                    return self._fail(symbol, 'sell', "USDT не найден в cross margin аккаунте")
+                usdt_balance = float(usdt_position['availableBalance'])
+            usdt_to_use = min(usdt_balance, deposit)
+            if usdt_to_use <= 0:
+                return self._fail(symbol, 'sell', "Недостаточно USDT для торговли")
+
+            if amount and amount > 0:
+                base_amount = amount
+            else:
+                base_amount = float(self.exchange.amount_to_precision(symbol, usdt_to_use / prices['bid']))
+
+            if base_amount < base_min_size:
+                return self._fail(symbol, 'sell', f"Количество {base_amount} меньше минимального {base_min_size}")
+
+            order_value = base_amount * prices['bid']
+            if order_value < quote_min_size:
+                return self._fail(symbol, 'sell', f"Стоимость ордера {order_value:.2f} USDT меньше минимальной {quote_min_size} USDT")
+
+            log.info(f"{self.prefix} - 💰 Доступно {usdt_to_use} USDT — продаем {base_amount} {base}")
+            client_order_id = self._new_order()
+            with span(f'order_ack.{self.name}'):
+                result = await place_margin_order_kucoin(self.session, symbol_api, 'sell', base_amount, increment,
+                                                         *self._credentials(), client_oid=client_order_id)
+            if result.get("code") != "200000":
+                return self._fail(symbol, 'sell', f"Ошибка при создании ордера: {result}")
+            if self.ledger is not None:
+                self.ledger.refresh_soon(self.name)
+
+            order_id = result.get('data', {}).get('orderId')
+            with span(f'order_fill.{self.name}'):
+                order = await self._confirm_fill(symbol, {'id': order_id}, client_order_id,
+                                                 fetch=lambda: self._fetch_order(order_id))
+        except Exception as e:
+            return self._fail(symbol, 'sell', f"Ошибка: {e.__class__.__name__}: {e}")
+        finally:
+            self._discard_order(client_order_id)
+
+        if 'filled' not in order:
+            filled = base_amount  # подтверждения нет совсем (опрос не ответил) - запрошенный объём, как раньше
+        elif not order['filled']:
+            return self._fail(symbol, 'sell', f"Сделка не исполнена (статус {order.get('status')})")
+        else:
+            filled = order['filled']
+        average = order.get('average') or prices['bid']
+        log.info(f"{self.prefix} - ✅ Ордер выполнен: {filled} {base}", venue=self.name, symbol=symbol, side='sell',
+                 order_id=order_id, filled=filled, average=average)
+        return FillResult(self.name, symbol, 'sell', True, filled=filled, average=average,
+                          cost=order.get('cost'), order_id=order_id, fee=(order.get('fee') or {}).get('cost'),
+                          raw=result)
+
+    async def _fetch_order(self, order_id: str) -> dict:
+        """Статус ордера KuCoin в форме ccxt (id, status, filled, cost, average)"""
+        data = await get_order_kucoin(self.session, order_id, *self._credentials())
+        filled = float(data.get('dealSize') or 0)
+        cost = float(data.get('dealFunds') or 0)
+        return {'id': order_id, 'clientOrderId': data.get('clientOid'),
+                'status': 'open' if data.get('isActive') else 'closed',
+                'filled': filled, 'cost': cost, 'average': cost / filled if filled else None,
+                'fee': {'cost': float(data.get('fee') or 0), 'currency': data.get('feeCurrency')}}
+
+
+EXECUTORS = {
+    'bitget': BitgetExecutor,
+    'okx': OkxExecutor,
+    'mexc': MexcExecutor,
+    'gate': GateExecutor,
+    'kucoin': KucoinExecutor,
+}
+
+
+def create_executor(exchange_name: str, exchange, session=None, borrow=None, ledger=None,
+                    fills=None) -> TradeExecutor:
+    """Создать исполнитель для биржи поверх готового клиента ccxt"""
+    if exchange_name not in EXECUTORS:
+        raise ValueError(f"Неизвестная биржа: {exchange_name}")
+    return EXECUTORS[exchange_name](exchange, session, borrow, ledger, fills)
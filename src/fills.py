@@ -0,0 +1,140 @@
+import asyncio
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# Подтверждение исполнения ордеров.
+# Исполнитель регистрирует ожидание по clientOrderId до отправки ордера
+# (событие может прийти раньше ответа на создание), FillTracker слушает
+# приватные потоки ордеров (ccxt.pro watch_orders) и завершает ожидание, как
+# только ордер исполнен. Параллельно статус запрашивается по REST с растущей
+# паузой (poll_fill) - сразу, если поток еще не присылал событий, или через
+# stream_timeout, если поток живой; побеждает то, что узнает раньше. Это
+# заменяет один fetch_order сразу после создания, который мог прочитать еще
+# не исполненный ордер. Без трекера (CLI-скрипты) используется только опрос.
+
+STREAM_VENUES = ('okx', 'bitget', 'mexc')
+FINAL_STATUSES = frozenset({'closed', 'canceled', 'cancelled', 'expired', 'rejected'})
+
+
+def new_client_order_id() -> str:
+    """Идентификатор ордера клиента: буквы и цифры, подходит всем биржам бота"""
+    return 'arb' + uuid.uuid4().hex[:24]
+
+
+def is_final(order: Optional[dict]) -> bool:
+    """Ордер больше не изменится: закрыт/отменен или исполнен полностью"""
+    if not order:
+        return False
+    if order.get('status') in FINAL_STATUSES:
+        return True
+    return bool(order.get('filled')) and order.get('remaining') == 0
+
+
+async def poll_fill(fetch: Callable[[], Awaitable[dict]], order: dict = None, initial_delay: float = 0.05,
+                    max_delay: float = 1.0, timeout: float = 10.0, start_delay: float = 0.0) -> dict:
+    """Опрашивать статус ордера с удвоением паузы, пока он не станет окончательным;
+    по таймауту вернуть последнее известное состояние"""
+    if start_delay:
+        await asyncio.sleep(start_delay)
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    last = order or {}
+    while True:
+        try:
+            last = await fetch()
+            if is_final(last):
+                return last
+        except Exception as e:
+            log.warning(f"⚠️ Статус ордера не получен, повтор: {e.__class__.__name__}: {e}")
+        if time.monotonic() >= deadline:
+            return last
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, max_delay)
+
+
+class FillTracker:
+    def __init__(self, get_stream_client, venues: Iterable[str], streaming: Iterable[str] = STREAM_VENUES,
+                 stream_timeout: float = 2.0, retry_delay: float = 5.0):
+        self.get_stream_client = get_stream_client  # биржа -> клиент ccxt.pro
+        self.streaming = [venue for venue in venues if venue in streaming]
+        self.stream_timeout = stream_timeout  # сколько ждать событие потока до перехода на опрос
+        self.retry_delay = retry_delay
+        self.pending: Dict[Tuple[str, str], asyncio.Future] = {}  # (биржа, clientOrderId или id) -> ожидание
+        self.connected: Dict[str, bool] = {}
+        self.tasks = []
+
+    def expect(self, venue: str, client_order_id: str) -> asyncio.Future:
+        """Зарегистрировать ожидание до отправки ордера"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending[(venue, client_order_id)] = future
+        return future
+
+    def discard(self, venue: str, client_order_id: str):
+        """Снять ожидание ордера, который не дошел до wait (ошибка создания или отказ биржи)"""
+        future = self.pending.pop((venue, client_order_id), None)
+        if future is not None and not future.done():
+            future.cancel()
+
+    def _on_order(self, venue: str, order: dict):
+        if not is_final(order):
+            return
+        for key in ((venue, order.get('clientOrderId')), (venue, order.get('id'))):
+            future = self.pending.get(key)
+            if future is not None and not future.done():
+                future.set_result(order)
+
+    async def wait(self, venue: str, order: dict, fetch: Callable[[], Awaitable[dict]],
+                   client_order_id: str = None) -> dict:
+        """Дождаться исполнения: ответ на создание, событие потока или опрос по REST"""
+        keys = [(venue, client_order_id), (venue, order.get('id'))]
+        future = self.pending.get(keys[0])
+        try:
+            if is_final(order):
+                return order
+            if future is None or venue not in self.streaming:
+                return await poll_fill(fetch, order)
+            self.pending[keys[1]] = future
+            poll = asyncio.ensure_future(
+                poll_fill(fetch, order, start_delay=self.stream_timeout if self.connected.get(venue) else 0.0)
+            )
+            done, _ = await asyncio.wait({future, poll}, return_when=asyncio.FIRST_COMPLETED)
+            if future in done:
+                poll.cancel()
+                return future.result()
+            return poll.result()
+        finally:
+            for key in keys:
+                self.pending.pop(key, None)
+
+    async def _stream(self, venue: str):
+        while True:
+            try:
+                orders = await self.get_stream_client(venue).watch_orders()
+                if not self.connected.get(venue):
+                    log.info(f"{venue.upper()} - 🔌 Исполнение ордеров отслеживается по WebSocket")
+                self.connected[venue] = True
+                for order in orders:
+                    self._on_order(venue, order)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self.connected.get(venue):
+                    log.warning(f"{venue.upper()} - ⚠️ Поток ордеров прерван, опрос по REST: {e}")
+                self.connected[venue] = False
+                await asyncio.sleep(self.retry_delay)
+
+    def start(self):
+        if not self.tasks:
+            self.tasks = [asyncio.create_task(self._stream(venue)) for venue in self.streaming]
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        if self.tasks:
+            await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import json
+import math
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from src.depth import walk_book
+
+# Подмена сетевого слоя записанными данными бирж.
+# FixtureExchange повторяет интерфейс клиента ccxt.async_support, который
+# используют бот и исполнители (рынки, стаканы, баланс, рыночные ордера
+# с исполнением по стакану), FixtureSession - интерфейс aiohttp-сессии для
+# прямых REST-запросов Gate и KuCoin. Ответы берутся из JSON-фикстуры,
+# сеть не используется, поэтому прогоны воспроизводимы.
+#
+# Формат фикстуры:
+# {
+#   "symbol": "PENGU/USDT", "buy_exchange": "okx", "sell_exchange": "gate", "deposit": 10,
+#   "signals": ["текст сообщения @ArbitrageSmartBot", ...],
+#   "exchanges": {"okx": {"markets": [...], "order_books": {"PENGU/USDT": {...}},
+#                         "balance": {"USDT": {"free": 1000}}}, ...},
+#   "http": {"gate": {"GET /api/v4/spot/accounts": [...], "POST /api/v4/spot/orders": {...}}, ...}
+# }
+
+
+def load_fixture(path: str) -> dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class FixtureResponse:
+    """Ответ с телом из фикстуры; тело разбирается при каждом чтении, как у настоящего ответа"""
+
+    def __init__(self, url: str, body: str, status: int = 200):
+        self.url = url
+        self.body = body
+        self.status = status
+
+    async def json(self, content_type=None):
+        return json.loads(self.body)
+
+    async def text(self) -> str:
+        return self.body
+
+    async def read(self) -> bytes:
+        return self.body.encode('utf-8')
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise aiohttp.ClientResponseError(None, (), status=self.status, message=f"нет в фикстуре: {self.url}")
+
+    def release(self):
+        pass
+
+
+class _FixtureRequest:
+    def __init__(self, session: 'FixtureSession', response: FixtureResponse):
+        self.session = session
+        self.response = response
+
+    async def __aenter__(self) -> FixtureResponse:
+        if self.session.latency:
+            await asyncio.sleep(self.session.latency)
+        return self.response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.response.release()
+
+
+class FixtureSession:
+    """Подмена aiohttp-сессии: ответ ищется по ключу 'МЕТОД /путь' (query не учитывается)"""
+
+    def __init__(self, routes: Dict[str, Any], latency: float = 0.0):
+        self.routes = {key: json.dumps(payload) for key, payload in routes.items()}
+        self.latency = latency
+        self.closed = False
+        self.requests: List[str] = []
+
+    def _request(self, method: str, url: str) -> _FixtureRequest:
+        key = f"{method} {urlsplit(url).path}"
+        self.requests.append(key)
+        body = self.routes.get(key)
+        if body is None:
+            return _FixtureRequest(self, FixtureResponse(url, json.dumps({'message': 'not found'}), 404))
+        return _FixtureRequest(self, FixtureResponse(url, body))
+
+    def get(self, url, **kwargs):
+        return self._request('GET', url)
+
+    def post(self, url, **kwargs):
+        return self._request('POST', url)
+
+    async def close(self):
+        self.closed = True
+
+
+class FixtureExchange:
+    """Клиент биржи поверх фикстуры: рыночные ордера исполняются по стакану фикстуры"""
+
+    _order_ids = itertools.count(1)
+
+    def __init__(self, exchange_id: str, markets: List[dict], order_books: Dict[str, dict],
+                 balance: Dict[str, dict] = None, latency: float = 0.0):
+        self.id = exchange_id
+        self.apiKey = self.secret = self.password = 'fixture'
+        self.options = {}
+        self.markets: Dict[str, dict] = {}
+        self.set_markets(markets)
+        self.order_books = order_books
+        self.balance = balance if balance is not None else {'USDT': {'free': 1000.0, 'used': 0.0, 'total': 1000.0}}
+        self.latency = latency
+        self.orders: Dict[str, dict] = {}
+
+    async def _network(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def set_markets(self, markets, currencies=None):
+        markets = markets.values() if isinstance(markets, dict) else markets
+        self.markets = {market['symbol']: market for market in markets}
+        return self.markets
+
+    def market(self, symbol: str) -> dict:
+        return self.markets[symbol]
+
+    def amount_to_precision(self, symbol: str, amount: float) -> str:
+        """Округление вниз до шага количества (precisionMode TICK_SIZE, как в ccxt)"""
+        step = self.markets[symbol]['precision']['amount']
+        decimals = max(0, -int(math.floor(math.log10(step))))
+        return f"{math.floor(amount / step + 1e-9) * step:.{decimals}f}"
+
+    async def load_markets(self, reload=False, params={}):
+        if reload:
+            await self._network()
+        return self.markets
+
+    async def fetch_order_book(self, symbol: str, limit=None, params={}):
+        await self._network()
+        return self.order_books[symbol]
+
+    async def fetch_ticker(self, symbol: str, params={}):
+        await self._network()
+        book = self.order_books[symbol]
+        bid = book['bids'][0][0] if book['bids'] else None
+        ask = book['asks'][0][0] if book['asks'] else None
+        return {'symbol': symbol, 'bid': bid, 'ask': ask, 'last': ask or bid}
+
+    async def fetch_balance(self, params={}):
+        await self._network()
+        return self.balance
+
+    async def _market_order(self, symbol: str, side: str, amount: float, by: str) -> dict:
+        await self._network()
+        book = self.order_books[symbol]
+        walk = walk_book(book['asks'] if side == 'buy' else book['bids'], amount, by=by).at(0)
+        order_id = str(next(self._order_ids))
+        order = {
+            'id': order_id, 'symbol': symbol, 'type': 'market', 'side': side,
+            'status': 'closed' if walk['complete'] else 'canceled',
+            'amount': walk['base'], 'filled': walk['base'], 'remaining': 0.0,
+            'average': walk['vwap'], 'cost': walk['quote'],
+        }
+        self.orders[order_id] = order
+        return order
+
+    async def create_market_buy_order(self, symbol: str, amount: float, params={}):
+        # Как у Bitget: при createMarketBuyOrderRequiresPrice=False amount - сумма в квоте
+        by_quote = params.get('createMarketBuyOrderRequiresPrice',
+                              self.options.get('createMarketBuyOrderRequiresPrice', True)) is False
+        return await self._market_order(symbol, 'buy', amount, 'quote' if by_quote else 'base')
+
+    async def create_market_sell_order(self, symbol: str, amount: float, params={}):
+        return await self._market_order(symbol, 'sell', amount, 'base')
+
+    async def fetch_order(self, order_id: str, symbol: str = None, params={}):
+        await self._network()
+        return self.orders[order_id]
+
+    async def close(self):
+        pass
+
+
+def build_exchanges(fixture: dict, latency: float = 0.0) -> Dict[str, FixtureExchange]:
+    """Клиенты бирж для всех бирж фикстуры"""
+    return {
+        name: FixtureExchange(name, data.get('markets', []), data.get('order_books', {}),
+                              data.get('balance'), latency)
+        for name, data in fixture.get('exchanges', {}).items()
+    }
+
+
+def build_sessions(fixture: dict, latency: float = 0.0) -> Dict[str, FixtureSession]:
+    """HTTP-сессии для прямых REST-запросов по биржам фикстуры"""
+    return {name: FixtureSession(routes, latency) for name, routes in fixture.get('http', {}).items()}
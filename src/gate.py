@@ -1,19 +1,23 @@
 # coding: utf-8
 
-import requests
-import time
-import hashlib
-import hmac
-import json
+import asyncio
+import ccxt.async_support as ccxt
+import re
 import sys
 import os
 from dotenv import load_dotenv
-from utils import gen_sign, get_balance, get_price, send_order, get_max_borrowable_gate, is_borrowable_gate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.executors import GateExecutor
+from src.markets import restore_markets
+from src.logs import setup_logging, shutdown_logging
+from src.ratelimit import RateLimiter
+from src.http_pool import HttpPool
 
 load_dotenv()
 
-import sys
 sys.stdout.reconfigure(encoding='utf-8')
+setup_logging(path=None)  # события исполнителя - в консоль
 
 symbol_raw = sys.argv[1] if len(sys.argv) > 1 else None
 deposit = int(sys.argv[2]) if len(sys.argv) > 2 else None
@@ -26,7 +30,6 @@ if not symbol_raw or "/" not in symbol_raw or deposit is None or deposit <= 0:
     sys.exit(1)
 
 # Дополнительная валидация символа
-import re
 if not re.match(r'^[A-Z0-9]+/[A-Z0-9]+$', symbol_raw):
     print("❌ Ошибка: некорректный формат символа")
     sys.exit(1)
@@ -36,57 +39,26 @@ if deposit > 10000:  # Максимальный лимит
     print("❌ Ошибка: депозит превышает максимальный лимит")
     sys.exit(1)
 
-symbol_api = symbol_raw.replace("/", "_")
-base, quote = symbol_raw.split("/")
+exchange = ccxt.gate({
+    'apiKey': os.getenv('GATE_KEY'),
+    'secret': os.getenv('GATE_SECRET'),
+})
+restore_markets(exchange, 'gate')  # рынки из снимка бота, без load_markets по сети
+limiter = RateLimiter()  # лимиты частоты запросов, общие для ccxt и прямого REST
+limiter.install(exchange, 'gate')
 
-host = "https://api.gateio.ws"
-prefix = "/api/v4"
 
-api_key = os.getenv('GATE_KEY')
-api_secret = os.getenv('GATE_SECRET')
+async def run():
+    try:
+        async with HttpPool(limiter=limiter) as http:
+            return await GateExecutor(exchange, http.session('gate')).sell(symbol_raw, deposit, filled_amount)
+    finally:
+        await exchange.close()
 
-available_usdt = min(deposit, get_balance(quote, host, prefix, api_key, api_secret))
-if available_usdt <= 0:
-    print(f"GATE - ❌ Недостаточно {quote}: {available_usdt}")
-    sys.exit(1)
 
-price = get_price(symbol_api, host, prefix)
-if not price:
-    print("GATE - ❌ Не удалось получить цену актива")
+result = asyncio.run(run())
+shutdown_logging()  # дописать события исполнителя до FILLED_AMOUNT
+if not result.success:
     sys.exit(1)
-
-if filled_amount and filled_amount > 0:
-    amount = filled_amount
-else:
-    amount = round(available_usdt / price, 6)
-
-print(f"GATE - Доступно {available_usdt} {quote} USDT — продаем {amount} {base}")
-
-# Проверяем доступность займа
-if not is_borrowable_gate(symbol_api, host, prefix):
-    print(f"GATE - ❌ Займ для {base} недоступен")
-    sys.exit(1)
-
-max_borrowable = get_max_borrowable_gate(symbol_api, host, prefix, api_key, api_secret)
-print(f"GATE - Максимально доступный заем: {max_borrowable} {base}")
-
-if amount > max_borrowable:
-    print(f"GATE - ❌ Недостаточно заемных средств для {base}: {max_borrowable}")
-    sys.exit(1)
-
-try:
-    order = send_order(symbol_api, host, prefix, api_key, api_secret, amount)
-    if not order or 'amount' not in order:
-        print(f"GATE - ❌ Недостаточно заемных средств для {base}")
-        sys.exit(1)
-    print(f"GATE - ✅ Ордер выполнен: {order['amount']} {order['currency_pair'].replace('/', '')}")
-    # Выводим количество для передачи в основной скрипт
-    print(f"FILLED_AMOUNT:{order['amount']}")
-except Exception as e:
-    if 'amount' in str(e):
-        print(f"GATE - ❌ Недостаточно заемных средств для {base}")
-        sys.exit(1)
-    print(f"GATE - ❌ Ошибка: {str(e)}")
-    if 'AUTO_BORROW_TOO_MUCH' in str(e):
-        print("GATE - ❌ Уменьшите сумму ордера или проверьте лимиты маржинального займа")
-        sys.exit(1)
+# Выводим количество для передачи в основной скрипт
+print(f"FILLED_AMOUNT:{result.filled}")
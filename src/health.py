@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from typing import Callable, Optional
+
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# Состояние процесса бота для супервизора панели (src/supervisor.py).
+# Heartbeat раз в interval секунд пишет в JSON-файл (BOT_STATUS) pid, время,
+# роль (standby / active), готовность и задержку цикла событий: насколько
+# позже запланированного проснулся asyncio.sleep. Задержка растет, когда
+# цикл занят синхронной работой; файл, который перестал обновляться, -
+# признак зависшего процесса.
+
+LAG_WINDOW = 60  # замеров в окне максимума
+
+
+class Heartbeat:
+    def __init__(self, path: Optional[str], get_status: Callable[[], dict], interval: float = 1.0):
+        self.path = path  # None - без файла состояния (запуск без супервизора)
+        self.get_status = get_status
+        self.interval = interval
+        self.lags = deque(maxlen=LAG_WINDOW)  # задержки цикла событий, с
+        self.task = None
+
+    def snapshot(self) -> dict:
+        status = {
+            'pid': os.getpid(),
+            'ts': time.time(),
+            'loop_lag_ms': round(self.lags[-1] * 1000, 3) if self.lags else None,
+            'loop_lag_max_ms': round(max(self.lags) * 1000, 3) if self.lags else None,
+        }
+        status.update(self.get_status())
+        return status
+
+    def save(self):
+        """Записать состояние атомарно, чтобы супервизор не прочитал половину файла"""
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning(f"⚠️ Не удалось записать состояние процесса: {e}")
+
+    async def _loop(self):
+        while True:
+            self.save()
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.monotonic() - expected))
+
+    def start(self):
+        if self.path and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+
+
+def read_status(path: str) -> Optional[dict]:
+    """Последнее состояние процесса; None, если файла еще нет"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
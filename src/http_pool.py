@@ -0,0 +1,172 @@
+import asyncio
+from typing import Dict
+
+import aiohttp
+
+from src.logs import get_logger
+from src.ratelimit import RateLimiter
+
+log = get_logger(__name__)
+
+# Пул HTTP-соединений для прямых REST-запросов к биржам.
+# На каждую биржу - своя aiohttp-сессия с keep-alive, так что TCP+TLS
+# рукопожатие выполняется один раз при прогреве, а не на пути ордера.
+# Фоновая задача периодически повторяет прогрев, чтобы соединения
+# не закрывались по простою. GET-запросы повторяются при сетевых ошибках
+# и ответах 429/5xx с экспоненциальной паузой; POST (ордера) - никогда.
+# Каждый запрос (и каждый повтор) сначала ждет токенов RateLimiter биржи.
+
+VENUE_URLS = {
+    'gate': 'https://api.gateio.ws',
+    'kucoin': 'https://api.kucoin.com',
+}
+
+# Легкие публичные запросы для открытия соединений
+WARMUP_PATHS = {
+    'gate': '/api/v4/spot/time',
+    'kucoin': '/api/v1/timestamp',
+}
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+
+
+class RetryingSession:
+    """Обертка над aiohttp.ClientSession: лимит частоты для GET/POST и повтор GET, остальное как есть"""
+
+    def __init__(self, session: aiohttp.ClientSession, retries: int = 2, backoff: float = 0.2,
+                 venue: str = 'default', limiter: RateLimiter = None):
+        self.session = session
+        self.retries = retries
+        self.backoff = backoff
+        self.venue = venue
+        self.limiter = limiter
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    async def wait_turn(self, method: str, url, kwargs: dict):
+        if self.limiter is not None:
+            await self.limiter.acquire_url(self.venue, method, url, kwargs.get('headers'))
+
+    def get(self, url, **kwargs):
+        return _RetryingRequest(self, url, kwargs)
+
+    def post(self, url, **kwargs):
+        return _LimitedRequest(self, url, kwargs)
+
+
+class _LimitedRequest:
+    """POST без повторов: только ожидание лимита перед отправкой"""
+
+    def __init__(self, owner: RetryingSession, url, kwargs):
+        self.owner = owner
+        self.url = url
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        await self.owner.wait_turn('POST', self.url, self.kwargs)
+        self.response = await self.owner.session.post(self.url, **self.kwargs)
+        return self.response
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.response is not None:
+            self.response.release()
+
+
+class _RetryingRequest:
+    def __init__(self, owner: RetryingSession, url, kwargs):
+        self.owner = owner
+        self.url = url
+        self.kwargs = kwargs
+        self.response = None
+
+    async def __aenter__(self) -> aiohttp.ClientResponse:
+        retries = self.owner.retries
+        for attempt in range(retries + 1):
+            await self.owner.wait_turn('GET', self.url, self.kwargs)
+            try:
+                response = await self.owner.session.get(self.url, **self.kwargs)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+            else:
+                if response.status not in RETRY_STATUSES or attempt == retries:
+                    self.response = response
+                    return response
+                response.release()
+            await asyncio.sleep(self.owner.backoff * 2 ** attempt)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if self.response is not None:
+            self.response.release()
+
+
+class HttpPool:
+    def __init__(self, urls: Dict[str, str] = None, timeout: aiohttp.ClientTimeout = DEFAULT_TIMEOUT,
+                 timeouts: Dict[str, aiohttp.ClientTimeout] = None, limit_per_host: int = 16,
+                 keepalive_timeout: float = 60, retries: int = 2, backoff: float = 0.2,
+                 warm_connections: int = 2, limiter: RateLimiter = None):
+        self.urls = urls if urls is not None else VENUE_URLS
+        self.timeout = timeout
+        self.timeouts = timeouts if timeouts is not None else {}  # таймауты по биржам
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.warm_connections = warm_connections  # сколько соединений держать открытыми на биржу
+        self.limiter = limiter if limiter is not None else RateLimiter()
+        self.sessions: Dict[str, RetryingSession] = {}
+        self.task = None
+
+    def session(self, venue: str = 'default') -> RetryingSession:
+        """Сессия биржи; создается при первом обращении"""
+        session = self.sessions.get(venue)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host,
+                                             keepalive_timeout=self.keepalive_timeout,
+                                             ttl_dns_cache=300)
+            session = RetryingSession(
+                aiohttp.ClientSession(connector=connector, timeout=self.timeouts.get(venue, self.timeout)),
+                self.retries, self.backoff, venue, self.limiter,
+            )
+            self.sessions[venue] = session
+        return session
+
+    async def warm(self, venue: str):
+        """Открыть warm_connections соединений с биржей параллельными легкими запросами"""
+        url = self.urls[venue] + WARMUP_PATHS.get(venue, '/')
+        session = self.session(venue)
+
+        async def ping():
+            async with session.get(url) as response:
+                await response.read()
+
+        results = await asyncio.gather(*(ping() for _ in range(self.warm_connections)), return_exceptions=True)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            log.warning(f"⚠️ Прогрев соединений {venue} не удался: {errors[0]!r}")
+
+    def start(self):
+        """Прогреть соединения сейчас и поддерживать их до закрытия пула"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._keep_warm())
+
+    async def _keep_warm(self):
+        while True:
+            await asyncio.gather(*(self.warm(venue) for venue in self.urls))
+            await asyncio.sleep(self.keepalive_timeout * 0.8)
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        for session in self.sessions.values():
+            await session.close()
+        self.sessions.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
@@ -0,0 +1,342 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.logs import get_logger
+from src.signals import parse_message
+
+log = get_logger(__name__)
+
+# Журнал сделок (SQLite).
+# Каждый сигнал, дошедший до расчета цен, - строка signals: текст и источник
+# (Telegram или сканер), цены покупки/продажи по стаканам, итог проверок,
+# исход (rejected / capital_busy / executed / partial / failed / error) и задержки этапов из
+# трассы (src/tracing.py). Каждая нога сделки - строка fills: биржа, сторона,
+# id ордера, исполненный объём, средняя цена, стоимость, комиссия, ошибка и
+# время ордера. Текущий сигнал хранится в contextvar, как и трасса, поэтому
+# ноги из asyncio.gather попадают к своему сигналу без явной передачи id.
+# На пути сделки запись - только кортеж в очередь; разбор текста, JSON этапов
+# и INSERT пачками в одной транзакции делает фоновый поток раз в flush_interval.
+# Индексы - по символу, бирже и времени; запросы для панели - pnl и fill_rate.
+
+JOURNAL_PATH = './trades.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS signals (
+    id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    source TEXT,
+    symbol TEXT NOT NULL,
+    buy_venue TEXT NOT NULL,
+    sell_venue TEXT NOT NULL,
+    signal_spread REAL,
+    buy_price REAL,
+    sell_price REAL,
+    spread REAL,
+    valid INTEGER,
+    outcome TEXT,
+    paper INTEGER NOT NULL DEFAULT 0,
+    total_ms REAL,
+    stages TEXT,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_signals_ts ON signals (ts);
+CREATE INDEX IF NOT EXISTS idx_signals_symbol_ts ON signals (symbol, ts);
+CREATE INDEX IF NOT EXISTS idx_signals_route_ts ON signals (buy_venue, sell_venue, ts);
+
+CREATE TABLE IF NOT EXISTS fills (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    signal_id TEXT,
+    ts REAL NOT NULL,
+    venue TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    operation TEXT,
+    success INTEGER NOT NULL,
+    order_id TEXT,
+    filled REAL,
+    average REAL,
+    cost REAL,
+    fee REAL,
+    error TEXT,
+    latency_ms REAL,
+    paper INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_fills_signal ON fills (signal_id);
+CREATE INDEX IF NOT EXISTS idx_fills_venue_ts ON fills (venue, ts);
+CREATE INDEX IF NOT EXISTS idx_fills_symbol_ts ON fills (symbol, ts);
+"""
+
+_INSERT_SIGNAL = 'INSERT OR REPLACE INTO signals VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+_INSERT_FILL = ('INSERT INTO fills (signal_id, ts, venue, symbol, side, operation, success, order_id, filled, '
+                'average, cost, fee, error, latency_ms, paper) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)')
+
+
+@dataclass(slots=True)
+class SignalEntry:
+    """Сигнал в работе: поля заполняются по ходу обработки, строка пишется в конце"""
+    id: str
+    ts: float
+    symbol: str
+    buy_venue: str
+    sell_venue: str
+    text: Optional[str] = None
+    buy_price: Optional[float] = None
+    sell_price: Optional[float] = None
+    valid: Optional[bool] = None  # None - проверки выключены
+    outcome: Optional[str] = None
+
+
+_current: ContextVar[Optional[SignalEntry]] = ContextVar('journal_signal', default=None)
+
+
+def note(**fields):
+    """Дополнить текущий сигнал (цены, итог проверок, исход); вне сигнала - ничего"""
+    entry = _current.get()
+    if entry is not None:
+        for name, value in fields.items():
+            setattr(entry, name, value)
+
+
+def _number(value) -> Optional[float]:
+    try:
+        return float(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def fill_fee(result) -> Optional[float]:
+    """Комиссия ноги: из FillResult, иначе из ответа биржи (ccxt {'cost': ...} или поле Gate)"""
+    if result.fee is not None:
+        return result.fee
+    fee = (result.raw or {}).get('fee')
+    return _number(fee.get('cost')) if isinstance(fee, dict) else _number(fee)
+
+
+class TradeJournal:
+    def __init__(self, path: Optional[str] = JOURNAL_PATH, paper: bool = False, flush_interval: float = 0.5):
+        self.path = path  # None - журнал выключен
+        self.paper = paper
+        self.flush_interval = flush_interval
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.thread: Optional[threading.Thread] = None
+        self.written = 0
+
+    def open_signal(self, symbol: str, buy_venue: str, sell_venue: str, text: str = None,
+                    received_at: datetime = None) -> SignalEntry:
+        """Начать запись сигнала и сделать его текущим для note() и fill()"""
+        entry = SignalEntry(uuid.uuid4().hex, received_at.timestamp() if received_at else time.time(),
+                            symbol, buy_venue, sell_venue, text)
+        _current.set(entry)
+        return entry
+
+    def close_signal(self, entry: SignalEntry, trace=None):
+        """Сигнал обработан: строка signals с этапами трассы уходит в очередь записи"""
+        _current.set(None)
+        self._put(('signal', entry, trace.name if trace is not None else None,
+                   list(trace.spans) if trace is not None else None))
+
+    def fill(self, operation: str, venue: str, symbol: str, side: str, result, latency_ms: float = None):
+        """Нога сделки (FillResult или None при исключении исполнителя)"""
+        entry = _current.get()
+        self._put(('fill', entry.id if entry is not None else None, time.time(), operation, venue, symbol, side,
+                   result, latency_ms))
+
+    def _put(self, item: tuple):
+        if not self.path:
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='journal', daemon=True)
+            self.thread.start()
+        self.queue.put(item)
+
+    def _signal_row(self, entry: SignalEntry, source: Optional[str], spans: Optional[List[dict]]) -> tuple:
+        stages: Dict[str, float] = {}
+        for s in spans or ():
+            stages[s['stage']] = round(stages.get(s['stage'], 0.0) + s['duration_ms'], 3)
+        total_ms = stages.pop('total', None)
+        signal = parse_message(entry.text) if entry.text else None
+        spread = ((entry.sell_price - entry.buy_price) / entry.buy_price
+                  if entry.buy_price and entry.sell_price else None)
+        return (entry.id, entry.ts, source, entry.symbol, entry.buy_venue, entry.sell_venue,
+                signal.spread if signal is not None else None, entry.buy_price, entry.sell_price, spread,
+                None if entry.valid is None else int(entry.valid), entry.outcome, int(self.paper), total_ms,
+                json.dumps(stages) if stages else None, entry.text)
+
+    def _fill_row(self, signal_id, ts, operation, venue, symbol, side, result, latency_ms) -> tuple:
+        if result is None:
+            return (signal_id, ts, venue, symbol, side, operation, 0, None, None, None, None, None,
+                    'исключение исполнителя', latency_ms, int(self.paper))
+        cost = _number(result.cost)
+        if cost is None and result.filled and result.average:
+            cost = result.filled * result.average
+        return (signal_id, ts, venue, symbol, result.side or side, operation, int(result.success),
+                str(result.order_id) if result.order_id is not None else None, result.filled or 0.0,
+                _number(result.average), cost, fill_fee(result), result.error, latency_ms, int(self.paper))
+
+    def _write(self, conn: sqlite3.Connection, items: list):
+        signals, fills = [], []
+        for item in items:
+            if item[0] == 'signal':
+                signals.append(self._signal_row(*item[1:]))
+            else:
+                fills.append(self._fill_row(*item[1:]))
+        with conn:  # одна транзакция на пачку
+            if fills:
+                conn.executemany(_INSERT_FILL, fills)
+            if signals:
+                conn.executemany(_INSERT_SIGNAL, signals)
+        self.written += len(items)
+
+    def _run(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            conn = connect(self.path)
+            conn.executescript(SCHEMA)
+        except Exception as e:
+            log.error(f"❌ Журнал сделок недоступен: {e}", path=self.path)
+            self.path = None
+            return
+        try:
+            while True:
+                items = [self.queue.get()]
+                if items[0] is not None:
+                    time.sleep(self.flush_interval)
+                try:
+                    while True:
+                        items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    pass
+                stop = None in items
+                try:
+                    self._write(conn, [item for item in items if item is not None])
+                except Exception as e:
+                    log.warning(f"⚠️ Не удалось записать журнал сделок: {e}", count=len(items))
+                if stop:
+                    return
+        finally:
+            conn.close()
+
+    def close(self):
+        """Дописать очередь и остановить поток записи"""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+def connect(path: str, readonly: bool = False) -> sqlite3.Connection:
+    """Соединение с журналом: WAL - панель читает, пока бот пишет"""
+    if readonly:
+        conn = sqlite3.connect(f'file:{os.path.abspath(path)}?mode=ro', uri=True, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(path)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+# Запросы для панели управления
+
+GROUPS = {
+    'symbol': 's.symbol',
+    'route': "s.buy_venue || '→' || s.sell_venue",
+    'day': "date(s.ts, 'unixepoch', 'localtime')",
+}
+FILL_GROUPS = {'venue': 'venue', 'symbol': 'symbol', 'side': 'side'}
+
+
+def _where(alias: str, since: float = None, until: float = None, paper: bool = None, **columns) -> tuple:
+    clauses, params = [], []
+    if since is not None:
+        clauses.append(f'{alias}ts >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append(f'{alias}ts < ?')
+        params.append(until)
+    if paper is not None:
+        clauses.append(f'{alias}paper = ?')
+        params.append(int(paper))
+    for column, value in columns.items():
+        if value is not None:
+            clauses.append(f'{alias}{column} = ?')
+            params.append(value)
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def pnl(conn: sqlite3.Connection, group: str = 'symbol', since: float = None, until: float = None,
+        paper: bool = None) -> List[dict]:
+    """Результат исполненных сигналов по денежному потоку в квоте: выручка продаж
+    минус стоимость покупок минус комиссии (довыравнивания входят в свой сигнал);
+    open_amount - купленное и не проданное количество базового актива"""
+    if group not in GROUPS:
+        raise ValueError(f"группировка {group!r} не поддерживается: {', '.join(GROUPS)}")
+    where, params = _where('s.', since, until, paper)
+    rows = conn.execute(f"""
+        SELECT {GROUPS[group]} AS key,
+               COUNT(DISTINCT s.id) AS trades,
+               SUM(CASE WHEN f.side = 'buy' THEN f.cost ELSE 0 END) AS bought,
+               SUM(CASE WHEN f.side = 'sell' THEN f.cost ELSE 0 END) AS sold,
+               SUM(COALESCE(f.fee, 0)) AS fees,
+               SUM(CASE WHEN f.side = 'buy' THEN f.filled ELSE -f.filled END) AS open_amount
+        FROM signals s JOIN fills f ON f.signal_id = s.id AND f.success = 1{where}
+        GROUP BY key ORDER BY key
+    """, params).fetchall()
+    result = []
+    for row in rows:
+        item = dict(row)
+        item['pnl'] = (item['sold'] or 0.0) - (item['bought'] or 0.0) - (item['fees'] or 0.0)
+        result.append(item)
+    return result
+
+
+def fill_rate(conn: sqlite3.Connection, group: str = 'venue', since: float = None, until: float = None,
+              paper: bool = None) -> dict:
+    """Доля исполненных ног и время ордера по группам, исходы сигналов"""
+    if group not in FILL_GROUPS:
+        raise ValueError(f"группировка {group!r} не поддерживается: {', '.join(FILL_GROUPS)}")
+    where, params = _where('', since, until, paper)
+    legs = conn.execute(f"""
+        SELECT {FILL_GROUPS[group]} AS key,
+               COUNT(*) AS orders,
+               SUM(success) AS filled,
+               ROUND(1.0 * SUM(success) / COUNT(*), 4) AS fill_rate,
+               ROUND(AVG(latency_ms), 1) AS avg_latency_ms,
+               ROUND(MAX(latency_ms), 1) AS max_latency_ms
+        FROM fills{where}
+        GROUP BY key ORDER BY key
+    """, params).fetchall()
+    outcomes = conn.execute(f"SELECT COALESCE(outcome, 'unknown') AS outcome, COUNT(*) AS n FROM signals{where} "
+                            f"GROUP BY outcome", params).fetchall()
+    return {'legs': [dict(row) for row in legs], 'signals': {row['outcome']: row['n'] for row in outcomes}}
+
+
+def recent_trades(conn: sqlite3.Connection, limit: int = 50, symbol: str = None, venue: str = None,
+                  since: float = None, until: float = None, paper: bool = None) -> List[dict]:
+    """Последние сигналы с ногами; venue - биржа покупки или продажи"""
+    where, params = _where('', since, until, paper, symbol=symbol)
+    if venue is not None:
+        where += (' AND' if where else ' WHERE') + ' (buy_venue = ? OR sell_venue = ?)'
+        params += [venue, venue]
+    signals = [dict(row) for row in conn.execute(
+        f'SELECT * FROM signals{where} ORDER BY ts DESC LIMIT ?', params + [limit]).fetchall()]
+    if not signals:
+        return []
+    by_id = {s['id']: s for s in signals}
+    for s in signals:
+        s['stages'] = json.loads(s['stages']) if s['stages'] else {}
+        s['fills'] = []
+    placeholders = ', '.join('?' * len(by_id))
+    for row in conn.execute(f'SELECT * FROM fills WHERE signal_id IN ({placeholders}) ORDER BY ts',
+                            list(by_id)).fetchall():
+        by_id[row['signal_id']]['fills'].append(dict(row))
+    return signals
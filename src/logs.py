@@ -0,0 +1,334 @@
+import atexit
+import functools
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Iterator, List, Optional, Tuple
+
+# Структурные логи.
+# Событие - сообщение плюс поля (символ, биржа, объём, id ордера...):
+#   log = get_logger(__name__)
+#   log.info("Ордер создан", venue='okx', order_id=order['id'])
+# Вызов на пути сделки только кладет в очередь кортеж (время, уровень,
+# логгер, сообщение, поля); LogRecord, форматирование в JSON и запись в файл
+# с ротацией (и в консоль) делает фоновый поток QueueListener. Записи
+# сторонних библиотек (telethon, ccxt) идут в ту же очередь через QueueHandler. Секреты (ключи, подписи, пароли) маскируются
+# по имени поля в момент отправки события, до того как запись покинет
+# вызывающий поток, - регулярных выражений по готовому тексту нет.
+#
+# Файл - JSON Lines: {"ts", "level", "logger", "msg", ...поля, "exc"}.
+# Его читает панель управления (src/utils/app.py): хвост файла - чтением
+# блоков с конца (tail_lines), новые строки - по мере записи (follow_lines).
+
+LOG_PATH = './xyz415.log'
+REDACTED = '***'
+SENSITIVE = ('secret', 'password', 'passphrase', 'signature', 'token', 'apikey', 'api_key', 'api-key', 'authorization')
+SENSITIVE_SUFFIXES = ('key', 'sign')  # key, api_key, KC-API-SIGN - но не signal_spread
+
+# Стандартные атрибуты LogRecord - все прочее из extra считается полями события
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'fields'}
+
+_listener: Optional['EventListener'] = None
+_queue: Optional[queue.SimpleQueue] = None
+
+
+@functools.lru_cache(maxsize=1024)
+def is_sensitive(name: str) -> bool:
+    name = str(name).lower()
+    if any(name == suffix or name.endswith(('_' + suffix, '-' + suffix)) for suffix in SENSITIVE_SUFFIXES):
+        return True
+    return any(part in name for part in SENSITIVE)
+
+
+def redact(value: Any, name: str = '') -> Any:
+    """Замаскировать секреты в значении поля (вложенные словари - по ключам)"""
+    if name and is_sensitive(name):
+        return REDACTED
+    if isinstance(value, dict):
+        return {k: redact(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v) for v in value]
+    return value
+
+
+def redact_fields(fields: dict) -> dict:
+    """Замаскировать поля события на месте; обычные скалярные поля не копируются"""
+    for name, value in fields.items():
+        if is_sensitive(name) or isinstance(value, (dict, list, tuple)):
+            fields[name] = redact(value, name)
+    return fields
+
+
+def event_fields(record: logging.LogRecord) -> dict:
+    fields = getattr(record, 'fields', None)
+    if fields is not None:  # событие EventLogger
+        return fields
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}  # extra сторонних логгеров
+
+
+class RedactingQueueHandler(logging.handlers.QueueHandler):
+    """Кладет событие в очередь; поля маскируются здесь, в потоке, отправившем событие.
+    Запись не копируется: это единственный обработчик корневого логгера"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        record.fields = redact_fields(dict(event_fields(record)))
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class EventListener:
+    """Поток записи. Просыпается на первое событие и через flush_interval забирает
+    из очереди все накопленное пачкой: при потоке событий поток логов не будит
+    торговый цикл на каждую запись и реже перехватывает GIL"""
+
+    _stop = object()
+
+    def __init__(self, log_queue: queue.SimpleQueue, *handlers: logging.Handler, flush_interval: float = 0.05):
+        self.queue = log_queue
+        self.handlers = handlers
+        self.flush_interval = flush_interval
+        self.thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def prepare(item) -> logging.LogRecord:
+        """Кортеж события -> LogRecord (записи сторонних логгеров приходят готовыми)"""
+        if isinstance(item, logging.LogRecord):
+            return item
+        created, level, name, msg, fields = item
+        record = logging.makeLogRecord({'name': name, 'msg': msg, 'levelno': level,
+                                        'levelname': logging.getLevelName(level), 'fields': fields})
+        record.created = created
+        record.msecs = (created - int(created)) * 1000
+        return record
+
+    def handle(self, item):
+        if not self.handlers:
+            return
+        record = self.prepare(item)
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def _run(self):
+        while True:
+            items = [self.queue.get()]
+            if items[0] is not self._stop:
+                time.sleep(self.flush_interval)
+            try:
+                while True:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            for item in items:
+                if item is self._stop:
+                    return
+                try:
+                    self.handle(item)
+                except Exception:
+                    pass  # сбой записи лога не должен останавливать поток логов
+            for handler in self.handlers:
+                handler.flush()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='logs', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Дописать все, что уже в очереди, и остановить поток"""
+        if self.thread is not None:
+            self.queue.put(self._stop)
+            self.thread.join()
+            self.thread = None
+        for handler in self.handlers:
+            handler.close()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        event = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        event.update(getattr(record, 'fields', None) or {})
+        if record.exc_text:
+            event['exc'] = record.exc_text
+        return json.dumps(event, ensure_ascii=False, default=str)
+
+
+def format_event(event: dict) -> str:
+    """Событие JSON-лога в строку для человека: время - уровень - сообщение | поля"""
+    ts = event.get('ts')
+    when = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts)) if isinstance(ts, (int, float)) else ts
+    fields = ' '.join(f'{k}={v}' for k, v in event.items() if k not in ('ts', 'level', 'logger', 'msg', 'exc'))
+    line = f"{when} - {event.get('level', 'INFO')} - {event.get('msg', '')}" + (f" | {fields}" if fields else '')
+    return line + (f"\n{event['exc']}" if event.get('exc') else '')
+
+
+def parse_line(line: str) -> str:
+    """Строка лог-файла для вывода: JSON-событие форматируется, старые текстовые строки - как есть"""
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            return format_event(json.loads(line))
+        except ValueError:
+            pass
+    return line
+
+
+def tail_lines(path: str, n: int = 50, block_size: int = 8192) -> Tuple[List[str], int]:
+    """Последние n строк файла чтением блоков с конца (без чтения всего файла).
+    Возвращает строки и смещение конца прочитанного - с него продолжает follow_lines"""
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        position, data = end, b''
+        while position > 0 and data.count(b'\n') <= n:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.decode('utf-8', errors='replace').splitlines()
+    if position > 0:
+        lines = lines[1:]  # первая строка блока может быть обрезана
+    return [line for line in lines if line.strip()][-n:], end
+
+
+def follow_lines(path: str, offset: int = 0, interval: float = 0.5,
+                 heartbeat: float = 15.0) -> Iterator[Tuple[List[str], int]]:
+    """Новые полные строки файла с offset по мере записи: (строки, смещение после них).
+    Каждые heartbeat секунд без записей отдает пустой список (проверка, что клиент
+    еще слушает). Ротация (файл заменен или стал короче) - новый файл с начала"""
+    f, inode, partial, idle = None, None, b'', 0.0
+    try:
+        while True:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stat = None
+            if stat is not None and (f is None or stat.st_ino != inode or stat.st_size < offset):
+                if f is not None:
+                    rest = partial + f.read()  # дописанное в старый файл до ротации
+                    f.close()
+                    lines = [line.decode('utf-8', errors='replace') for line in rest.split(b'\n') if line.strip()]
+                    if lines:
+                        yield lines, 0
+                if f is not None or stat.st_size < offset:
+                    offset, partial = 0, b''
+                f, inode = open(path, 'rb'), stat.st_ino
+                f.seek(offset)
+            data = f.read() if f is not None else b''
+            if data:
+                offset += len(data)
+                *complete, partial = (partial + data).split(b'\n')
+                lines = [line.decode('utf-8', errors='replace') for line in complete if line.strip()]
+                if lines:
+                    idle = 0.0
+                    yield lines, offset - len(partial)
+                    continue
+            time.sleep(interval)
+            idle += interval
+            if idle >= heartbeat:
+                idle = 0.0
+                yield [], offset - len(partial)
+    finally:
+        if f is not None:
+            f.close()
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return format_event({'ts': record.created, 'level': record.levelname, 'msg': record.getMessage(),
+                             **(getattr(record, 'fields', None) or {}),
+                             **({'exc': record.exc_text} if record.exc_text else {})})
+
+
+class EventLogger(logging.LoggerAdapter):
+    """Логгер с полями события в именованных аргументах: log.info("...", symbol=symbol)"""
+
+    def _emit(self, level, msg, args, fields, exc_info=None):
+        logger = self.logger
+        if not logger.isEnabledFor(level):
+            return
+        if _queue is not None and not exc_info:
+            # Быстрый путь: маскирование полей и кортеж в очередь, запись собирает поток логов
+            _queue.put((time.time(), level, logger.name, msg % args if args else msg, redact_fields(fields)))
+            return
+        if exc_info and not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+        # Без поиска вызывающего кадра (findCaller): он дороже самой записи
+        record = logger.makeRecord(logger.name, level, '', 0, msg, args, exc_info, extra={'fields': fields})
+        logger.handle(record)
+
+    def log(self, level, msg, *args, exc_info=None, **fields):
+        self._emit(level, msg, args, fields, exc_info)
+
+    def debug(self, msg, *args, **fields):
+        self._emit(logging.DEBUG, msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        self._emit(logging.INFO, msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        self._emit(logging.WARNING, msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        self._emit(logging.ERROR, msg, args, fields)
+
+    def exception(self, msg, *args, **fields):
+        self._emit(logging.ERROR, msg, args, fields, exc_info=True)
+
+
+def get_logger(name: str) -> EventLogger:
+    return EventLogger(logging.getLogger(name), {})
+
+
+def setup_logging(path: Optional[str] = LOG_PATH, level: str = None, console: bool = True,
+                  max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+    """Настроить корневой логгер: очередь -> (файл JSON с ротацией, консоль).
+    path=None - без файла (CLI-скрипты), console=False - без вывода в консоль"""
+    global _listener, _queue
+    shutdown_logging()
+    handlers = []
+    if path:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                            encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(ConsoleFormatter())
+        handlers.append(console_handler)
+
+    logging.logMultiprocessing = False  # имя процесса в событии не нужно, а его поиск - на каждой записи
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(RedactingQueueHandler(log_queue))
+    root.setLevel((level or os.getenv('LOG_LEVEL', 'INFO')).upper())
+    _listener = EventListener(log_queue, *handlers)
+    _listener.start()
+    _queue = log_queue
+    atexit.register(shutdown_logging)  # поток записи - демон: без этого хвост очереди теряется при выходе
+    return _listener
+
+
+def shutdown_logging():
+    """Дописать очередь и остановить фоновый поток записи"""
+    global _listener, _queue
+    _queue = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,205 @@
+import asyncio
+import gzip
+import json
+import os
+import time
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# Индекс рынков по биржам: множество символов на биржу (проверка за O(1)),
+# свой TTL на каждую биржу и фоновое обновление до истечения TTL, чтобы сигнал
+# никогда не ждал load_markets(). Дополнительно хранится таблица маршрутов:
+# символ -> пары (биржа покупки, биржа продажи), где он торгуется на обеих.
+#
+# Метаданные рынков (id, точность, лимиты) сохраняются в сжатый снимок на диске:
+# при старте клиенты ccxt получают рынки из снимка без сети, а свежие рынки
+# догружаются и сверяются в фоне.
+
+EMPTY = frozenset()
+SNAPSHOT_PATH = './markets_snapshot.json.gz'
+SNAPSHOT_VERSION = 1
+
+
+def read_snapshot(path: str = SNAPSHOT_PATH) -> dict:
+    """Прочитать снимок рынков: {биржа: {'saved_at': ts, 'markets': [...]}}; {} если его нет"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        log.warning(f"⚠️ Снимок рынков {path} поврежден и будет пересоздан: {e}")
+        return {}
+    if data.get('version') != SNAPSHOT_VERSION:
+        return {}
+    return data.get('exchanges', {})
+
+
+def restore_markets(exchange, exchange_name: str, snapshot: dict = None) -> bool:
+    """Загрузить рынки клиента ccxt из снимка; True, если снимок для биржи был"""
+    snapshot = read_snapshot() if snapshot is None else snapshot
+    entry = snapshot.get(exchange_name)
+    if not entry:
+        return False
+    exchange.set_markets(entry['markets'])
+    return True
+
+
+class MarketIndex:
+    def __init__(self, get_exchange, buyer_exchanges: List[str], seller_exchanges: List[str],
+                 default_ttl: float = 300, ttl: Dict[str, float] = None,
+                 refresh_ahead: float = 0.8, retry_delay: float = 30,
+                 snapshot_path: str = SNAPSHOT_PATH):
+        self.get_exchange = get_exchange
+        self.buyer_exchanges = buyer_exchanges
+        self.seller_exchanges = seller_exchanges
+        self.default_ttl = default_ttl
+        self.ttl = ttl if ttl is not None else {}
+        self.refresh_ahead = refresh_ahead  # доля TTL, после которой запускается фоновое обновление
+        self.retry_delay = retry_delay
+        self.symbols: Dict[str, FrozenSet[str]] = {}
+        self.loaded_at: Dict[str, float] = {}
+        self.failed_at: Dict[str, float] = {}
+        self.routes: Dict[str, FrozenSet[Tuple[str, str]]] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+        self.task = None
+        self.snapshot_path = snapshot_path
+        self.snapshot: dict = {}
+
+    @property
+    def exchanges(self) -> List[str]:
+        return self.buyer_exchanges + self.seller_exchanges
+
+    def ttl_for(self, exchange_name: str) -> float:
+        return self.ttl.get(exchange_name, self.default_ttl)
+
+    def is_expired(self, exchange_name: str) -> bool:
+        loaded_at = self.loaded_at.get(exchange_name)
+        return loaded_at is None or time.monotonic() - loaded_at > self.ttl_for(exchange_name)
+
+    async def get(self, exchange_name: str) -> FrozenSet[str]:
+        """Символы биржи. Загружает синхронно только если данных нет совсем,
+        иначе отдает текущие и обновляет их в фоне"""
+        if exchange_name not in self.symbols:
+            await self.refresh(exchange_name)
+        elif self.is_expired(exchange_name):
+            self._refresh_in_background(exchange_name)
+        return self.symbols.get(exchange_name, EMPTY)
+
+    def has(self, exchange_name: str, symbol: str) -> bool:
+        return symbol in self.symbols.get(exchange_name, EMPTY)
+
+    def routes_for(self, symbol: str) -> FrozenSet[Tuple[str, str]]:
+        """Пары (покупка, продажа), на обеих биржах которых торгуется символ"""
+        return self.routes.get(symbol, EMPTY)
+
+    def is_routable(self, symbol: str, buy_exchange: str, sell_exchange: str) -> bool:
+        return (buy_exchange, sell_exchange) in self.routes.get(symbol, EMPTY)
+
+    async def refresh(self, exchange_name: str):
+        """Перезагрузить рынки биржи (одновременно - не больше одного запроса на биржу)"""
+        lock = self.locks.setdefault(exchange_name, asyncio.Lock())
+        if lock.locked():
+            async with lock:  # обновление уже идет - ждем его результат
+                return
+        async with lock:
+            try:
+                exchange = self.get_exchange(exchange_name)
+                markets = await exchange.load_markets(reload=exchange_name in self.symbols)
+                symbols = frozenset(markets)
+                previous = self.symbols.get(exchange_name)
+                self.symbols[exchange_name] = symbols
+                self.loaded_at[exchange_name] = time.monotonic()
+                self.failed_at.pop(exchange_name, None)
+                log.info(f"Загружены рынки для {exchange_name}: {len(markets)} символов")
+                if previous and previous != symbols:
+                    log.info(f"Рынки {exchange_name} изменились: +{len(symbols - previous)} / -{len(previous - symbols)}")
+            except Exception as e:
+                log.error(f"Ошибка загрузки рынков для {exchange_name}: {e}")
+                self.symbols.setdefault(exchange_name, EMPTY)
+                self.failed_at[exchange_name] = time.monotonic()
+                return
+            self._rebuild_routes()
+            self.save_snapshot(exchange_name, markets)
+
+    def load_snapshot(self):
+        """Поднять рынки из снимка на диске. Данные снимка считаются устаревшими:
+        фоновый цикл сразу перезагрузит и проверит их"""
+        started = time.perf_counter()
+        self.snapshot = read_snapshot(self.snapshot_path)
+        restored = []
+        for exchange_name in self.exchanges:
+            if restore_markets(self.get_exchange(exchange_name), exchange_name, self.snapshot):
+                self.symbols[exchange_name] = frozenset(m['symbol'] for m in self.snapshot[exchange_name]['markets'])
+                restored.append(exchange_name)
+        if restored:
+            self._rebuild_routes()
+            log.info(f"Рынки из снимка ({', '.join(restored)}) загружены за "
+                     f"{(time.perf_counter() - started) * 1000:.0f} мс")
+
+    def save_snapshot(self, exchange_name: str, markets: dict):
+        """Сохранить рынки биржи в снимок (атомарная запись через временный файл)"""
+        if not self.snapshot_path:
+            return
+        self.snapshot[exchange_name] = {
+            'saved_at': time.time(),
+            'markets': [self._compact(market) for market in markets.values()],
+        }
+        tmp_path = self.snapshot_path + '.tmp'
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump({'version': SNAPSHOT_VERSION, 'exchanges': self.snapshot}, f, separators=(',', ':'))
+            os.replace(tmp_path, self.snapshot_path)
+        except Exception as e:
+            log.warning(f"⚠️ Не удалось сохранить снимок рынков: {e}")
+
+    @staticmethod
+    def _compact(market: dict) -> dict:
+        """Оставить в рынке только то, что нужно для ордеров: без None и пустых значений"""
+        return {key: value for key, value in market.items() if value is not None and value != {}}
+
+    def _refresh_in_background(self, exchange_name: str):
+        lock = self.locks.get(exchange_name)
+        if lock is None or not lock.locked():
+            asyncio.create_task(self.refresh(exchange_name))
+
+    def _rebuild_routes(self):
+        routes: Dict[str, Set[Tuple[str, str]]] = {}
+        for buyer in self.buyer_exchanges:
+            buyer_symbols = self.symbols.get(buyer, EMPTY)
+            for seller in self.seller_exchanges:
+                for symbol in buyer_symbols & self.symbols.get(seller, EMPTY):
+                    routes.setdefault(symbol, set()).add((buyer, seller))
+        self.routes = {symbol: frozenset(pairs) for symbol, pairs in routes.items()}
+
+    def _next_due(self, exchange_name: str) -> float:
+        """Момент (monotonic), когда пора обновить рынки биржи"""
+        failed_at = self.failed_at.get(exchange_name)
+        if failed_at is not None:
+            return failed_at + self.retry_delay
+        loaded_at = self.loaded_at.get(exchange_name)
+        if loaded_at is None:
+            return 0.0
+        return loaded_at + self.ttl_for(exchange_name) * self.refresh_ahead
+
+    def start(self):
+        """Запустить фоновое обновление; первая загрузка всех бирж идет сразу"""
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            now = time.monotonic()
+            due = [name for name in self.exchanges if self._next_due(name) <= now]
+            if due:
+                await asyncio.gather(*(self.refresh(name) for name in due))
+                continue
+            next_due = min(self._next_due(name) for name in self.exchanges)
+            await asyncio.sleep(max(0.0, next_due - now))
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
@@ -1,117 +1,47 @@
-import ccxt
+import asyncio
+import ccxt.async_support as ccxt
 import sys
 import os
 from dotenv import load_dotenv
-import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.executors import MexcExecutor
+from src.markets import restore_markets
+from src.logs import setup_logging, shutdown_logging
+from src.ratelimit import RateLimiter
 
 load_dotenv()
 
-import sys
 sys.stdout.reconfigure(encoding='utf-8')
+setup_logging(path=None)  # события исполнителя - в консоль
 
 exchange = ccxt.mexc({
     'apiKey': os.getenv('MEXC_KEY'),
     'secret': os.getenv('MEXC_SECRET'),
 })
+restore_markets(exchange, 'mexc')  # рынки из снимка бота, без load_markets по сети
+RateLimiter().install(exchange, 'mexc')  # лимиты частоты запросов по эндпоинтам
 
 try:
     symbol = sys.argv[1]
     deposit = int(sys.argv[2])
-    # symbol = 'REX/USDT'
-    # deposit = 10
     if deposit <= 0 or '/' not in symbol:
         raise ValueError
 except:
     print("❌ MEXC - Ошибка: символ или депозит не указаны или некорректны")
     sys.exit(1) 
 
-base, quote = symbol.split('/')
-
-def retry_call(func, *args, retries=3, delay=2, **kwargs):
-    for i in range(retries):
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            print(f"Ретрай {i+1}/{retries}: {e}")
-            time.sleep(delay)
-    raise Exception(f"Не удалось выполнить {func.__name__} после {retries} попыток")
-
-markets = retry_call(exchange.load_markets)
-if symbol not in markets:
-    print(f"❌ MEXC - Ошибка: пара {symbol} не поддерживается на MEXC")
-    sys.exit(1)
-
-balance = retry_call(exchange.fetch_balance)
-usdt_available = min(deposit, balance.get(quote, {}).get('free', 0))
-if usdt_available <= 0:
-    print(f"MEXC - ❌ Недостаточно {quote}: {usdt_available}")
-    sys.exit(1)
 
-ticker = retry_call(exchange.fetch_ticker, symbol)
-price = ticker.get('ask') or ticker.get('last') or ticker.get('bid')
-if not price:
-    print(f"MEXC - ❌ Не удалось получить цену для {symbol}")
-    sys.exit(1)
+async def run():
+    try:
+        return await MexcExecutor(exchange).buy(symbol, deposit)
+    finally:
+        await exchange.close()
 
-base_available = usdt_available / price
-market = markets[symbol]
-min_amount = market.get('limits', {}).get('amount', {}).get('min', 0)
-precision = int(market.get('precision', {}).get('amount', 6))
-base_available = round(base_available, precision)
 
-if base_available < min_amount:
-    print(f"MEXC - ❌ Объём {base_available} {base} ниже минимального ({min_amount})")
+result = asyncio.run(run())
+shutdown_logging()  # дописать события исполнителя до FILLED_AMOUNT
+# Выводим количество для передачи в основной скрипт (FILLED_AMOUNT:0 даже при ошибке)
+print(f"FILLED_AMOUNT:{result.filled}")
+if not result.success:
     sys.exit(1)
-
-print(f"MEXC - Доступно {usdt_available} {quote} — покупаем {base_available} {base}")
-
-# Получаем стакан
-orderbook = retry_call(exchange.fetch_order_book, symbol)
-asks = orderbook.get('asks', [])
-
-# Проверка ликвидности
-remaining = usdt_available
-liquidity = 0
-for price_, volume in asks:
-    cost = price_ * volume
-    if remaining <= 0:
-        break
-    if cost <= remaining:
-        liquidity += cost
-        remaining -= cost
-    else:
-        liquidity += remaining
-        remaining = 0
-
-if liquidity < usdt_available:
-    print(f"MEXC - ❌ Не хватает ликвидности для покупки на {usdt_available} {quote}")
-    sys.exit(1)
-
-try:
-    print(f"MEXC - Подготовка к покупке {base_available} {base} за {usdt_available} {quote}")
-    order = retry_call(exchange.create_market_buy_order, symbol=symbol, amount=base_available)
-    
-    print(f"MEXC - Ордер создан: {order['id']}")
-    # Получаем детали ордера
-    order_details = retry_call(exchange.fetch_order, order['id'], symbol)
-    filled = order_details.get('filled')
-    cost = order_details.get('cost')
-    if not filled or not cost:
-        print("MEXC - ❌ Сделка не исполнена — недостаточно ликвидности")
-        print("FILLED_AMOUNT:0")
-        sys.exit(1)
-    print(f"MEXC - ✅ Куплено по рынку {order_details['filled']} {order_details['symbol'].replace('/', '')}")
-    # Выводим количество для передачи в основной скрипт
-    print(f"FILLED_AMOUNT:{order_details['filled']}")
-except Exception as e:
-    message = str(e)
-    print(f"MEXC - ❌ Детальная ошибка: {e.__class__.__name__}: {message}")
-    
-    if "minimum transaction volume" in message:
-        print(f"MEXC - Сделка отклонена: объём меньше минимального ({symbol}, {base_available} USDT)")
-    else:
-        print(f"MEXC - ❌ Ошибка при создании ордера: {e.__class__.__name__}: {message}")
-    
-    # Выводим FILLED_AMOUNT:0 даже при ошибке
-    print("FILLED_AMOUNT:0")
-    sys.exit(1)
\ No newline at end of file
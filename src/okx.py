@@ -1,8 +1,18 @@
-import ccxt
+import asyncio
+import ccxt.async_support as ccxt
 import sys
 import os
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.executors import OkxExecutor
+from src.markets import restore_markets
+from src.logs import setup_logging, shutdown_logging
+from src.ratelimit import RateLimiter
+
+sys.stdout.reconfigure(encoding='utf-8')
+setup_logging(path=None)  # события исполнителя - в консоль
+
 load_dotenv()
 
 exchange = ccxt.okx({
@@ -10,6 +20,8 @@ exchange = ccxt.okx({
     'secret': os.getenv('OKX_SECRET'),
     'password': os.getenv('OKX_PASSWORD'),
 })
+restore_markets(exchange, 'okx')  # рынки из снимка бота, без load_markets по сети
+RateLimiter().install(exchange, 'okx')  # лимиты частоты запросов по эндпоинтам
 
 try:
     symbol = sys.argv[1]
@@ -20,52 +32,16 @@ except:
     print("❌ OKX - Ошибка: символ или депозит не указаны или некорректны")
     sys.exit(1)
 
-base, quote = symbol.split('/')
-
-import sys
-sys.stdout.reconfigure(encoding='utf-8')
 
-markets = exchange.load_markets()
-if symbol not in markets:
-    print(f"❌ OKX - Ошибка: пара {symbol} не поддерживается на OKX")
-    sys.exit(1)
+async def run():
+    try:
+        return await OkxExecutor(exchange).buy(symbol, deposit)
+    finally:
+        await exchange.close()
 
-balance = exchange.fetch_balance()
-usdt_available = min(deposit, balance.get(quote, {}).get('free', 0))
-if usdt_available <= 0:
-    print(f"OKX - ❌ Недостаточно {quote}: {usdt_available}")
-    sys.exit(1)
 
-ticker = exchange.fetch_ticker(symbol)
-price = ticker.get('ask') or ticker.get('last') or ticker.get('bid')
-if not price:
-    print(f"OKX - ❌ Не удалось получить цену для {symbol}")
-    sys.exit(1)
-
-base_available = usdt_available / price
-market = markets[symbol]
-min_amount = market.get('limits', {}).get('amount', {}).get('min', 0)
-precision = int(market.get('precision', {}).get('amount', 6))
-base_available = round(base_available, precision)
-
-if base_available < min_amount:
-    print(f"OKX - ❌ Недостаточно средств для покупки минимального количества {base}")
-    sys.exit(1)
-
-print(f"OKX - Доступно {usdt_available} {quote} — покупаем {base_available} {base}")
-
-try:
-    order = exchange.create_market_buy_order(
-        symbol=symbol,
-        amount=base_available
-    )
-    detailed_order = exchange.fetch_order(order['id'], symbol)
-    print(f"OKX - ✅ Куплено: {detailed_order['filled']} {base} по цене {detailed_order['average']} USDT")
-    print(f"FILLED_AMOUNT:{detailed_order['filled']}")
-except Exception as e:
-    message = str(e)
-    if "minimum transaction volume" in message:
-        print(f"OKX - Сделка отклонена: объём меньше минимального ({symbol}, {base_available} USDT)")
-    else:
-        print(f"OKX - ❌ Ошибка при создании ордера: {e.__class__.__name__}: {message}")
+result = asyncio.run(run())
+shutdown_logging()  # дописать события исполнителя до FILLED_AMOUNT
+if not result.success:
     sys.exit(1)
+print(f"FILLED_AMOUNT:{result.filled}")
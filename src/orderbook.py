@@ -0,0 +1,544 @@
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# Локальные L2-стаканы, которые держатся в актуальном состоянии через WebSocket бирж.
+# Стакан подписывается при первом сигнале по символу и отписывается, если символ
+# не запрашивали дольше idle_ttl. Синхронизация: снимок (из потока или REST) +
+# дельты с контролем последовательности; при разрыве последовательности стакан
+# помечается несинхронизированным и пересобирается.
+# Стакан старше max_age (поток завис, соединение полуоткрыто) не отдается -
+# вызывающий идет в REST; соединение, по которому дольше двух интервалов пинга
+# не пришло ни одного кадра (даже ответа на пинг), переподключается.
+
+
+class SequenceGap(Exception):
+    """Пропуск в последовательности обновлений стакана"""
+
+
+@dataclass
+class BookEvent:
+    """Событие стакана из потока биржи: снимок или дельта"""
+    market_id: str
+    kind: str  # 'snapshot' | 'delta'
+    bids: list
+    asks: list
+    seq: Optional[int] = None
+    prev_seq: Optional[int] = None   # номер предыдущего обновления (OKX)
+    first_seq: Optional[int] = None  # первый номер в пачке обновлений (Gate, KuCoin)
+    timestamp: Optional[int] = None
+
+
+class LocalOrderBook:
+    """L2-стакан в памяти: цена -> объём, нулевой объём удаляет уровень"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.seq = None
+        self.timestamp = None
+        self.synced = False
+        self.updated = 0.0
+        self._view = None
+
+    def reset(self):
+        self.bids.clear()
+        self.asks.clear()
+        self.seq = None
+        self.synced = False
+        self._view = None
+
+    def apply_snapshot(self, bids, asks, seq=None, timestamp=None):
+        self.bids = {float(p): float(s) for p, s, *_ in bids if float(s) > 0}
+        self.asks = {float(p): float(s) for p, s, *_ in asks if float(s) > 0}
+        self.seq = seq
+        self.timestamp = timestamp
+        self.synced = True
+        self._touch()
+
+    def apply_delta(self, bids, asks, seq=None, prev_seq=None, first_seq=None, timestamp=None):
+        """Применить дельту; SequenceGap, если пропущены обновления"""
+        if not self.synced:
+            raise SequenceGap(f"{self.symbol}: стакан не синхронизирован")
+        if seq is not None and self.seq is not None:
+            if prev_seq is not None and prev_seq != self.seq:
+                raise SequenceGap(f"{self.symbol}: ожидался prev {self.seq}, получен {prev_seq}")
+            if first_seq is not None and first_seq > self.seq + 1:
+                raise SequenceGap(f"{self.symbol}: ожидался {self.seq + 1}, получен {first_seq}")
+            if prev_seq is None and first_seq is None and seq < self.seq:
+                raise SequenceGap(f"{self.symbol}: номер {seq} меньше текущего {self.seq}")
+            if seq <= self.seq and first_seq is not None:
+                return  # устаревшая пачка, уже учтена в снимке
+        self._update_side(self.bids, bids)
+        self._update_side(self.asks, asks)
+        if seq is not None:
+            self.seq = seq
+        self.timestamp = timestamp or self.timestamp
+        self._touch()
+
+    @staticmethod
+    def _update_side(side: Dict[float, float], levels):
+        for price, size, *_ in levels:
+            price, size = float(price), float(size)
+            if size > 0:
+                side[price] = size
+            else:
+                side.pop(price, None)
+
+    def _touch(self):
+        self.updated = time.monotonic()
+        self._view = None
+
+    def snapshot(self) -> dict:
+        """Стакан в формате ccxt; отсортированный вид кэшируется до следующего обновления"""
+        if self._view is None:
+            self._view = {
+                'symbol': self.symbol,
+                'bids': [[p, self.bids[p]] for p in sorted(self.bids, reverse=True)],
+                'asks': [[p, self.asks[p]] for p in sorted(self.asks)],
+                'timestamp': self.timestamp,
+                'nonce': self.seq,
+            }
+        return self._view
+
+
+class BookStream:
+    """Одно WebSocket-соединение с биржей на все отслеживаемые символы"""
+    name = None
+    url = None
+    ping_interval = 20
+    rest_snapshot = False  # снимок берется через REST (fetch_order_book), а не из потока
+    resync_attempts = 3  # запросов REST-снимка, если он отстает от буфера дельт
+    resync_delay = 0.5  # пауза перед повторным запросом, сек
+
+    def __init__(self, exchange, session: aiohttp.ClientSession, url: str = None, record_path: str = None,
+                 max_age: float = 10.0):
+        self.exchange = exchange
+        self.session = session
+        self.url = url or self.url
+        self.record_path = record_path
+        self.max_age = max_age  # секунд без обновлений, после которых стакан считается устаревшим
+        self.books: Dict[str, LocalOrderBook] = {}
+        self.ids: Dict[str, str] = {}  # market id -> symbol
+        self.buffers: Dict[str, List[BookEvent]] = {}
+        self.ws = None
+        self.connected = False
+        self.task = None
+        self.resync_tasks = {}
+
+    # --- особенности биржи ---
+
+    def market_id(self, symbol: str) -> str:
+        return symbol.replace('/', '')
+
+    def subscribe_payload(self, market_ids: List[str]) -> List[dict]:
+        raise NotImplementedError
+
+    def unsubscribe_payload(self, market_ids: List[str]) -> List[dict]:
+        raise NotImplementedError
+
+    def ping_payload(self):
+        return 'ping'
+
+    def parse(self, message) -> List[BookEvent]:
+        raise NotImplementedError
+
+    async def connect_url(self) -> str:
+        return self.url
+
+    # --- жизненный цикл ---
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    async def close(self):
+        for task in [self.task, *self.resync_tasks.values()]:
+            if task and not task.done():
+                task.cancel()
+        if self.ws is not None and not self.ws.closed:
+            await self.ws.close()
+
+    async def add(self, symbol: str):
+        if symbol in self.books:
+            return
+        market_id = self.market_id(symbol)
+        self.books[symbol] = LocalOrderBook(symbol)
+        self.ids[market_id] = symbol
+        if self.connected:
+            await self._subscribe([market_id])
+        self.start()
+
+    async def remove(self, symbol: str):
+        self.books.pop(symbol, None)
+        market_id = self.market_id(symbol)
+        self.ids.pop(market_id, None)
+        self.buffers.pop(market_id, None)
+        if self.connected:
+            await self._send_all(self.unsubscribe_payload([market_id]))
+
+    def get(self, symbol: str) -> Optional[LocalOrderBook]:
+        book = self.books.get(symbol)
+        if book is None or not book.synced or not self.connected:
+            return None
+        if time.monotonic() - book.updated > self.max_age:
+            return None  # поток молчит - цены могли уйти, пусть вызывающий возьмет REST
+        return book
+
+    async def run(self):
+        delay = 1
+        while self.books:
+            try:
+                url = await self.connect_url()
+                async with self.session.ws_connect(url, heartbeat=None) as ws:
+                    self.ws = ws
+                    self.connected = True
+                    delay = 1
+                    log.info(f"📡 {self.name.upper()} - WebSocket стаканов подключен ({len(self.books)} символов)")
+                    for book in self.books.values():
+                        book.reset()
+                    await self._subscribe(list(self.ids))
+                    pinger = asyncio.create_task(self._ping_loop())
+                    try:
+                        await self._read_loop(ws)
+                    finally:
+                        pinger.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"⚠️ {self.name.upper()} - ошибка WebSocket стаканов: {e}")
+            finally:
+                self.connected = False
+                self.ws = None
+            if not self.books:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def _read_loop(self, ws):
+        # Пинг уходит раз в ping_interval, ответ на него - тоже кадр: тишина дольше
+        # двух интервалов означает полуоткрытое соединение
+        timeout = self.ping_interval * 2
+        while True:
+            try:
+                msg = await ws.receive(timeout=timeout)
+            except asyncio.TimeoutError:
+                log.warning(f"⚠️ {self.name.upper()} - WebSocket стаканов молчит {timeout:g} сек, переподключение")
+                return
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                                aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    break
+                continue
+            if self.record_path:
+                with open(self.record_path, 'a', encoding='utf-8') as f:
+                    f.write(msg.data + '\n')
+            try:
+                message = json.loads(msg.data)
+            except ValueError:
+                continue  # 'pong' и прочие служебные строки
+            for event in self.parse(message):
+                self.on_event(event)
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            payload = self.ping_payload()
+            if isinstance(payload, str):
+                await self.ws.send_str(payload)
+            else:
+                await self.ws.send_json(payload)
+
+    async def _send_all(self, payloads):
+        if self.ws is None or self.ws.closed:
+            return
+        for payload in payloads:
+            await self.ws.send_json(payload)
+
+    async def _subscribe(self, market_ids: List[str]):
+        if not market_ids:
+            return
+        if self.rest_snapshot:
+            for market_id in market_ids:
+                self.buffers[market_id] = []
+        await self._send_all(self.subscribe_payload(market_ids))
+        if self.rest_snapshot:
+            for market_id in market_ids:
+                self._schedule_resync(market_id)
+
+    # --- синхронизация ---
+
+    def on_event(self, event: BookEvent):
+        symbol = self.ids.get(event.market_id)
+        if symbol is None:
+            return
+        book = self.books[symbol]
+
+        if event.kind == 'snapshot':
+            book.apply_snapshot(event.bids, event.asks, event.seq, event.timestamp)
+            return
+
+        buffer = self.buffers.get(event.market_id)
+        if buffer is not None:
+            buffer.append(event)  # ждем REST-снимок
+            return
+
+        try:
+            book.apply_delta(event.bids, event.asks, event.seq, event.prev_seq, event.first_seq, event.timestamp)
+        except SequenceGap as e:
+            log.warning(f"⚠️ {self.name.upper()} - разрыв последовательности стакана, пересинхронизация: {e}")
+            book.reset()
+            if self.rest_snapshot:
+                self.buffers[event.market_id] = []
+            self._schedule_resync(event.market_id)
+
+    def _schedule_resync(self, market_id: str):
+        task = self.resync_tasks.get(market_id)
+        if task is None or task.done():
+            self.resync_tasks[market_id] = asyncio.create_task(self.resync(market_id))
+
+    async def resync(self, market_id: str):
+        """Пересобрать стакан: REST-снимок + буфер дельт, либо переподписка на поток"""
+        symbol = self.ids.get(market_id)
+        if symbol is None:
+            return
+        if not self.rest_snapshot:
+            await self._send_all(self.unsubscribe_payload([market_id]))
+            await self._send_all(self.subscribe_payload([market_id]))
+            return
+
+        for attempt in range(1, self.resync_attempts + 1):
+            try:
+                snapshot = await self.exchange.fetch_order_book(symbol)
+            except Exception as e:
+                log.warning(f"⚠️ {self.name.upper()} - не удалось получить снимок {symbol}: {e}")
+                snapshot = None
+            else:
+                # REST-снимок может отставать от потока: первая дельта буфера новее снимка,
+                # но продолжает не его - снимок устарел, запрашиваем снова
+                nonce = snapshot.get('nonce')
+                first = next((event for event in self.buffers.get(market_id, [])
+                              if event.seq is None or nonce is None or event.seq > nonce), None)
+                if first is None or first.first_seq is None or nonce is None or first.first_seq <= nonce + 1:
+                    break
+                log.warning(f"⚠️ {self.name.upper()} - снимок {symbol} ({nonce}) старше буфера дельт "
+                            f"({first.first_seq}), попытка {attempt}/{self.resync_attempts}")
+                snapshot = None
+            if attempt < self.resync_attempts:
+                await asyncio.sleep(self.resync_delay)
+
+        book = self.books.get(symbol)
+        if book is None:
+            return
+        if snapshot is None:
+            # Буфер сбрасывается: следующая дельта упрется в несинхронизированный стакан
+            # и запланирует новую пересинхронизацию
+            self.buffers.pop(market_id, None)
+            book.reset()
+            return
+        book.apply_snapshot(snapshot['bids'], snapshot['asks'], snapshot.get('nonce'), snapshot.get('timestamp'))
+        buffered = self.buffers.pop(market_id, [])
+        # Эта задача больше не держит место: разрыв внутри буфера запланирует новую пересинхронизацию
+        if self.resync_tasks.get(market_id) is asyncio.current_task():
+            del self.resync_tasks[market_id]
+        for event in buffered:
+            if event.seq is not None and book.seq is not None and event.seq <= book.seq:
+                continue
+            self.on_event(event)
+
+
+class OkxBookStream(BookStream):
+    name = 'okx'
+    url = 'wss://ws.okx.com:8443/ws/v5/public'
+
+    def market_id(self, symbol: str) -> str:
+        return symbol.replace('/', '-')
+
+    def subscribe_payload(self, market_ids):
+        return [{'op': 'subscribe', 'args': [{'channel': 'books', 'instId': i} for i in market_ids]}]
+
+    def unsubscribe_payload(self, market_ids):
+        return [{'op': 'unsubscribe', 'args': [{'channel': 'books', 'instId': i} for i in market_ids]}]
+
+    def parse(self, message):
+        arg = message.get('arg', {})
+        if arg.get('channel') != 'books' or 'data' not in message:
+            return []
+        kind = 'snapshot' if message.get('action') == 'snapshot' else 'delta'
+        return [
+            BookEvent(arg['instId'], kind, item.get('bids', []), item.get('asks', []),
+                      seq=item.get('seqId'),
+                      prev_seq=item.get('prevSeqId') if kind == 'delta' else None,
+                      timestamp=int(item['ts']) if item.get('ts') else None)
+            for item in message['data']
+        ]
+
+
+class BitgetBookStream(BookStream):
+    name = 'bitget'
+    url = 'wss://ws.bitget.com/v2/ws/public'
+
+    def subscribe_payload(self, market_ids):
+        return [{'op': 'subscribe', 'args': [{'instType': 'SPOT', 'channel': 'books', 'instId': i} for i in market_ids]}]
+
+    def unsubscribe_payload(self, market_ids):
+        return [{'op': 'unsubscribe', 'args': [{'instType': 'SPOT', 'channel': 'books', 'instId': i} for i in market_ids]}]
+
+    def parse(self, message):
+        arg = message.get('arg', {})
+        if arg.get('channel') != 'books' or 'data' not in message:
+            return []
+        kind = 'snapshot' if message.get('action') == 'snapshot' else 'delta'
+        # Bitget не присылает номер предыдущего обновления - контролируем монотонность seq
+        return [
+            BookEvent(arg['instId'], kind, item.get('bids', []), item.get('asks', []),
+                      seq=int(item['seq']) if item.get('seq') is not None else None,
+                      timestamp=int(item['ts']) if item.get('ts') else None)
+            for item in message['data']
+        ]
+
+
+class GateBookStream(BookStream):
+    name = 'gate'
+    url = 'wss://api.gateio.ws/ws/v4/'
+    rest_snapshot = True
+
+    def market_id(self, symbol: str) -> str:
+        return symbol.replace('/', '_')
+
+    def subscribe_payload(self, market_ids):
+        return [{'time': int(time.time()), 'channel': 'spot.order_book_update',
+                 'event': 'subscribe', 'payload': [i, '100ms']} for i in market_ids]
+
+    def unsubscribe_payload(self, market_ids):
+        return [{'time': int(time.time()), 'channel': 'spot.order_book_update',
+                 'event': 'unsubscribe', 'payload': [i, '100ms']} for i in market_ids]
+
+    def ping_payload(self):
+        return {'time': int(time.time()), 'channel': 'spot.ping'}
+
+    def parse(self, message):
+        if message.get('channel') != 'spot.order_book_update' or message.get('event') != 'update':
+            return []
+        result = message['result']
+        return [BookEvent(result['s'], 'delta', result.get('b', []), result.get('a', []),
+                          seq=result['u'], first_seq=result['U'], timestamp=result.get('t'))]
+
+
+class KucoinBookStream(BookStream):
+    name = 'kucoin'
+    rest_snapshot = True
+    token_url = 'https://api.kucoin.com/api/v1/bullet-public'
+
+    def market_id(self, symbol: str) -> str:
+        return symbol.replace('/', '-')
+
+    async def connect_url(self) -> str:
+        if self.url:
+            return self.url
+        # Публичный токен и адрес сервера выдаются на каждое подключение
+        async with self.session.post(self.token_url) as response:
+            data = (await response.json(content_type=None))['data']
+        server = data['instanceServers'][0]
+        self.ping_interval = server.get('pingInterval', 18000) / 1000
+        return f"{server['endpoint']}?token={data['token']}&connectId={uuid.uuid4()}"
+
+    def subscribe_payload(self, market_ids):
+        return [{'id': str(uuid.uuid4()), 'type': 'subscribe',
+                 'topic': '/market/level2:' + ','.join(market_ids), 'response': True}]
+
+    def unsubscribe_payload(self, market_ids):
+        return [{'id': str(uuid.uuid4()), 'type': 'unsubscribe',
+                 'topic': '/market/level2:' + ','.join(market_ids), 'response': True}]
+
+    def ping_payload(self):
+        return {'id': str(uuid.uuid4()), 'type': 'ping'}
+
+    def parse(self, message):
+        if message.get('type') != 'message' or message.get('subject') != 'trade.l2update':
+            return []
+        data = message['data']
+        changes = data.get('changes', {})
+        return [BookEvent(data['symbol'], 'delta', changes.get('bids', []), changes.get('asks', []),
+                          seq=int(data['sequenceEnd']), first_seq=int(data['sequenceStart']),
+                          timestamp=data.get('time'))]
+
+
+# MEXC отдает стаканы по WebSocket только в protobuf - для него остается REST
+BOOK_STREAMS = {
+    'okx': OkxBookStream,
+    'bitget': BitgetBookStream,
+    'gate': GateBookStream,
+    'kucoin': KucoinBookStream,
+}
+
+
+class OrderBookCache:
+    """Живые стаканы по недавно сигнальным символам; промах кэша - сигнал идти в REST"""
+
+    def __init__(self, get_exchange, get_session, urls: Dict[str, str] = None,
+                 idle_ttl: float = 900, record_dir: str = None, enabled: bool = True, max_age: float = 10.0):
+        self.get_exchange = get_exchange
+        self.get_session = get_session
+        self.urls = urls or {}
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age  # старше - промах кэша и REST
+        self.record_dir = record_dir
+        self.enabled = enabled  # False - только REST (бенчмарки и прогоны на фикстурах)
+        self.streams: Dict[str, BookStream] = {}
+        self.last_used: Dict[tuple, float] = {}
+        self.janitor = None
+
+    def supports(self, exchange_name: str) -> bool:
+        return self.enabled and exchange_name in BOOK_STREAMS
+
+    def get(self, exchange_name: str, symbol: str) -> Optional[dict]:
+        """Синхронизированный стакан из памяти или None"""
+        stream = self.streams.get(exchange_name)
+        if stream is None:
+            return None
+        self.last_used[(exchange_name, symbol)] = time.monotonic()
+        book = stream.get(symbol)
+        return book.snapshot() if book is not None else None
+
+    async def track(self, exchange_name: str, symbol: str):
+        """Начать держать стакан символа в памяти"""
+        if not self.supports(exchange_name):
+            return
+        self.last_used[(exchange_name, symbol)] = time.monotonic()
+        stream = self.streams.get(exchange_name)
+        if stream is None:
+            record_path = f"{self.record_dir}/{exchange_name}.jsonl" if self.record_dir else None
+            stream = BOOK_STREAMS[exchange_name](self.get_exchange(exchange_name), self.get_session(exchange_name),
+                                                 self.urls.get(exchange_name), record_path, self.max_age)
+            self.streams[exchange_name] = stream
+        await stream.add(symbol)
+        if self.janitor is None or self.janitor.done():
+            self.janitor = asyncio.create_task(self._evict_idle())
+
+    async def _evict_idle(self):
+        while self.last_used:
+            await asyncio.sleep(min(60, self.idle_ttl))
+            now = time.monotonic()
+            for key, used in list(self.last_used.items()):
+                if now - used > self.idle_ttl:
+                    exchange_name, symbol = key
+                    del self.last_used[key]
+                    await self.streams[exchange_name].remove(symbol)
+                    log.info(f"📡 {exchange_name.upper()} - стакан {symbol} отписан (не запрашивался {int(self.idle_ttl)} сек)")
+
+    async def close(self):
+        if self.janitor and not self.janitor.done():
+            self.janitor.cancel()
+        for stream in self.streams.values():
+            await stream.close()
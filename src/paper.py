@@ -0,0 +1,196 @@
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+from src.depth import walk_book
+from src.executors import FillResult, TradeExecutor
+from src.logs import get_logger
+from src.tracing import elapsed_ms
+
+log = get_logger(__name__)
+
+# Бумажная торговля (dry run).
+# PaperBroker исполняет рыночные ордера по текущему стакану (WebSocket-кэш
+# бота или REST, в бэктесте - записанный стакан) с комиссией тейкера и
+# дополнительным проскальзыванием, ведет виртуальные балансы и маржинальный
+# долг по каждой бирже. Сделки и состояние счетов пишутся в JSON, так что
+# реальный спред и задержки видны без риска для денег.
+
+PAPER_STATE_PATH = './paper_state.json'
+
+# Комиссии тейкера спота по умолчанию, доля
+TAKER_FEES = {
+    'bitget': 0.001,
+    'okx': 0.001,
+    'mexc': 0.0005,
+    'gate': 0.002,
+    'kucoin': 0.001,
+}
+
+
+class PaperAccount:
+    """Виртуальный счет на бирже: свободные балансы и долг по займам.
+    unlimited=True - баланс квоты не ограничивает ордера (бэктест)"""
+
+    def __init__(self, venue: str, balances: Dict[str, float] = None, fee: float = None, unlimited: bool = False):
+        self.venue = venue
+        self.balances: Dict[str, float] = dict(balances or {})
+        self.debt: Dict[str, float] = {}
+        self.fee = TAKER_FEES.get(venue, 0.001) if fee is None else fee
+        self.unlimited = unlimited
+
+    def free(self, currency: str) -> float:
+        return float('inf') if self.unlimited else self.balances.get(currency, 0.0)
+
+    def buy(self, base: str, quote: str, filled: float, cost: float, fee: float):
+        self.balances[quote] = self.balances.get(quote, 0.0) - cost - fee
+        # Покупка сначала гасит долг по базовой валюте
+        repay = min(filled, self.debt.get(base, 0.0))
+        if repay:
+            self.debt[base] -= repay
+        self.balances[base] = self.balances.get(base, 0.0) + filled - repay
+
+    def sell(self, base: str, quote: str, filled: float, cost: float, fee: float):
+        held = self.balances.get(base, 0.0)
+        borrowed = max(0.0, filled - held)  # маржинальная продажа: недостающее берется в долг
+        if borrowed:
+            self.debt[base] = self.debt.get(base, 0.0) + borrowed
+        self.balances[base] = max(0.0, held - filled)
+        self.balances[quote] = self.balances.get(quote, 0.0) + cost - fee
+
+    def to_dict(self) -> dict:
+        return {'balances': {k: v for k, v in self.balances.items() if v},
+                'debt': {k: v for k, v in self.debt.items() if v}, 'fee': self.fee}
+
+
+class PaperBroker:
+    def __init__(self, get_book, venues: List[str], initial_balance: float = 1000.0, slippage_bps: float = 0.0,
+                 fees: Dict[str, float] = None, unlimited: bool = False, path: Optional[str] = PAPER_STATE_PATH):
+        self.get_book = get_book  # async (биржа, символ) -> стакан ccxt или None
+        self.slippage_bps = slippage_bps  # сдвиг цены против нас сверх прохода по стакану
+        self.path = path
+        fees = fees or {}
+        self.accounts: Dict[str, PaperAccount] = {
+            venue: PaperAccount(venue, {'USDT': initial_balance}, fees.get(venue), unlimited) for venue in venues
+        }
+        self.trades: List[dict] = []
+        self.load()
+
+    def executor(self, venue: str) -> 'PaperExecutor':
+        return PaperExecutor(venue, self)
+
+    async def market_order(self, venue: str, symbol: str, side: str, amount: float, by: str) -> FillResult:
+        """Рыночный ордер: amount в квоте (by='quote') или в базовой валюте (by='base')"""
+        base, quote = symbol.split('/')
+        account = self.accounts[venue]
+        prefix = f"{venue.upper()} [PAPER]"
+
+        if side == 'buy' and by == 'quote':
+            amount = min(amount, account.free(quote) / (1 + account.fee))  # комиссия - сверх стоимости
+        if amount <= 0:
+            return self._fail(prefix, venue, symbol, side, f"Недостаточно {quote}")
+
+        book = await self.get_book(venue, symbol)
+        levels = (book or {}).get('asks' if side == 'buy' else 'bids') or []
+        if not levels:
+            return self._fail(prefix, venue, symbol, side, "Нет стакана")
+
+        walk = walk_book(levels, amount, by=by).at(0)
+        if walk['base'] <= 0:
+            return self._fail(prefix, venue, symbol, side, "Сделка не исполнена — недостаточно ликвидности")
+
+        slip = self.slippage_bps / 1e4
+        average = walk['vwap'] * (1 + slip if side == 'buy' else 1 - slip)
+        if by == 'quote':
+            cost, filled = walk['quote'], walk['quote'] / average
+        else:
+            filled, cost = walk['base'], walk['base'] * average
+        fee = cost * account.fee
+        if side == 'buy':
+            account.buy(base, quote, filled, cost, fee)
+        else:
+            account.sell(base, quote, filled, cost, fee)
+
+        trade = {
+            'time': time.time(), 'venue': venue, 'symbol': symbol, 'side': side,
+            'filled': filled, 'average': average, 'cost': cost, 'fee': fee,
+            'book_price': levels[0][0], 'slippage_bps': round(abs(average - levels[0][0]) / levels[0][0] * 1e4, 2),
+            'complete': walk['complete'], 'signal_to_fill_ms': elapsed_ms(),
+        }
+        self.trades.append(trade)
+        log.info(f"{prefix} - ✅ {'Куплено' if side == 'buy' else 'Продано'}: {filled:.8g} {base} "
+                 f"по {average:.8g} {quote} (комиссия {fee:.4g} {quote})")
+        return FillResult(venue, symbol, side, True, filled=filled, average=average, cost=cost,
+                          order_id=f"paper-{len(self.trades)}", fee=fee, raw=trade)
+
+    @staticmethod
+    def _fail(prefix: str, venue: str, symbol: str, side: str, error: str) -> FillResult:
+        log.error(f"{prefix} - ❌ {error}")
+        return FillResult(venue, symbol, side, False, error=error)
+
+    def summary(self) -> dict:
+        """Реализованный спред по символам: средняя цена продаж к средней цене покупок"""
+        totals: Dict[str, Dict[str, float]] = {}
+        for trade in self.trades:
+            t = totals.setdefault(trade['symbol'], {'buy_base': 0.0, 'buy_cost': 0.0, 'sell_base': 0.0,
+                                                    'sell_cost': 0.0, 'fees': 0.0})
+            t[f"{trade['side']}_base"] += trade['filled']
+            t[f"{trade['side']}_cost"] += trade['cost']
+            t['fees'] += trade['fee']
+        symbols = {}
+        for symbol, t in totals.items():
+            spread = None
+            if t['buy_base'] and t['sell_base']:
+                spread = (t['sell_cost'] / t['sell_base']) / (t['buy_cost'] / t['buy_base']) - 1
+            symbols[symbol] = {**t, 'realized_spread': spread}
+        return {'symbols': symbols, 'accounts': {v: a.to_dict() for v, a in self.accounts.items()}}
+
+    def save(self):
+        """Записать счета и сделки (бот вызывает после исполнения сигнала, не между ногами)"""
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'summary': self.summary(), 'trades': self.trades[-500:]}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning(f"⚠️ Не удалось сохранить состояние бумажной торговли: {e}")
+
+    def load(self):
+        """Продолжить с балансов и долга прошлого запуска"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except Exception as e:
+            log.warning(f"⚠️ Состояние бумажной торговли не прочитано, начинаем заново: {e}")
+            return
+        for venue, data in state.get('summary', {}).get('accounts', {}).items():
+            if venue in self.accounts:
+                self.accounts[venue].balances = data.get('balances', {})
+                self.accounts[venue].debt = data.get('debt', {})
+        self.trades = state.get('trades', [])
+
+
+class PaperExecutor(TradeExecutor):
+    """Исполнитель, отправляющий ордера в PaperBroker вместо биржи"""
+
+    def __init__(self, name: str, broker: PaperBroker):
+        super().__init__(None)
+        self.name = name
+        self.broker = broker
+
+    async def buy(self, symbol: str, deposit: float) -> FillResult:
+        return await self.broker.market_order(self.name, symbol, 'buy', deposit, 'quote')
+
+    async def sell(self, symbol: str, deposit: float, amount: float = None) -> FillResult:
+        if not amount or amount <= 0:
+            book = await self.broker.get_book(self.name, symbol)
+            bids = (book or {}).get('bids') or []
+            if not bids:
+                return self.broker._fail(f"{self.name.upper()} [PAPER]", self.name, symbol, 'sell', "Нет стакана")
+            amount = deposit / bids[0][0]
+        return await self.broker.market_order(self.name, symbol, 'sell', amount, 'base')
@@ -0,0 +1,147 @@
+import asyncio
+import re
+import time
+from typing import Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+from src.tracing import record
+
+# Ограничение частоты запросов к биржам.
+# На каждую биржу и класс эндпоинтов (public - рыночные данные, private -
+# счета и займы, trade - ордера) заводится корзина токенов с пополнением
+# rate весов в секунду и емкостью capacity (окно лимита из документации
+# биржи). Запрос списывает свой вес; если токенов не хватает, он ждет
+# пополнения, а не получает отказ, так что всплеск сигналов растягивается
+# во времени вместо бана по IP/ключу. Ожидающие встают в очередь по порядку.
+# RateLimiter ставится и на клиентов ccxt (install, собственный лимитер ccxt
+# отключается), и на HTTP-сессии пула для прямых REST-запросов Gate и KuCoin.
+
+# Биржа -> класс -> (вес в секунду, емкость) или имя класса с общей корзиной
+LIMITS: Dict[str, Dict[str, Union[Tuple[float, float], str]]] = {
+    'okx': {'public': (20, 40), 'private': (5, 10), 'trade': (30, 60)},           # 40/10/60 запросов за 2 с
+    'bitget': {'public': (20, 20), 'private': (10, 10), 'trade': (10, 10)},       # запросов в секунду
+    'mexc': {'public': (50, 500), 'private': (50, 500), 'trade': (5, 5)},         # веса за 10 с, ордера 5/с
+    'gate': {'public': (20, 200), 'private': (20, 200), 'trade': (10, 10)},       # 200 за 10 с, ордера 10/с
+    'kucoin': {'public': (66, 2000), 'private': (133, 4000), 'trade': 'private'},  # пулы весов за 30 с
+}
+
+# Веса эндпоинтов (путь без /api/vN/ -> вес), остальные весят 1
+WEIGHTS: Dict[str, Dict[str, float]] = {
+    'kucoin': {
+        'accounts': 5,
+        'margin/account': 40,
+        'margin/config': 25,
+        'margin/order': 5,
+        'margin/borrow': 15,
+        'orders': 2,
+        'market/orderbook/level1': 2,
+        'market/orderbook/level2': 2,
+        'bullet-public': 10,
+    },
+    'mexc': {
+        'account': 10,
+        'depth': 1,
+    },
+}
+
+# Заголовки подписи прямых REST-запросов
+AUTH_HEADERS = ('KEY', 'KC-API-KEY')
+
+_API_PREFIX = re.compile(r'^/?(api/)?(v\d+/)?')
+
+
+class TokenBucket:
+    """Корзина токенов: O(1) пополнение по времени при каждом списании"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()  # ожидающие обслуживаются по порядку прихода
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, weight: float = 1.0) -> float:
+        """Списать вес, дождавшись токенов; возвращает время ожидания, с"""
+        weight = min(float(weight), self.capacity)
+        async with self.lock:
+            self._refill()
+            waited = 0.0
+            if self.tokens < weight:
+                waited = (weight - self.tokens) / self.rate
+                await asyncio.sleep(waited)
+                self._refill()
+            self.tokens -= weight
+            return waited
+
+
+def endpoint_class(method: str, path: str, private: bool) -> str:
+    """Класс эндпоинта: ордера и изменяющие запросы - trade, прочие подписанные - private"""
+    if not private:
+        return 'public'
+    if method.upper() != 'GET' or 'order' in path.lower():
+        return 'trade'
+    return 'private'
+
+
+class RateLimiter:
+    def __init__(self, limits: Dict[str, dict] = None, weights: Dict[str, Dict[str, float]] = None):
+        self.limits = limits if limits is not None else LIMITS
+        self.weights = weights if weights is not None else WEIGHTS
+        self.buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.waits: Dict[str, int] = {}  # биржа -> сколько запросов ждали токенов
+
+    def bucket(self, venue: str, endpoint: str) -> Optional[TokenBucket]:
+        """Корзина биржи и класса; None - биржа без лимитов"""
+        limit = self.limits.get(venue, {}).get(endpoint)
+        if isinstance(limit, str):
+            endpoint, limit = limit, self.limits[venue].get(limit)
+        if limit is None:
+            return None
+        bucket = self.buckets.get((venue, endpoint))
+        if bucket is None:
+            bucket = self.buckets[(venue, endpoint)] = TokenBucket(*limit)
+        return bucket
+
+    def weight(self, venue: str, path: str) -> float:
+        path = _API_PREFIX.sub('', path)
+        for prefix, weight in self.weights.get(venue, {}).items():
+            if path.startswith(prefix):
+                return weight
+        return 1.0
+
+    async def acquire(self, venue: str, method: str, path: str, private: bool):
+        """Дождаться разрешения на запрос к бирже"""
+        bucket = self.bucket(venue, endpoint_class(method, path, private))
+        if bucket is None:
+            return
+        start_ns = time.perf_counter_ns()
+        if await bucket.acquire(self.weight(venue, path)):
+            self.waits[venue] = self.waits.get(venue, 0) + 1
+            record(f'rate_wait.{venue}', start_ns)
+
+    async def acquire_url(self, venue: str, method: str, url: str, headers: dict = None):
+        """Разрешение для прямого REST-запроса: подписанный - по заголовкам подписи"""
+        private = bool(headers) and any(name in headers for name in AUTH_HEADERS)
+        await self.acquire(venue, method, urlsplit(str(url)).path, private)
+
+    def install(self, exchange, venue: str):
+        """Поставить лимитер на клиента ccxt вместо встроенного (fetch2 - общая точка всех REST-вызовов)"""
+        if getattr(exchange, '_rate_limiter', None) is self:
+            return exchange
+        fetch2 = exchange.fetch2
+        limiter = self
+
+        async def limited_fetch2(path, api='public', method='GET', params={}, headers=None, body=None, config={}):
+            sections = api if isinstance(api, (list, tuple)) else [api]
+            await limiter.acquire(venue, method, path, 'private' in sections)
+            return await fetch2(path, api, method, params, headers, body, config)
+
+        exchange.fetch2 = limited_fetch2
+        exchange.enableRateLimit = False
+        exchange._rate_limiter = self
+        return exchange
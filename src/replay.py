@@ -0,0 +1,227 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from src.logs import get_logger
+from src.paper import PaperBroker
+from src.signals import parse_message
+
+log = get_logger(__name__)
+
+# Воспроизведение записанных сигналов (бэктест).
+# Бот с RECORD_SIGNALS=<путь> пишет в JSONL каждый сигнал: время прихода, текст
+# сообщения и стаканы обеих бирж на момент расчета цен. Здесь сигналы
+# прогоняются через тот же ArbitrageBot.on_signal (разбор, пауза min_interval
+# по маршруту, расчет цен, проверки, резерв капитала), но стаканы берутся из
+# записи, а исполнение - по записанному стакану через PaperBroker (комиссии,
+# проскальзывание, без ограничения баланса). Время модельное, без ожиданий,
+# и сигналы обрабатываются по одному без очереди сигналов бота, поэтому прогон
+# идет быстрее реального. Сигналы делятся на пакеты по символу (порядок
+# и min_interval внутри символа сохраняются) и обрабатываются
+# в отдельных процессах; каждая комбинация параметров - отдельный прогон.
+#
+#   python src/replay.py signals.jsonl --deposit 10 25 --min-interval 0 60 --min-spread 0 0.003 --workers 4
+
+
+class SignalRecorder:
+    """Дописывает сигналы со стаканами в JSONL для последующего воспроизведения"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def record(self, text: Optional[str], books: Dict[str, dict], received_at: datetime = None):
+        entry = {
+            'time': (received_at or datetime.now()).timestamp(),
+            'text': text,
+            'order_books': {
+                venue: {symbol: {'bids': [lvl[:2] for lvl in book['bids']], 'asks': [lvl[:2] for lvl in book['asks']]}
+                        for symbol, book in symbol_books.items()}
+                for venue, symbol_books in books.items()
+            },
+        }
+        try:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        except Exception as e:
+            log.warning(f"⚠️ Не удалось записать сигнал: {e}")
+
+
+def load_signals(path: str) -> List[dict]:
+    signals = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                signals.append(json.loads(line))
+    signals.sort(key=lambda s: s['time'])
+    return signals
+
+
+def synthesize_markets(signals: List[dict]) -> Dict[str, List[dict]]:
+    """Рынки бирж по записанным стаканам: символ есть на бирже, если для нее записан стакан"""
+    symbols: Dict[str, set] = {}
+    for signal in signals:
+        for venue, books in signal.get('order_books', {}).items():
+            symbols.setdefault(venue, set()).update(books)
+    markets = {}
+    for venue, venue_symbols in symbols.items():
+        markets[venue] = [
+            {'id': symbol.replace('/', ''), 'symbol': symbol, 'base': symbol.split('/')[0],
+             'quote': symbol.split('/')[1], 'type': 'spot', 'spot': True, 'active': True,
+             'precision': {'amount': 1e-8, 'price': 1e-10}, 'limits': {'amount': {'min': 0}, 'cost': {'min': 0}}}
+            for symbol in sorted(venue_symbols)
+        ]
+    return markets
+
+
+def symbol_of(text: str) -> Optional[str]:
+    parsed = parse_message(text)
+    return parsed.symbol if parsed is not None else None
+
+
+def partition(signals: List[dict], batches: int) -> List[List[dict]]:
+    """Пакеты по символу: все сигналы одного символа - в одном пакете, в порядке времени"""
+    parts = [[] for _ in range(max(1, batches))]
+    for signal in signals:
+        symbol = symbol_of(signal.get('text') or '') or ''
+        parts[zlib.crc32(symbol.encode()) % len(parts)].append(signal)
+    return [part for part in parts if part]
+
+
+async def _replay_batch(signals: List[dict], params: dict, markets: Dict[str, List[dict]]) -> dict:
+    from telethon import TelegramClient
+    from telethon.sessions import StringSession
+    from src.fixtures import FixtureExchange
+    from src import tracing
+    from xyz415 import ArbitrageBot
+
+    tracing.TRACER.path = None  # не перезаписывать latency.json живого бота
+    bot = ArbitrageBot(client=TelegramClient(StringSession(), 1, 'replay'))
+    bot.signal_recorder = None
+    bot.paper = None  # свой PaperBroker ниже, состояние живой бумажной торговли не трогаем
+    bot.deposit = params['deposit']
+    bot.min_interval = timedelta(seconds=params['min_interval'])
+    bot.min_spread = params['min_spread']
+    bot.use_validation = params['validation']
+    bot.order_books.enabled = False
+    bot.markets.snapshot_path = None
+    bot.journal.path = None  # журнал живой торговли не трогаем
+
+    venues = bot.buyer_exchanges + bot.seller_exchanges
+    exchanges = {venue: FixtureExchange(venue, markets.get(venue, []), {}) for venue in venues}
+    bot.exchanges.update(exchanges)
+    broker = PaperBroker(bot.fetch_order_book, venues, slippage_bps=params['slippage_bps'],
+                         fees=None if params['fees'] else {venue: 0.0 for venue in venues},
+                         unlimited=True, path=None)
+    bot.executors.update({venue: broker.executor(venue) for venue in venues})
+    # Займ доступен для всех базовых валют рынков бирж продажи
+    for venue in bot.seller_exchanges:
+        bot.borrow.currencies[venue] = frozenset(m['base'] for m in markets.get(venue, []))
+
+    outcomes = []
+    try:
+        for signal in signals:
+            for venue, books in signal.get('order_books', {}).items():
+                if venue in exchanges:
+                    exchanges[venue].order_books.update(books)
+            start = len(broker.trades)
+            executed = await bot.on_signal(signal.get('text') or '', datetime.fromtimestamp(signal['time']))
+            legs = broker.trades[start:]
+            bought = sum(t['cost'] for t in legs if t['side'] == 'buy')
+            sold = sum(t['cost'] for t in legs if t['side'] == 'sell')
+            fees = sum(t['fee'] for t in legs)
+            outcomes.append({
+                'time': signal['time'], 'symbol': symbol_of(signal.get('text') or ''),
+                'executed': bool(executed), 'bought_usdt': bought, 'sold_usdt': sold, 'fees_usdt': fees,
+                'edge_usdt': sold - bought - fees,
+                'net_base': sum(t['filled'] for t in legs if t['side'] == 'buy') - sum(t['filled'] for t in legs if t['side'] == 'sell'),
+            })
+    finally:
+        await bot.close()
+    return {'params': params, 'outcomes': outcomes}
+
+
+def replay_batch(signals: List[dict], params: dict, markets: Dict[str, List[dict]]) -> dict:
+    """Прогон пакета в отдельном процессе (события бота подавлены)"""
+    logging.disable(logging.CRITICAL)
+    return asyncio.run(_replay_batch(signals, params, markets))
+
+
+def summarize(params: dict, outcomes: List[dict], elapsed: float) -> dict:
+    executed = [o for o in outcomes if o['executed']]
+    volume = sum(o['bought_usdt'] for o in executed)
+    edge = sum(o['edge_usdt'] for o in executed)
+    return {
+        **params,
+        'signals': len(outcomes),
+        'executed': len(executed),
+        'volume_usdt': round(volume, 4),
+        'edge_usdt': round(edge, 4),
+        'edge_bps': round(edge / volume * 1e4, 2) if volume else 0.0,
+        'signals_per_sec': round(len(outcomes) / elapsed, 1) if elapsed else None,
+    }
+
+
+def run(signals: List[dict], grid: List[dict], markets: Dict[str, List[dict]], workers: int) -> List[dict]:
+    batches = partition(signals, workers)
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(i, pool.submit(replay_batch, batch, params, markets))
+                   for i, params in enumerate(grid) for batch in batches]
+        outcomes: Dict[int, List[dict]] = {i: [] for i in range(len(grid))}
+        for i, future in futures:
+            outcomes[i].extend(future.result()['outcomes'])
+    elapsed = time.perf_counter() - started
+    return [summarize(params, sorted(outcomes[i], key=lambda o: o['time']), elapsed / len(grid))
+            for i, params in enumerate(grid)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных сигналов с модельным исполнением')
+    parser.add_argument('signals', help='JSONL, записанный ботом с RECORD_SIGNALS')
+    parser.add_argument('--deposit', type=float, nargs='+', default=[10.0])
+    parser.add_argument('--min-interval', type=float, nargs='+', default=[0.0], help='пауза по маршруту, секунды')
+    parser.add_argument('--min-spread', type=float, nargs='+', default=[0.0], help='доля, например 0.003')
+    parser.add_argument('--no-validation', action='store_true', help='исполнять без проверок')
+    parser.add_argument('--no-fees', action='store_true', help='без комиссий тейкера')
+    parser.add_argument('--slippage-bps', type=float, default=0.0, help='проскальзывание сверх стакана, б.п.')
+    parser.add_argument('--markets', help='снимок рынков (markets_snapshot.json.gz); по умолчанию - по записанным стаканам')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--output', help='записать сводку в JSON')
+    args = parser.parse_args()
+
+    signals = load_signals(args.signals)
+    if args.markets:
+        from src.markets import read_snapshot
+        markets = {venue: entry['markets'] for venue, entry in read_snapshot(args.markets).items()}
+    else:
+        markets = synthesize_markets(signals)
+
+    grid = [{'deposit': d, 'min_interval': i, 'min_spread': s, 'validation': not args.no_validation,
+             'fees': not args.no_fees, 'slippage_bps': args.slippage_bps}
+            for d, i, s in itertools.product(args.deposit, args.min_interval, args.min_spread)]
+    print(f"▶️ {len(signals)} сигналов × {len(grid)} комбинаций параметров, процессов: {args.workers}")
+    results = run(signals, grid, markets, args.workers)
+
+    print(f"{'deposit':>8} {'interval':>9} {'spread':>7} {'signals':>8} {'executed':>9} "
+          f"{'volume':>10} {'edge':>9} {'bps':>7} {'sig/s':>8}")
+    for r in results:
+        print(f"{r['deposit']:>8} {r['min_interval']:>9} {r['min_spread']:>7} {r['signals']:>8} {r['executed']:>9} "
+              f"{r['volume_usdt']:>10} {r['edge_usdt']:>9} {r['edge_bps']:>7} {r['signals_per_sec']:>8}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from src.logs import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: без блокировки между процессами
+    fcntl = None
+
+log = get_logger(__name__)
+
+# Общая конфигурация бота и панели управления.
+# Панель запускает бота отдельным процессом, поэтому os.environ панели до
+# работающего бота не доходит. Настройки, которые можно менять на ходу
+# (депозит, проверки, биржи, пороги), лежат в небольшом файле, отображенном
+# в память (mmap) обоими процессами:
+#   [счетчик версии uint64][длина uint32][JSON]
+# Запись - seqlock: счетчик становится нечетным, пишутся данные, счетчик
+# снова четный. Читатель сравнивает счетчик с последним применённым (чтение
+# 8 байт из общей памяти, доли микросекунды), поэтому бот проверяет изменения
+# перед каждым сигналом и раз в секунду в фоне - без перезапуска процесса,
+# с теми же прогретыми кэшами и соединениями.
+# Пишут оба процесса (панель - /config, бот - недостающие поля при запуске),
+# поэтому чтение-слияние-запись в update() идет под flock на файле.
+
+RUNTIME_CONFIG_PATH = './runtime_config.bin'
+CONFIG_SIZE = 4096
+# Биржи бота (buyer_exchanges + seller_exchanges в xyz415.py)
+VENUES = ('bitget', 'okx', 'mexc', 'gate', 'kucoin')
+_HEADER = struct.Struct('<QI')
+
+
+def _bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
+def _non_negative(value) -> float:
+    value = float(value)
+    if value < 0:
+        raise ValueError("значение не может быть отрицательным")
+    return value
+
+
+def _positive(value) -> float:
+    value = float(value)
+    if value <= 0:
+        raise ValueError("значение должно быть больше нуля")
+    return value
+
+
+def _venues(value) -> list:
+    if isinstance(value, str):
+        value = value.split(',')
+    venues = {str(venue).strip().lower() for venue in value if str(venue).strip()}
+    unknown = sorted(venues - set(VENUES))
+    if unknown:
+        # опечатка отключила бы все маршруты с этой биржей без единого сообщения
+        raise ValueError(f"неизвестные биржи {', '.join(unknown)}: доступны {', '.join(VENUES)}")
+    return sorted(venues)
+
+
+# Поле -> преобразование с проверкой
+FIELDS = {
+    'deposit': _positive,  # депозит на сделку, USDT
+    'use_validation': _bool,
+    'simultaneously': _bool,
+    'min_spread': _non_negative,  # доля
+    'min_interval': _non_negative,  # секунды между сигналами по маршруту
+    'reconcile_tolerance': _non_negative,  # доля
+    'venues': _venues,  # включенные биржи
+    'scanner_min_spread': _non_negative,  # доля
+}
+
+
+def normalize(values: dict) -> dict:
+    """Проверить и привести значения; неизвестное поле или неверное значение - ValueError"""
+    result = {}
+    for name, value in values.items():
+        if name not in FIELDS:
+            raise ValueError(f"неизвестный параметр {name!r}: доступны {', '.join(FIELDS)}")
+        try:
+            result[name] = FIELDS[name](value)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{name}: недопустимое значение {value!r} ({e})")
+    return result
+
+
+class RuntimeConfig:
+    def __init__(self, path: Optional[str] = RUNTIME_CONFIG_PATH, size: int = CONFIG_SIZE):
+        self.path = path  # None - без общей конфигурации
+        self.size = size
+        self.mm: Optional[mmap.mmap] = None
+        self.version = 0  # счетчик последнего прочитанного состояния
+        self.lock = threading.Lock()  # запись из потоков панели
+        self.task = None
+
+    def open(self) -> bool:
+        """Отобразить файл в память (создать, если его нет)"""
+        if self.mm is not None:
+            return True
+        if not self.path:
+            return False
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size < self.size:
+                os.ftruncate(fd, self.size)
+            self.mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)  # отображение держит файл само
+        return True
+
+    def read(self) -> dict:
+        """Текущее содержимое; запись посреди чтения - повтор (около 50 мс, потом ошибка)"""
+        if not self.open():
+            return {}
+        for attempt in range(1000):
+            version, length = _HEADER.unpack_from(self.mm, 0)
+            if version % 2:
+                time.sleep(0.00005 if attempt > 10 else 0)  # идет запись - отдать процессор писателю
+                continue
+            data = self.mm[_HEADER.size:_HEADER.size + length]
+            if _HEADER.unpack_from(self.mm, 0)[0] == version:
+                self.version = version
+                return json.loads(data) if length else {}
+        raise ValueError("конфигурация не дописана (запись прервана?)")
+
+    def poll(self) -> Optional[dict]:
+        """Новое содержимое, если оно изменилось с прошлого чтения; иначе None.
+        Без открытого файла (бенчмарки, воспроизведение) - всегда None"""
+        if self.mm is None or _HEADER.unpack_from(self.mm, 0)[0] == self.version:
+            return None
+        return self.read()
+
+    def update(self, **values) -> dict:
+        """Проверить значения и записать их поверх текущих; возвращает итоговую конфигурацию"""
+        values = normalize(values)
+        with self.lock:
+            if not self.open():
+                return values
+            with self._file_lock():  # слияние с текущими значениями - под блокировкой другого процесса
+                config = {**self.read(), **values}
+                data = json.dumps(config, ensure_ascii=False).encode('utf-8')
+                if _HEADER.size + len(data) > self.size:
+                    raise ValueError(f"конфигурация больше {self.size} байт")
+                version = _HEADER.unpack_from(self.mm, 0)[0]
+                version += 1 + version % 2  # нечетный - идет запись
+                _HEADER.pack_into(self.mm, 0, version, 0)
+                self.mm[_HEADER.size:_HEADER.size + len(data)] = data
+                _HEADER.pack_into(self.mm, 0, version + 1, len(data))
+                self.version = version + 1  # своя запись уже применена
+        return config
+
+    @contextmanager
+    def _file_lock(self):
+        """Исключительная блокировка файла между процессами на время чтения и записи"""
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # закрытие снимает flock
+
+    async def _watch(self, on_change: Callable[[dict], None], interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                config = self.poll()
+                if config is not None:
+                    on_change(config)
+            except Exception as e:
+                log.warning(f"⚠️ Не удалось применить конфигурацию: {e}")
+
+    def start(self, on_change: Callable[[dict], None], interval: float = 1.0):
+        """Фоновая проверка изменений (между сигналами, например для сканера)"""
+        if self.mm is not None and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._watch(on_change, interval))
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
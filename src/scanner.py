@@ -0,0 +1,188 @@
+import asyncio
+import heapq
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.logs import get_logger
+from src.utils import calculate_average_buy_price, calculate_average_sell_price
+
+log = get_logger(__name__)
+
+# Сканер межбиржевых возможностей.
+# Кроме сигналов @ArbitrageSmartBot бот сам ищет спреды по всем маршрутам
+# MarketIndex (символ торгуется на бирже покупки и на бирже продажи). Цикл:
+# 1) по одному пакетному запросу тикеров на биржу (fetch_tickers) - лучшие
+#    bid/ask сразу по всем символам, сколько бы их ни было;
+# 2) отбор маршрутов по спреду верха стакана (ask покупки / bid продажи) -
+#    проход по словарям, в стаканы идут только top_n лучших кандидатов;
+# 3) стаканы кандидатов (WebSocket-кэш или REST) и исполнимые цены на депозит
+#    тем же проходом по глубине, что и для сигналов, в пуле процессов;
+# 4) маршруты со спредом не ниже min_spread уходят в обработчик бота - в ту же
+#    очередь сигналов и те же проверки, что и сообщения из Telegram.
+# Маршрут, по которому уже был сигнал, повторно не отправляется cooldown секунд.
+
+Route = Tuple[str, str, str]  # (символ, биржа покупки, биржа продажи)
+
+
+def evaluate_routes(deposit: float, items: List[tuple]) -> List[tuple]:
+    """Исполнимые цены на депозит по стаканам (выполняется в процессе пула).
+    items: (символ, покупка, продажа, стакан покупки, стакан продажи) ->
+    (символ, покупка, продажа, цена покупки, цена продажи, спред)"""
+    results = []
+    for symbol, buy_exchange, sell_exchange, buy_book, sell_book in items:
+        buy_price = calculate_average_buy_price(deposit, symbol, buy_book)
+        sell_price = calculate_average_sell_price(deposit, symbol, sell_book)
+        if buy_price and sell_price:
+            results.append((symbol, buy_exchange, sell_exchange, buy_price, sell_price,
+                            (sell_price - buy_price) / buy_price))
+    return results
+
+
+def _init_worker():
+    """Процесс пула: очередь логов родителя здесь никто не читает - только ошибки в stderr"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(logging.StreamHandler())
+    root.setLevel(logging.ERROR)
+
+
+def top_of_book(tickers: dict) -> Dict[str, Tuple[float, float]]:
+    """Тикеры ccxt -> {символ: (bid, ask)} для символов с обеими ценами"""
+    quotes = {}
+    for symbol, ticker in tickers.items():
+        bid, ask = ticker.get('bid'), ticker.get('ask')
+        if bid and ask:
+            quotes[symbol] = (bid, ask)
+    return quotes
+
+
+def screen(routes: Dict[str, frozenset], quotes: Dict[str, Dict[str, Tuple[float, float]]],
+           min_spread: float, top_n: int, quote: str = 'USDT') -> List[Tuple[float, Route]]:
+    """Лучшие маршруты по спреду верха стакана: [(спред, (символ, покупка, продажа))]"""
+    suffix = '/' + quote
+    candidates = []
+    for symbol, pairs in routes.items():
+        if not symbol.endswith(suffix):
+            continue
+        for buy_exchange, sell_exchange in pairs:
+            buy = quotes.get(buy_exchange, {}).get(symbol)
+            sell = quotes.get(sell_exchange, {}).get(symbol)
+            if buy is None or sell is None:
+                continue
+            spread = (sell[0] - buy[1]) / buy[1]
+            if spread >= min_spread:
+                candidates.append((spread, (symbol, buy_exchange, sell_exchange)))
+    return heapq.nlargest(top_n, candidates)
+
+
+class OpportunityScanner:
+    def __init__(self, get_exchange, markets, fetch_order_book: Callable[[str, str], Awaitable[Optional[dict]]],
+                 on_opportunity: Callable[[str, str, str, float], Awaitable[None]], get_deposit: Callable[[], float],
+                 min_spread: float = 0.005, interval: float = 5.0, top_n: int = 20, cooldown: float = 60.0,
+                 workers: int = None):
+        self.get_exchange = get_exchange
+        self.markets = markets  # MarketIndex бота: маршруты символ -> (покупка, продажа)
+        self.fetch_order_book = fetch_order_book
+        self.on_opportunity = on_opportunity  # async (символ, покупка, продажа, спред)
+        self.get_deposit = get_deposit
+        self.min_spread = min_spread  # доля, например 0.005
+        self.interval = interval
+        self.top_n = top_n  # сколько кандидатов за цикл проверять по стаканам
+        self.cooldown = cooldown
+        self.workers = min(4, os.cpu_count() or 1) if workers is None else workers  # 0 - без пула процессов
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.emitted_at: Dict[Route, float] = {}
+        self.task = None
+        self.scans = 0
+        self.emitted = 0
+        self.last_scan_ms = None
+
+    async def _quotes(self, venue: str) -> Dict[str, Tuple[float, float]]:
+        try:
+            return top_of_book(await self.get_exchange(venue).fetch_tickers())
+        except Exception as e:
+            log.warning(f"{venue.upper()} - ⚠️ Сканер: тикеры не получены: {e}")
+            return {}
+
+    async def _evaluate(self, items: List[tuple]) -> List[tuple]:
+        deposit = self.get_deposit()
+        if not self.workers:
+            return evaluate_routes(deposit, items)
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+        loop = asyncio.get_running_loop()
+        chunks = [items[i::self.workers] for i in range(self.workers) if items[i::self.workers]]
+        results = await asyncio.gather(*(loop.run_in_executor(self.pool, evaluate_routes, deposit, chunk)
+                                         for chunk in chunks))
+        return [result for chunk in results for result in chunk]
+
+    async def scan(self) -> List[tuple]:
+        """Один проход сканера; возвращает найденные возможности (до фильтра cooldown)"""
+        started = time.perf_counter()
+        routes = self.markets.routes
+        venues = sorted({venue for pairs in routes.values() for pair in pairs for venue in pair})
+        if not venues:
+            return []
+        quotes = dict(zip(venues, await asyncio.gather(*(self._quotes(venue) for venue in venues))))
+
+        now = time.monotonic()
+        candidates = [route for _, route in screen(routes, quotes, self.min_spread, self.top_n)
+                      if now - self.emitted_at.get(route, float('-inf')) >= self.cooldown]
+        if not candidates:
+            self._finish(started)
+            return []
+
+        books = {}
+        needed = sorted({(venue, symbol) for symbol, buy, sell in candidates for venue in (buy, sell)})
+        for key, book in zip(needed, await asyncio.gather(*(self.fetch_order_book(*key) for key in needed))):
+            if book is not None:
+                books[key] = {'asks': book.get('asks') or [], 'bids': book.get('bids') or []}
+        items = [(symbol, buy, sell, books[(buy, symbol)], books[(sell, symbol)])
+                 for symbol, buy, sell in candidates if (buy, symbol) in books and (sell, symbol) in books]
+
+        opportunities = sorted((r for r in await self._evaluate(items) if r[5] >= self.min_spread),
+                               key=lambda r: r[5], reverse=True)
+        self._finish(started)
+        for symbol, buy, sell, buy_price, sell_price, spread in opportunities:
+            self.emitted_at[(symbol, buy, sell)] = time.monotonic()
+            self.emitted += 1
+            log.info(f"🔎 Сканер: {symbol} {buy.upper()} → {sell.upper()} | покупка {buy_price:.6f}, "
+                     f"продажа {sell_price:.6f}, спред {spread:.2%}")
+            await self.on_opportunity(symbol, buy, sell, spread)
+        return opportunities
+
+    def _finish(self, started: float):
+        self.scans += 1
+        self.last_scan_ms = (time.perf_counter() - started) * 1000
+
+    async def _loop(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self.scan()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(f"⚠️ Ошибка сканера: {e}")
+            await asyncio.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        if self.task is None or self.task.done():
+            log.info(f"🔎 Сканер спредов запущен: каждые {self.interval:g} с, порог {self.min_spread:.2%}")
+            self.task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+    def stats(self) -> dict:
+        return {'scans': self.scans, 'emitted': self.emitted, 'last_scan_ms': self.last_scan_ms}
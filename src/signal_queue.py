@@ -0,0 +1,127 @@
+import asyncio
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# Очередь сигналов.
+# Вместо отбрасывания всех сигналов внутри min_interval сигналы ставятся
+# в ограниченную очередь с ключом (символ, биржа покупки, биржа продажи).
+# Пока сигнал по маршруту ждет обработки, новый сигнал по тому же маршруту
+# заменяет его (обрабатывается самый свежий текст), а не встает в очередь
+# повторно. Обработчики работают в concurrency задачах параллельно;
+# сигналы одного символа бот по-прежнему исполняет по очереди (symbol_locks).
+# CapitalReservations резервирует депозит на обеих биржах на время
+# исполнения, чтобы параллельные сделки не превысили капитал биржи; сигнал,
+# которому капитала не хватило, ждет освобождения, пока не устарел.
+
+
+class SignalQueue:
+    def __init__(self, handler: Callable[[Hashable, Any], Awaitable[Any]], maxsize: int = 100,
+                 concurrency: int = 4):
+        self.handler = handler  # async (ключ, сигнал)
+        self.maxsize = maxsize
+        self.concurrency = max(1, concurrency)
+        self.pending: Dict[Hashable, Any] = {}  # ключ -> последний сигнал, ожидающий обработки
+        self.keys: asyncio.Queue = asyncio.Queue()
+        self.workers: List[asyncio.Task] = []
+        self.coalesced = 0
+        self.dropped = 0
+        self.processed = 0
+
+    def submit(self, key: Hashable, item: Any) -> bool:
+        """Поставить сигнал в очередь; False, если очередь заполнена"""
+        if key in self.pending:
+            self.pending[key] = item  # ожидающий сигнал по маршруту заменяется свежим
+            self.coalesced += 1
+            log.info(f"🔁 Сигнал {key[0] if isinstance(key, tuple) else key} объединен с ожидающим в очереди")
+            return True
+        if len(self.pending) >= self.maxsize:
+            self.dropped += 1
+            log.warning(f"⚠️ Очередь сигналов заполнена ({self.maxsize}), сигнал отброшен")
+            return False
+        self.pending[key] = item
+        self.keys.put_nowait(key)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self.keys.get()
+            item = self.pending.pop(key)
+            try:
+                await self.handler(key, item)
+            except Exception as e:
+                log.exception(f"❌ Ошибка обработки сигнала {key}: {e}")
+            finally:
+                self.processed += 1
+                self.keys.task_done()
+
+    def start(self):
+        if not self.workers:
+            self.workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def join(self):
+        """Дождаться обработки всех поставленных сигналов"""
+        await self.keys.join()
+
+    async def close(self):
+        for task in self.workers:
+            task.cancel()
+        if self.workers:
+            await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def stats(self) -> dict:
+        return {'pending': len(self.pending), 'coalesced': self.coalesced,
+                'dropped': self.dropped, 'processed': self.processed}
+
+
+class CapitalReservations:
+    """Резерв капитала по биржам под исполняемые сделки"""
+
+    def __init__(self, limits: Optional[Dict[str, float]] = None):
+        self.limits: Dict[str, float] = dict(limits or {})  # биржа -> капитал, USDT; нет записи - без ограничения
+        self.reserved: Dict[str, float] = defaultdict(float)
+        self.waiters: List[asyncio.Future] = []  # ожидающие освобождения капитала
+
+    def available(self, venue: str) -> float:
+        limit = self.limits.get(venue)
+        return float('inf') if limit is None else limit - self.reserved[venue]
+
+    def reserve(self, amounts: Dict[str, float]) -> bool:
+        """Зарезервировать суммы сразу на всех биржах; False, если где-то не хватает"""
+        if any(self.available(venue) < amount for venue, amount in amounts.items()):
+            return False
+        for venue, amount in amounts.items():
+            self.reserved[venue] += amount
+        return True
+
+    async def acquire(self, amounts: Dict[str, float], timeout: float) -> bool:
+        """Зарезервировать, дождавшись освобождения капитала; False, если за timeout секунд не хватило"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while not self.reserve(amounts):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            waiter = loop.create_future()
+            self.waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+        return True
+
+    def release(self, amounts: Dict[str, float]):
+        for venue, amount in amounts.items():
+            self.reserved[venue] = max(0.0, self.reserved[venue] - amount)
+        # Будим всех ожидающих: каждый заново проверит свои биржи
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
@@ -0,0 +1,72 @@
+import re
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# Разбор сообщений @ArbitrageSmartBot.
+# Сигнал выглядит так:
+#   🔥 PENGU/USDT
+#   Exchanges: OKX→GATE
+#   Spread: 1.5%
+#   Volume: 10 000 USDT
+# Все поля извлекаются за один проход одним заранее скомпилированным
+# выражением (поля в порядке сообщения, необязательные группы) вместо
+# отдельного re.search на символ и на биржи; маршрут ищется повторно по всему
+# тексту, только если его нет сразу после символа. Сообщения без пары и
+# стрелки маршрута отбрасываются проверкой подстрок еще до регулярного выражения.
+
+_ROUTE = r'([A-Za-z]+)\s*(?:→|->|–|-|>)\s*([A-Za-z]+)'
+_FIELDS = re.compile(
+    r'\b([A-Z0-9]+/[A-Z]+)\b'
+    r'(?:[^:]*?:\s*' + _ROUTE + r')?'
+    r'(?:.*?(?:Spread|Спред):\s*([+-]?\d+(?:[.,]\d+)?)\s*%)?'
+    r'(?:.*?(?:Volume|Объ[её]м):\s*(\d[\d  ]*(?:[.,]\d+)?)\s*([A-Z]+)?)?',
+    re.S,
+)
+_ROUTE_ANYWHERE = re.compile(r'[A-Za-z]+:\s*' + _ROUTE)
+
+_ARROWS = ('→', '->', '–', '-', '>')
+
+
+@dataclass(slots=True)
+class Signal:
+    text: str
+    symbol: Optional[str] = None
+    buy_exchange: Optional[str] = None
+    sell_exchange: Optional[str] = None
+    spread: Optional[float] = None  # спред из сообщения, доля (1.5% -> 0.015)
+    volume: Optional[float] = None
+    volume_currency: Optional[str] = None
+
+    @property
+    def route(self) -> Tuple[str, str, str]:
+        return self.symbol, self.buy_exchange, self.sell_exchange
+
+    @property
+    def complete(self) -> bool:
+        return bool(self.symbol and self.buy_exchange and self.sell_exchange)
+
+
+def _number(value: str) -> float:
+    return float(value.replace(' ', '').replace(' ', '').replace(',', '.'))
+
+
+def parse_message(text: str) -> Optional[Signal]:
+    """Разобрать сообщение; None - заведомо не сигнал (нет пары или стрелки маршрута)"""
+    if not text or '/' not in text or not any(arrow in text for arrow in _ARROWS):
+        return None
+    match = _FIELDS.search(text)
+    if match is None:
+        return Signal(text)
+    symbol, buy, sell, spread, volume, volume_currency = match.groups()
+    if buy is None:
+        route = _ROUTE_ANYWHERE.search(text)
+        if route is not None:
+            buy, sell = route.groups()
+    return Signal(
+        text, symbol,
+        buy.lower() if buy else None,
+        sell.lower() if sell else None,
+        _number(spread) / 100 if spread else None,
+        _number(volume) if volume else None,
+        volume_currency,
+    )
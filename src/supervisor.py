@@ -0,0 +1,305 @@
+import os
+import subprocess
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import psutil
+
+from src.health import read_status
+
+# Супервизор бота для панели управления.
+# Вместо запуска xyz415.py с нуля на каждый /start панель держит резервный
+# процесс (BOT_STANDBY=1): он уже импортировал ccxt и Telethon, создал клиенты
+# бирж, поднял рынки, пул соединений и списки займа и ждет команды в stdin.
+# /start переводит резерв в работу строкой 'start' - остается только вход в
+# Telegram (одну сессию Telegram два процесса держать не могут, поэтому резерв
+# подключается только после команды) - и сразу готовит новый резерв.
+# Фоновый поток раз в check_interval проверяет процессы: выход или файл
+# состояния (src/health.py), который не обновлялся health_timeout секунд, -
+# сбой. Первый сбой - сразу переход на резерв, повторные подряд - с паузой,
+# растущей вдвое до backoff_max; процесс, проработавший stable_after секунд,
+# сбрасывает счетчик. Метрики процессов: RSS, CPU, потоки (psutil) и задержка
+# цикла событий из файла состояния.
+
+BOT_COMMAND = ['python3', 'xyz415.py']
+
+
+class BotProcess:
+    """Процесс бота: роль, файл состояния и метрики"""
+
+    def __init__(self, command: List[str], env: Dict[str, str], status_path: str, role: str):
+        self.role = role  # active | standby
+        self.env = env
+        self.status_path = status_path
+        self.started_at = time.monotonic()
+        self.cpu_percent = 0.0
+        self.popen = subprocess.Popen(
+            command,
+            env={**env, 'BOT_STANDBY': '1' if role == 'standby' else '0', 'BOT_STATUS': status_path},
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+        )
+        try:
+            self.process: Optional[psutil.Process] = psutil.Process(self.popen.pid)
+            self.process.cpu_percent(None)  # первый замер CPU - точка отсчета
+        except psutil.Error:
+            self.process = None
+
+    @property
+    def pid(self) -> int:
+        return self.popen.pid
+
+    def alive(self) -> bool:
+        return self.popen.poll() is None
+
+    def status(self) -> dict:
+        return read_status(self.status_path) or {}
+
+    def heartbeat_age(self) -> Optional[float]:
+        """Секунд с последней записи состояния; None - процесс еще ни разу не писал"""
+        ts = self.status().get('ts')
+        return time.time() - ts if ts else None
+
+    def ready(self) -> bool:
+        return self.alive() and self.status().get('ready') is True
+
+    def promote(self):
+        """Резерв -> в работу"""
+        self.popen.stdin.write(b'start\n')
+        self.popen.stdin.flush()
+        self.role = 'active'
+        self.started_at = time.monotonic()
+
+    def sample(self):
+        """Замер CPU за время с прошлого замера (вызывается раз в check_interval)"""
+        if self.process is not None:
+            try:
+                self.cpu_percent = self.process.cpu_percent(None)
+            except psutil.Error:
+                pass
+
+    def metrics(self) -> dict:
+        status = self.status()
+        result = {
+            'pid': self.pid,
+            'role': self.role,
+            'alive': self.alive(),
+            'uptime_s': round(time.monotonic() - self.started_at, 1),
+            'ready': status.get('ready', False),
+            'telegram': status.get('telegram'),
+            'loop_lag_ms': status.get('loop_lag_ms'),
+            'loop_lag_max_ms': status.get('loop_lag_max_ms'),
+            'heartbeat_age_s': round(time.time() - status['ts'], 1) if status.get('ts') else None,
+            'signals': status.get('signals'),
+            'cpu_percent': self.cpu_percent,
+        }
+        if self.process is not None:
+            try:
+                with self.process.oneshot():
+                    result['rss_mb'] = round(self.process.memory_info().rss / 2 ** 20, 1)
+                    result['threads'] = self.process.num_threads()
+            except psutil.Error:
+                pass
+        return result
+
+    def stop(self, timeout: float = 10.0):
+        if self.alive():
+            self.popen.terminate()
+            try:
+                self.popen.wait(timeout)
+            except subprocess.TimeoutExpired:
+                self.popen.kill()
+                self.popen.wait()
+        if self.popen.stdin:
+            self.popen.stdin.close()
+        for path in (self.status_path, self.status_path + '.tmp'):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class BotSupervisor:
+    def __init__(self, env: Callable[[], Dict[str, str]], command: List[str] = None, standby: bool = True,
+                 status_dir: str = '.', check_interval: float = 1.0, health_timeout: float = 30.0,
+                 startup_timeout: float = 120.0, backoff_initial: float = 1.0, backoff_max: float = 60.0,
+                 stable_after: float = 60.0, on_event: Callable[[str, str], None] = None):
+        self.env = env  # окружение процесса бота на момент запуска
+        self.command = command or BOT_COMMAND
+        self.standby_enabled = standby
+        self.status_dir = status_dir
+        self.check_interval = check_interval
+        self.health_timeout = health_timeout  # столько секунд без записи состояния - процесс завис
+        self.startup_timeout = startup_timeout  # до первой записи (импорт и создание бота)
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.on_event = on_event or (lambda level, message: None)  # (уровень, сообщение) - в лог панели
+        self.lock = threading.RLock()
+        self.active: Optional[BotProcess] = None
+        self.standby: Optional[BotProcess] = None
+        self.running = False  # бот должен работать (после /start и до /stop)
+        self.params: Dict[str, str] = {}  # DEPOSIT, DRY_RUN последнего /start
+        self.crashes = 0  # сбоев подряд
+        self.restarts = 0
+        self.restart_at = 0.0
+        self.standby_failures = 0
+        self.standby_restart_at = 0.0
+        self.spawned = 0
+        self.thread: Optional[threading.Thread] = None
+        self.stopping = threading.Event()
+
+    def _backoff(self, failures: int) -> float:
+        """Пауза перед перезапуском: первый сбой - сразу, дальше 1, 2, 4... до backoff_max"""
+        return 0.0 if failures <= 1 else min(self.backoff_max, self.backoff_initial * 2 ** (failures - 2))
+
+    def _spawn(self, role: str) -> BotProcess:
+        self.spawned += 1
+        path = os.path.join(self.status_dir, f'bot_status_{os.getpid()}_{self.spawned}.json')
+        return BotProcess(self.command, {**self.env(), **self.params}, path, role)
+
+    def _matches(self, process: BotProcess) -> bool:
+        """Резерв запущен с тем же режимом: бумажная торговля задается при создании бота"""
+        return (process.env.get('DRY_RUN') or '0') == (self.params.get('DRY_RUN') or '0')
+
+    def _launch(self) -> bool:
+        """Запустить рабочий процесс: резерв, если он готов, иначе новый. True - резерв"""
+        standby = self.standby
+        if standby is not None and standby.ready() and self._matches(standby):
+            self.standby = None
+            try:
+                standby.promote()
+            except OSError as e:
+                self.on_event('WARNING', f'Резерв не принял команду ({e}), запуск нового процесса')
+                standby.stop()
+            else:
+                self.active = standby
+                self.on_event('INFO', f'Резервный бот (pid {standby.pid}) переведен в работу')
+                return True
+        if self.standby is not None and not self._matches(self.standby):
+            self.standby.stop()  # резерв с другим режимом (DRY_RUN) не подходит
+            self.standby = None
+        self.active = self._spawn('active')
+        self.on_event('INFO', f'Бот запущен без резерва (pid {self.active.pid})')
+        return False
+
+    def start(self, params: Dict[str, str]) -> bool:
+        """Запустить бота (/start); True - переведен прогретый резерв"""
+        with self.lock:
+            if self.running and self.active is not None:
+                raise RuntimeError('Скрипт уже запущен')
+            self.params = dict(params)
+            self.running = True
+            self.crashes = 0
+            return self._launch()
+
+    def stop(self):
+        """Остановить рабочий процесс (/stop); резерв остается прогретым для следующего /start"""
+        with self.lock:
+            if not self.running:
+                raise RuntimeError('Скрипт не запущен')
+            self.running = False
+            if self.active is not None:
+                self.active.stop()
+                self.active = None
+
+    def _unhealthy(self, process: BotProcess) -> Optional[str]:
+        age = process.heartbeat_age()
+        if age is None:
+            if time.monotonic() - process.started_at > self.startup_timeout:
+                return f'не запустился за {self.startup_timeout:.0f} с'
+        elif age > self.health_timeout:
+            return f'не отвечает {age:.0f} с'
+        return None
+
+    def _failed(self, process: BotProcess, reason: str):
+        """Рабочий процесс упал или завис: перезапуск сразу или с паузой"""
+        now = time.monotonic()
+        if now - process.started_at >= self.stable_after:
+            self.crashes = 0
+        self.crashes += 1
+        self.restarts += 1
+        delay = self._backoff(self.crashes)
+        self.restart_at = now + delay
+        self.active = None
+        process.stop()
+        self.on_event('ERROR', f'Бот (pid {process.pid}) {reason}; перезапуск'
+                               f'{f" через {delay:g} с" if delay else ""}')
+
+    def tick(self):
+        """Одна проверка процессов (фоновый поток, раз в check_interval)"""
+        with self.lock:
+            now = time.monotonic()
+            for process in (self.active, self.standby):
+                if process is not None:
+                    process.sample()
+
+            if self.running:
+                if self.active is None:
+                    if now >= self.restart_at:
+                        self._launch()
+                elif not self.active.alive():
+                    self._failed(self.active, f'завершился с кодом {self.active.popen.returncode}')
+                else:
+                    reason = self._unhealthy(self.active)
+                    if reason:
+                        self._failed(self.active, reason)
+
+            if not self.standby_enabled:
+                return
+            if self.standby is None:
+                if now >= self.standby_restart_at:
+                    self.standby = self._spawn('standby')
+            else:
+                reason = (f'завершился с кодом {self.standby.popen.returncode}' if not self.standby.alive()
+                          else self._unhealthy(self.standby))
+                if reason:
+                    self.standby_failures += 1
+                    delay = self._backoff(self.standby_failures)
+                    self.standby_restart_at = now + delay
+                    self.standby.stop()
+                    self.standby = None
+                    self.on_event('WARNING', f'Резервный бот {reason}; новый резерв'
+                                             f'{f" через {delay:g} с" if delay else ""}')
+                elif self.standby.ready():
+                    self.standby_failures = 0
+
+    def _run(self):
+        while not self.stopping.wait(self.check_interval):
+            try:
+                self.tick()
+            except Exception as e:
+                self.on_event('ERROR', f'Ошибка супервизора: {e}')
+
+    def start_monitor(self):
+        """Фоновые проверки; резерв готовится сразу, до первого /start"""
+        if self.thread is None:
+            self.tick()
+            self.thread = threading.Thread(target=self._run, name='supervisor', daemon=True)
+            self.thread.start()
+
+    def shutdown(self):
+        """Остановить проверки и оба процесса (выход панели)"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        with self.lock:
+            self.running = False
+            for process in (self.active, self.standby):
+                if process is not None:
+                    process.stop()
+            self.active = self.standby = None
+
+    def status(self) -> dict:
+        with self.lock:
+            now = time.monotonic()
+            return {
+                'running': self.running,
+                'restarts': self.restarts,
+                'crashes': self.crashes,
+                'restart_in_s': round(self.restart_at - now, 1) if self.running and self.active is None else None,
+                'active': self.active.metrics() if self.active is not None else None,
+                'standby': self.standby.metrics() if self.standby is not None else None,
+            }
@@ -0,0 +1,175 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, List, Optional
+
+from src.logs import get_logger
+
+log = get_logger(__name__)
+
+# Замер задержек на пути сигнал -> исполнение.
+# Каждый сигнал получает Trace с моментом прихода сообщения (perf_counter_ns),
+# этапы отмечаются через span('этап'): длительности попадают в трассу сигнала
+# и в скользящие гистограммы по этапам (p50/p95/p99). Текущая трасса хранится
+# в contextvar, поэтому этапы можно отмечать в любом месте пайплайна, включая
+# задачи asyncio.gather, не передавая ее явно. Сводка пишется в JSON-файл,
+# который отдает эндпоинт /latency панели управления: фоновая задача раз в
+# save_interval копирует замеры, а сортировку и запись делает в потоке -
+# на пути сигнала остаются только append в память.
+
+LATENCY_PATH = './latency.json'
+PERCENTILES = (50, 95, 99)
+
+_current: ContextVar[Optional['Trace']] = ContextVar('trace', default=None)
+
+
+def _ms(ns: int) -> float:
+    return round(ns / 1e6, 3)
+
+
+class Trace:
+    """Трасса одного сигнала: этапы со смещением от прихода сообщения"""
+
+    def __init__(self, tracer: 'Tracer', name: str, started_ns: int):
+        self.tracer = tracer
+        self.name = name
+        self.started_ns = started_ns
+        self.spans: List[dict] = []
+
+    def record(self, stage: str, start_ns: int, end_ns: int):
+        self.spans.append({'stage': stage,
+                           'offset_ms': _ms(start_ns - self.started_ns),
+                           'duration_ms': _ms(end_ns - start_ns)})
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'wall_time': time.time(), 'spans': self.spans}
+
+
+class Tracer:
+    def __init__(self, max_samples: int = 2048, max_traces: int = 50, path: str = LATENCY_PATH,
+                 save_interval: float = 1.0):
+        self.max_samples = max_samples
+        self.samples: Dict[str, Deque[int]] = {}  # этап -> длительности, нс
+        self.recent: Deque[dict] = deque(maxlen=max_traces)
+        self.path = path
+        self.save_interval = save_interval
+        self.dirty = False  # есть замеры, не попавшие в файл
+        self.task = None
+
+    def observe(self, stage: str, duration_ns: int):
+        samples = self.samples.get(stage)
+        if samples is None:
+            samples = self.samples[stage] = deque(maxlen=self.max_samples)
+        samples.append(duration_ns)
+
+    def stats(self, samples_by_stage: Dict[str, List[int]] = None) -> Dict[str, dict]:
+        """Гистограммы по этапам: число замеров, среднее, перцентили и максимум, мс"""
+        result = {}
+        for stage, samples in sorted((samples_by_stage or self.samples).items()):
+            values = sorted(samples)
+            n = len(values)
+            stage_stats = {'count': n, 'mean_ms': _ms(sum(values) // n)}
+            for p in PERCENTILES:
+                stage_stats[f'p{p}_ms'] = _ms(values[min(n - 1, max(0, -(-n * p // 100) - 1))])
+            stage_stats['max_ms'] = _ms(values[-1])
+            result[stage] = stage_stats
+        return result
+
+    def export(self, samples_by_stage: Dict[str, List[int]] = None, recent: List[dict] = None) -> dict:
+        return {'updated_at': time.time(), 'stages': self.stats(samples_by_stage),
+                'recent': recent if recent is not None else list(self.recent)}
+
+    def _copy(self) -> tuple:
+        """Копия замеров для записи в потоке (в цикле событий - только копирование)"""
+        self.dirty = False
+        return {stage: list(samples) for stage, samples in self.samples.items()}, list(self.recent)
+
+    def save(self, samples_by_stage: Dict[str, List[int]] = None, recent: List[dict] = None):
+        """Записать сводку в JSON (атомарно, чтобы панель не прочитала половину файла)"""
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.export(samples_by_stage, recent), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            log.warning(f"⚠️ Не удалось сохранить статистику задержек: {e}")
+
+    async def _save_loop(self):
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if self.dirty:
+                await asyncio.to_thread(self.save, *self._copy())
+
+    def start(self):
+        if self.path and (self.task is None or self.task.done()):
+            self.task = asyncio.create_task(self._save_loop())
+
+    async def close(self):
+        """Остановить фоновую запись и сохранить последние замеры"""
+        if self.task and not self.task.done():
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.task = None
+        if self.dirty:
+            self.save(*self._copy())
+
+
+TRACER = Tracer()
+
+
+def start_trace(name: str, started_ns: int = None) -> Trace:
+    """Начать трассу сигнала; started_ns - момент прихода сообщения"""
+    trace = Trace(TRACER, name, started_ns if started_ns is not None else time.perf_counter_ns())
+    _current.set(trace)
+    return trace
+
+
+def finish_trace(stage: str = 'total') -> Optional[Trace]:
+    """Закрыть текущую трассу: этап total от прихода сообщения; сводку в файл пишет
+    фоновая задача Tracer.start. Возвращает закрытую трассу (этапы сигнала для журнала сделок)"""
+    trace = _current.get()
+    if trace is None:
+        return None
+    end_ns = time.perf_counter_ns()
+    trace.record(stage, trace.started_ns, end_ns)
+    TRACER.observe(stage, end_ns - trace.started_ns)
+    TRACER.recent.append(trace.to_dict())
+    _current.set(None)
+    TRACER.dirty = True
+    return trace
+
+
+def attach(trace: Optional[Trace]):
+    """Сделать трассу текущей (сигнал обрабатывается в другой задаче, например из очереди)"""
+    _current.set(trace)
+
+
+def record(stage: str, start_ns: int, end_ns: int = None):
+    """Отметить этап с известным началом: в гистограмму и в текущую трассу"""
+    end_ns = end_ns if end_ns is not None else time.perf_counter_ns()
+    TRACER.observe(stage, end_ns - start_ns)
+    trace = _current.get()
+    if trace is not None:
+        trace.record(stage, start_ns, end_ns)
+
+
+def elapsed_ms() -> Optional[float]:
+    """Миллисекунды от прихода сообщения текущего сигнала (None вне трассы)"""
+    trace = _current.get()
+    return _ms(time.perf_counter_ns() - trace.started_ns) if trace is not None else None
+
+
+@contextmanager
+def span(stage: str):
+    """Замерить этап: в гистограмму этапа и в текущую трассу сигнала, если она есть"""
+    start_ns = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        record(stage, start_ns)
@@ -1,28 +1,29 @@
-import re
 import time
 import hashlib
 import hmac
-import requests
 import json
-# import logging
+import base64
+import functools
+import uuid
 import os
 
-# logging убран, используем print
+from src.depth import walk_book
+from src.logs import get_logger
+from src.signals import parse_message
+
+log = get_logger(__name__)
 
 def extract_symbol(message: str) -> str | None:
-    match = re.search(r'([A-Z]+/[A-Z]+)', message)
-    if match:
-        return match.group(1)
-    print("Символ не найден в сообщении")
+    signal = parse_message(message)
+    if signal and signal.symbol:
+        return signal.symbol
+    log.info("Символ не найден в сообщении")
     return None   
 
 def extract_exchange(text: str):
-    import re
-    match = re.search(r'([A-Za-z]+):\s*([A-Za-z]+)[→\-–>]([A-Za-z]+)', text)
-    if match:
-        buy_exchange = match.group(2).lower()
-        sell_exchange = match.group(3).lower()
-        return buy_exchange, sell_exchange
+    signal = parse_message(text)
+    if signal and signal.buy_exchange:
+        return signal.buy_exchange, signal.sell_exchange
     return None, None
 
 def gen_sign(method, url, api_key, api_secret, query_string=None, payload_string=None):
@@ -32,13 +33,13 @@ def gen_sign(method, url, api_key, api_secret, query_string=None, payload_string
     signature = hmac.new(api_secret.encode('utf-8'), sign_string.encode('utf-8'), hashlib.sha512).hexdigest()
     return {'KEY': api_key, 'Timestamp': timestamp, 'SIGN': signature}
 
-def get_balance(symbol, host, prefix, api_key, api_secret):
+async def get_balance(session, symbol, host, prefix, api_key, api_secret):
     url = f"{host}{prefix}/spot/accounts"
     headers = {'Accept': 'application/json'}
     sign_headers = gen_sign('GET', f"{prefix}/spot/accounts", api_key, api_secret)
     headers.update(sign_headers)
-    response = requests.get(url, headers=headers)
-    data = response.json()
+    async with session.get(url, headers=headers) as response:
+        data = await response.json(content_type=None)
     for entry in data:
         if entry['currency'] == symbol:
             balance = float(entry['available'])
@@ -47,22 +48,23 @@ def get_balance(symbol, host, prefix, api_key, api_secret):
     # logging.info(f"Баланс для {symbol} не найден")
     return 0.0
 
-def get_price(symbol, host, prefix):
+async def get_price(session, symbol, host, prefix):
     url = f"{host}{prefix}/spot/tickers?currency_pair={symbol}"
     headers = {'Accept': 'application/json'}
-    response = requests.get(url, headers=headers)
+    async with session.get(url, headers=headers) as response:
+        text = await response.text()
 
     try:
-        data = response.json()
+        data = json.loads(text)
         price = float(data[0]['lowest_ask'])
         # logging.info(f"Цена для {symbol}: {price}")
         return price
     except Exception as e:
-        print(f"⚠️ Ошибка парсинга цены для {symbol}: {e}")
-        print(f"🔍 Сырой ответ: {response.text}")
+        log.warning(f"⚠️ Ошибка парсинга цены для {symbol}: {e}")
+        log.debug("🔍 Сырой ответ", symbol=symbol, response=text)
         return None
     
-def send_order(symbol, host, prefix, api_key, api_secret, amount):
+async def send_order(session, symbol, host, prefix, api_key, api_secret, amount):
     endpoint = '/spot/orders'
     url = f"{host}{prefix}{endpoint}"
     headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
@@ -81,86 +83,49 @@ def send_order(symbol, host, prefix, api_key, api_secret, amount):
     sign_headers = gen_sign('POST', prefix + endpoint, api_key, api_secret, "", body_json)
     headers.update(sign_headers)
 
-    response = requests.post(url, headers=headers, data=body_json)
-    return response.json()    
+    async with session.post(url, headers=headers, data=body_json) as response:
+        return await response.json(content_type=None)
 
-def calculate_average_buy_price(deposit, symbol, exchange):
+def calculate_average_buy_price(deposit, symbol, orderbook):
+    """Средняя цена покупки на сумму deposit (в квоте) по уже полученному стакану"""
     try:
-        orderbook = exchange.fetch_order_book(symbol)
-        asks = orderbook['asks']
-
-        total_cost = 0
-        total_amount = 0
-        remaining_deposit = deposit
-
-        for item in asks:
-            if len(item) < 2:
-                print(f"Некорректный элемент в asks: {item}")
-                continue
-            price, volume = item[0], item[1]
-            if remaining_deposit <= 0:
-                break
-            cost = price * volume
-            if cost <= remaining_deposit:
-                total_cost += cost
-                total_amount += volume
-                remaining_deposit -= cost
-            else:
-                affordable_volume = remaining_deposit / price
-                total_cost += affordable_volume * price
-                total_amount += affordable_volume
-                remaining_deposit = 0
-
-        if total_amount == 0:
-            print(f"Недостаточно ликвидности для {symbol}")
+        walk = walk_book(orderbook['asks'], deposit, by='quote')
+        if not walk.base[0] > 0:
+            log.warning("Недостаточно ликвидности", symbol=symbol)
             return None
 
-        average_price = total_cost / total_amount
-        print(f"💱 Средняя цена покупки для {symbol}: {average_price:.6f} USDT")
+        average_price = float(walk.vwap[0])
+        log.debug("💱 Средняя цена покупки", symbol=symbol, price=average_price)
         return average_price
 
     except Exception as e:
-        print(f"Ошибка расчета средней цены покупки для {symbol}: {e}")
+        log.error(f"Ошибка расчета средней цены покупки для {symbol}: {e}")
         return None
     
-def calculate_average_sell_price(deposit, symbol, exchange):
+def calculate_average_sell_price(deposit, symbol, orderbook):
+    """Средняя цена продажи на сумму deposit по уже полученному стакану.
+    Объём в базовой валюте считается по лучшему биду того же стакана, без запроса тикера"""
     try:
-        ticker = exchange.fetch_ticker(symbol)
-        current_price = ticker['last'] or ticker['bid']
-        base_amount = deposit / current_price
-
-        orderbook = exchange.fetch_order_book(symbol)
         bids = orderbook['bids']
+        if not len(bids):
+            log.warning("Недостаточно ликвидности", symbol=symbol)
+            return None
+        base_amount = deposit / bids[0][0]
 
-        total_revenue = 0
-        total_sold = 0
-        remaining_amount = base_amount
-
-        for price, volume in bids:
-            if remaining_amount <= 0:
-                break
-            if volume <= remaining_amount:
-                total_revenue += price * volume
-                total_sold += volume
-                remaining_amount -= volume
-            else:
-                total_revenue += price * remaining_amount
-                total_sold += remaining_amount
-                remaining_amount = 0
-
-        if total_sold == 0:
-            print(f"Недостаточно ликвидности для {symbol}")
+        walk = walk_book(bids, base_amount, by='base')
+        if not walk.base[0] > 0:
+            log.warning("Недостаточно ликвидности", symbol=symbol)
             return None
 
-        average_price = total_revenue / total_sold
-        print(f"💱 Средняя цена продажи для {symbol}: {average_price:.6f} USDT")
+        average_price = float(walk.vwap[0])
+        log.debug("💱 Средняя цена продажи", symbol=symbol, price=average_price)
         return average_price
 
     except Exception as e:
-        print(f"Ошибка расчета средней цены продажи для {symbol}: {e}")
+        log.error(f"Ошибка расчета средней цены продажи для {symbol}: {e}")
         return None
 
-def get_max_borrowable_gate(symbol, host, prefix, api_key, api_secret):
+async def get_max_borrowable_gate(session, symbol, host, prefix, api_key, api_secret):
     url_path = f"{prefix}/margin/cross/borrowable"
     url = f"{host}{url_path}"
     headers = {'Accept': 'application/json'}
@@ -173,31 +138,155 @@ def get_max_borrowable_gate(symbol, host, prefix, api_key, api_secret):
     headers.update(sign_headers)
     params = {'currency': base_currency}
     
-    response = requests.get(url, headers=headers, params=params)
-    data = response.json()
+    async with session.get(url, headers=headers, params=params) as response:
+        data = await response.json(content_type=None)
     try:
         # API возвращает 'amount' для доступного займа
         return float(data['amount'])
     except Exception as e:
-        print(f"Ошибка получения max borrowable для {symbol}: {e}")
-        print(f"Ответ: {data}")
+        log.error(f"Ошибка получения max borrowable для {symbol}: {e}")
+        log.debug("Ответ", symbol=symbol, response=data)
         return 0.0
 
-def is_borrowable_gate(symbol, host, prefix):
+async def is_borrowable_gate(session, symbol, host, prefix):
     """Проверяет доступность займа для валюты на Gate.io"""
     try:
         # Извлекаем базовую валюту из пары (MORE_USDT -> MORE)
         base_currency = symbol.split('_')[0]
         url = f'{host}{prefix}/margin/cross/currencies/{base_currency}'
         headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        async with session.get(url, headers=headers) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
         return "name" in data
     except Exception as e:
-        print(f"Ошибка проверки доступности займа для {symbol}: {e}")
+        log.error(f"Ошибка проверки доступности займа для {symbol}: {e}")
         return False
 
+async def get_margin_currencies_gate(session, host, prefix):
+    """Все валюты, доступные для займа в кросс-марже Gate.io (один запрос)"""
+    url = f'{host}{prefix}/margin/cross/currencies'
+    headers = {'Accept': 'application/json', 'Content-Type': 'application/json'}
+    async with session.get(url, headers=headers) as response:
+        response.raise_for_status()
+        data = await response.json(content_type=None)
+    return {item['name'] for item in data if item.get('loanable', True)}
+
+KUCOIN_BASE_URL = 'https://api.kucoin.com'
+
+@functools.lru_cache(maxsize=8)
+def _kucoin_passphrase(api_secret, api_passphrase):
+    """Подпись passphrase (API v2) не зависит от запроса - считается один раз"""
+    return base64.b64encode(
+        hmac.new(api_secret.encode('utf-8'), api_passphrase.encode('utf-8'), hashlib.sha256).digest()
+    ).decode()
+
+def sign_kucoin(method, endpoint, api_key, api_secret, api_passphrase, body=''):
+    now = str(int(time.time() * 1000))
+    str_to_sign = now + method.upper() + endpoint + body
+    signature = base64.b64encode(
+        hmac.new(api_secret.encode('utf-8'), str_to_sign.encode('utf-8'), hashlib.sha256).digest()
+    ).decode()
+    passphrase = _kucoin_passphrase(api_secret, api_passphrase)
+    return {
+        "KC-API-KEY": api_key,
+        "KC-API-SIGN": signature,
+        "KC-API-TIMESTAMP": now,
+        "KC-API-PASSPHRASE": passphrase,
+        "KC-API-KEY-VERSION": "2",
+        "Content-Type": "application/json"
+    }
+
+async def get_price_kucoin(session, symbol):
+    """Получить текущую цену символа на KuCoin (формат символа PENGU-USDT)"""
+    url = f"{KUCOIN_BASE_URL}/api/v1/market/orderbook/level1?symbol={symbol}"
+    async with session.get(url) as response:
+        r = await response.json(content_type=None)
+    data = r.get("data")
+    if r.get("code") != "200000" or not data:
+        log.error(f"KUCOIN - ❌ Ошибка получения цены: {r}")
+        return None
+    return {
+        'bid': float(data.get('bestBid', 0)),
+        'ask': float(data.get('bestAsk', 0)),
+        'price': float(data.get('price', 0))
+    }
+
+async def get_margin_account_kucoin(session, api_key, api_secret, api_passphrase):
+    """Получить информацию о маржинальном аккаунте KuCoin"""
+    endpoint = '/api/v1/margin/account'
+    headers = sign_kucoin("GET", endpoint, api_key, api_secret, api_passphrase)
+    async with session.get(KUCOIN_BASE_URL + endpoint, headers=headers) as response:
+        r = await response.json(content_type=None)
+    if r.get("code") != "200000":
+        log.error(f"KUCOIN - ❌ Ошибка получения маржинального аккаунта: {r}")
+        return None
+    return r['data']
+
+async def get_margin_currencies_kucoin(session):
+    """Валюты, доступные для маржинальной торговли на KuCoin"""
+    async with session.get(f"{KUCOIN_BASE_URL}/api/v1/margin/config") as response:
+        response.raise_for_status()
+        data = await response.json(content_type=None)
+    if data.get("code") != "200000":
+        raise ValueError(f"Ошибка получения конфигурации маржи KuCoin: {data}")
+    return set(data.get("data", {}).get("currencyList", []))
+
+def get_margin_position_kucoin(account_data, currency):
+    """Найти позицию по валюте в данных маржинального аккаунта"""
+    for asset in account_data.get('accounts', []):
+        if asset['currency'] == currency:
+            return {
+                'currency': currency,
+                'total': float(asset.get('totalBalance', 0)),
+                'available': float(asset.get('availableBalance', 0)),
+                'liability': float(asset.get('liability', 0)),
+                'interest': float(asset.get('interest', 0))
+            }
+    return None
+
+def format_amount_for_api(amount, increment):
+    """Форматировать количество для API с правильным количеством знаков"""
+    if increment == 0:
+        return str(amount)
+
+    # Находим количество знаков после запятой для increment
+    decimal_places = len(str(increment).split('.')[-1]) if '.' in str(increment) else 0
+
+    # Округляем и форматируем
+    rounded = round(amount / increment) * increment
+    formatted = round(rounded, decimal_places)
+
+    # Преобразуем в строку с правильным количеством знаков
+    return f"{formatted:.{decimal_places}f}".rstrip('0').rstrip('.')
+
+async def place_margin_order_kucoin(session, symbol, side, base_amount, increment, api_key, api_secret, api_passphrase,
+                                    client_oid=None):
+    """Разместить маржинальный рыночный ордер с автозаймом (sell - шорт, buy - закрытие шорта)"""
+    endpoint = '/api/v1/margin/order'
+    body = {
+        "symbol": symbol,
+        "side": side,
+        "type": "market",
+        "size": format_amount_for_api(base_amount, increment),
+        "autoBorrow": True,
+        "clientOid": client_oid or str(uuid.uuid4())
+    }
+    body_str = json.dumps(body)
+    headers = sign_kucoin("POST", endpoint, api_key, api_secret, api_passphrase, body_str)
+    async with session.post(KUCOIN_BASE_URL + endpoint, headers=headers, data=body_str) as response:
+        return await response.json(content_type=None)
+
+async def get_order_kucoin(session, order_id, api_key, api_secret, api_passphrase):
+    """Статус ордера KuCoin (в том числе маржинального) по orderId"""
+    endpoint = f'/api/v1/orders/{order_id}'
+    headers = sign_kucoin("GET", endpoint, api_key, api_secret, api_passphrase)
+    async with session.get(KUCOIN_BASE_URL + endpoint, headers=headers) as response:
+        r = await response.json(content_type=None)
+    if r.get("code") != "200000":
+        raise ValueError(f"Ошибка получения ордера KuCoin: {r}")
+    return r['data']
+
 # if __name__ == "__main__":
 #     import ccxt
 #     from dotenv import load_dotenv
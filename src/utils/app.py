@@ -1,82 +1,101 @@
-from flask import Flask, request, jsonify, render_template
-import subprocess
+from flask import Flask, Response, request, jsonify, render_template
+import atexit
+import json
 import os
-import threading
+import sys
 import time
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from src.journal import JOURNAL_PATH, connect, fill_rate, pnl, recent_trades
+from src.logs import LOG_PATH, follow_lines, parse_line, tail_lines
+from src.runtime import RUNTIME_CONFIG_PATH, RuntimeConfig
+from src.tracing import LATENCY_PATH
+from src.supervisor import BotSupervisor
+
 app = Flask(__name__)
 
-process = None
-log_file_path = './xyz415.log'
+log_file_path = LOG_PATH  # JSON-лог бота (src/logs.py), бот пишет его сам
+latency_file_path = LATENCY_PATH  # статистика задержек, которую пишет бот (src/tracing.py)
+journal_path = os.getenv('JOURNAL_PATH', JOURNAL_PATH)  # журнал сделок бота (src/journal.py)
+# Настройки, общие с запущенным ботом (src/runtime.py): изменения применяются без перезапуска
+runtime = RuntimeConfig(os.getenv('RUNTIME_CONFIG', RUNTIME_CONFIG_PATH))
+
+def write_log(level, message):
+    """Событие панели в тот же JSON-лог"""
+    with open(log_file_path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'ts': round(time.time(), 3), 'level': level, 'logger': 'app', 'msg': message},
+                           ensure_ascii=False) + '\n')
+
+def bot_env():
+    """Окружение процесса бота: бот пишет события в JSON-лог сам, stdout не пересылается"""
+    return {
+        **os.environ,
+        'LOG_FILE': log_file_path,
+        'LOG_CONSOLE': '0',
+        'RUNTIME_CONFIG': runtime.path,
+    }
+
+# Бот под супервизором: прогретый резерв, проверки состояния, перезапуск с паузой (src/supervisor.py)
+supervisor = BotSupervisor(bot_env, standby=os.getenv('BOT_STANDBY_ENABLED', '1') == '1', on_event=write_log)
 
 def read_logs_from_file():
     try:
-        with open(log_file_path, 'r', encoding='utf-8') as f:
-            lines = f.readlines()
-            return [line.strip() for line in lines[-50:] if line.strip()]
+        lines, _ = tail_lines(log_file_path, 50)  # только хвост: файл читается с конца блоками
+        return [parse_line(line) for line in lines]
     except FileNotFoundError:
         return ['Лог-файл пока не создан']
     except Exception as e:
         return [f'Ошибка чтения логов: {str(e)}']
 
+def sse_message(line):
+    """Строка лога -> событие SSE (многострочный traceback - несколько полей data)"""
+    return ''.join(f'data: {part}\n' for part in parse_line(line).split('\n')) + '\n'
+
+def sse_batch(lines, offset):
+    """Пачка строк одной записью в ответ; id (смещение после пачки) - у последнего события"""
+    return ''.join(sse_message(line) for line in lines[:-1]) + f'id: {offset}\n' + sse_message(lines[-1])
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/start', methods=['POST'])
 def start():
-    global process
-    if process is not None:
-        return jsonify({'error': 'Скрипт уже запущен'}), 400
-    
     data = request.json
     deposit = data.get('deposit')
+    dry_run = bool(data.get('dry_run'))
     
     if not deposit:
         return jsonify({'error': 'Необходимо указать депозит'}), 400
               
     try:
-        process = subprocess.Popen(
-            ['python3', 'xyz415.py'],
-            env={
-                **os.environ,
-                'DEPOSIT': str(deposit),
-                'PYTHONUNBUFFERED': '1'
-            },
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-        
-        threading.Thread(
-            target=lambda: [print(line.strip()) for line in iter(process.stdout.readline, '')],
-            daemon=True
-        ).start()
-        
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} - INFO - Скрипт запущен\n')
-        return jsonify({'message': 'Скрипт запущен'})
+        runtime.update(deposit=deposit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # Депозит уже в общей конфигурации - резерв применит его при переходе в работу
+        warm = supervisor.start({'DEPOSIT': str(deposit), 'DRY_RUN': '1' if dry_run else '0'})
+        write_log('INFO', f'Скрипт запущен{" (бумажная торговля)" if dry_run else ""}'
+                          f'{" из прогретого резерва" if warm else ""}')
+        return jsonify({'message': 'Скрипт запущен в режиме бумажной торговли' if dry_run else 'Скрипт запущен',
+                        'warm': warm})
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} - ERROR - Не удалось запустить скрипт: {str(e)}\n')
+        write_log('ERROR', f'Не удалось запустить скрипт: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/stop', methods=['POST'])
 def stop():
-    global process
-    if process is None:
-        return jsonify({'error': 'Скрипт не запущен'}), 400
-    
     try:
-        process.terminate()
-        process.wait()
-        process = None
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} - INFO - Скрипт остановлен\n')
+        supervisor.stop()
+        write_log('INFO', 'Скрипт остановлен')
         return jsonify({'message': 'Скрипт остановлен'})
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} - ERROR - Не удалось остановить скрипт: {str(e)}\n')
+        write_log('ERROR', f'Не удалось остановить скрипт: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/toggle_check', methods=['POST'])
@@ -88,18 +107,132 @@ def toggle_check():
         return jsonify({'error': 'Необходимо указать состояние проверки'}), 400
     
     try:
-        os.environ['CHECK_ENABLED'] = '1' if check_enabled else '0'
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} - INFO - Проверка {"включена" if check_enabled else "отключена"}\n')
+        os.environ['CHECK_ENABLED'] = '1' if check_enabled else '0'  # для следующего запуска
+        runtime.update(use_validation=check_enabled)  # работающий бот применяет сразу
+        write_log('INFO', f'Проверка {"включена" if check_enabled else "отключена"}')
         return jsonify({'message': f'Проверка {"включена" if check_enabled else "отключена"}'})
     except Exception as e:
-        with open(log_file_path, 'a', encoding='utf-8') as f:
-            f.write(f'{time.strftime("%Y-%m-%d %H:%M:%S")} - ERROR - Не удалось изменить состояние проверки: {str(e)}\n')
+        write_log('ERROR', f'Не удалось изменить состояние проверки: {str(e)}')
         return jsonify({'error': str(e)}), 500
 
+@app.route('/config', methods=['GET', 'POST'])
+def config():
+    """Настройки бота на ходу: депозит, проверки, режим исполнения, биржи и пороги.
+    POST - только изменяемые поля, например {"deposit": 20, "venues": ["okx", "gate"]}"""
+    try:
+        if request.method == 'GET':
+            return jsonify(runtime.read())
+        updated = runtime.update(**(request.json or {}))
+        write_log('INFO', f'Настройки изменены: {json.dumps(request.json, ensure_ascii=False)}')
+        return jsonify(updated)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Ошибка общей конфигурации: {str(e)}'}), 500
+
 @app.route('/logs', methods=['GET'])
 def get_logs():
     return jsonify({'logs': read_logs_from_file()})
 
+@app.route('/logs/stream', methods=['GET'])
+def stream_logs():
+    """Лог в реальном времени (Server-Sent Events): сначала хвост файла, затем новые
+    строки по мере записи. id события - смещение в файле: при переподключении
+    браузер присылает Last-Event-ID, и поток продолжается без повторов"""
+    last_event_id = request.headers.get('Last-Event-ID', '')
+
+    def events():
+        offset = None
+        if last_event_id.isdigit():
+            offset = int(last_event_id)
+            try:
+                if offset > os.path.getsize(log_file_path):
+                    offset = None  # файл ротирован - начать с хвоста нового
+            except OSError:
+                offset = None
+        if offset is None:
+            yield 'event: reset\ndata:\n\n'  # панель очищает вывод перед хвостом
+            try:
+                lines, offset = tail_lines(log_file_path, 50)
+            except FileNotFoundError:
+                lines, offset = [], 0
+            if lines:
+                yield sse_batch(lines, offset)
+        for lines, offset in follow_lines(log_file_path, offset):
+            if not lines:
+                yield ': ping\n\n'  # обрыв соединения обнаруживается на записи
+                continue
+            yield sse_batch(lines, offset)
+
+    return Response(events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def journal_query(query, **kwargs):
+    """Запрос к журналу сделок только на чтение; фильтры since/until (unix-время) и paper (0/1)"""
+    if not os.path.exists(journal_path):
+        return None
+    params = {
+        'since': request.args.get('since', type=float),
+        'until': request.args.get('until', type=float),
+        'paper': request.args.get('paper', type=int),
+    }
+    conn = connect(journal_path, readonly=True)
+    try:
+        return query(conn, **params, **kwargs)
+    finally:
+        conn.close()
+
+@app.route('/trades', methods=['GET'])
+def get_trades():
+    """Последние сигналы из журнала с ногами сделок; фильтры symbol и venue"""
+    try:
+        trades = journal_query(recent_trades, limit=min(request.args.get('limit', 50, type=int), 500),
+                               symbol=request.args.get('symbol'), venue=request.args.get('venue'))
+        return jsonify({'trades': trades or []})
+    except Exception as e:
+        return jsonify({'error': f'Ошибка чтения журнала сделок: {str(e)}'}), 500
+
+@app.route('/analytics/pnl', methods=['GET'])
+def get_pnl():
+    """PnL исполненных сигналов по группам: symbol, route или day"""
+    try:
+        return jsonify({'pnl': journal_query(pnl, group=request.args.get('group', 'symbol')) or []})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Ошибка чтения журнала сделок: {str(e)}'}), 500
+
+@app.route('/analytics/fill_rate', methods=['GET'])
+def get_fill_rate():
+    """Доля исполненных ног по venue, symbol или side и исходы сигналов"""
+    try:
+        return jsonify(journal_query(fill_rate, group=request.args.get('group', 'venue'))
+                       or {'legs': [], 'signals': {}})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Ошибка чтения журнала сделок: {str(e)}'}), 500
+
+@app.route('/supervisor', methods=['GET'])
+def get_supervisor():
+    """Рабочий и резервный процессы: роль, RSS, CPU, потоки, задержка цикла событий, перезапуски"""
+    return jsonify(supervisor.status())
+
+@app.route('/latency', methods=['GET'])
+def get_latency():
+    """Задержки по этапам сигнала: p50/p95/p99 и последние трассы"""
+    try:
+        with open(latency_file_path, 'r', encoding='utf-8') as f:
+            return jsonify(json.load(f))
+    except FileNotFoundError:
+        return jsonify({'stages': {}, 'recent': []})
+    except Exception as e:
+        return jsonify({'error': f'Ошибка чтения статистики задержек: {str(e)}'}), 500
+
 if __name__ == '__main__':
+    # debug=True запускает перезагрузчик: модуль выполняется в нем и в рабочем процессе -
+    # процессы бота ведет только рабочий, иначе резервов было бы два
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        supervisor.start_monitor()
+        atexit.register(supervisor.shutdown)
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
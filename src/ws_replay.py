@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import sys
+
+from aiohttp import web
+
+# Локальная замена WebSocket биржи: после первой подписки клиента отдает
+# записанные кадры стакана (по строке JSON на кадр, как пишет
+# OrderBookCache(record_dir=...)). Используется для проверки синхронизации
+# стаканов без доступа к бирже:
+#   python src/ws_replay.py logs/okx.jsonl --port 8765
+#   OrderBookCache(..., urls={'okx': 'ws://127.0.0.1:8765/'})
+# Записи по каждой бирже с потоковыми стаканами - tests/fixtures/orderbook,
+# на них работает tests/test_orderbook.py.
+
+RECEIVED = web.AppKey('received', list)  # сообщения клиента в порядке получения
+
+
+def load_frames(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f if line.strip()]
+
+
+def create_app(frames, interval: float = 0.0, loop_forever: bool = False) -> web.Application:
+    async def handler(request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+
+        async def replay():
+            if not frames:
+                return  # нечего отдавать - без этого loop_forever крутился бы без await
+            while True:
+                for frame in frames:
+                    await ws.send_str(frame)
+                    await asyncio.sleep(interval)
+                if not loop_forever:
+                    break
+
+        task = None
+        async for msg in ws:
+            request.app[RECEIVED].append(msg.data)  # подписки и пинги клиента - для проверок
+            if msg.data == 'ping':
+                await ws.send_str('pong')
+            elif task is None:
+                task = asyncio.create_task(replay())
+        if task is not None:
+            task.cancel()
+        return ws
+
+    app = web.Application()
+    app[RECEIVED] = []
+    app.router.add_get('/', handler)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанных кадров стакана по WebSocket')
+    parser.add_argument('recording')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--interval', type=float, default=0.0, help='пауза между кадрами, сек')
+    parser.add_argument('--loop', action='store_true', help='повторять запись по кругу')
+    args = parser.parse_args()
+
+    frames = load_frames(args.recording)
+    print(f"📼 Загружено {len(frames)} кадров из {args.recording}")
+    web.run_app(create_app(frames, args.interval, args.loop), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding='utf-8')
+    main()
@@ -0,0 +1,141 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.bench import make_bot
+from src.signal_queue import CapitalReservations, SignalQueue
+
+# Очередь сигналов и резерв капитала (src/signal_queue.py): ожидание
+# освобождения капитала, таймаут, объединение сигналов одного маршрута,
+# переполнение очереди; в конце - бот на фикстуре бенчмарка, где второй
+# сигнал ждет капитал и после ожидания заново считает цены.
+#   python -m pytest tests
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                       'benchmarks', 'fixtures', 'wif_bitget_kucoin.json')
+ROUTE = ('WIF/USDT', 'bitget', 'kucoin')
+
+
+def test_release_wakes_waiter():
+    async def run():
+        capital = CapitalReservations({'bitget': 10, 'kucoin': 10})
+        assert capital.reserve({'bitget': 10, 'kucoin': 10})
+        assert not capital.reserve({'bitget': 5, 'kucoin': 5})
+
+        asyncio.get_running_loop().call_later(0.05, capital.release, {'bitget': 10, 'kucoin': 10})
+        started = time.monotonic()
+        acquired = await capital.acquire({'bitget': 5, 'kucoin': 5}, timeout=1.0)
+        return acquired, time.monotonic() - started, capital
+
+    acquired, waited, capital = asyncio.run(run())
+    assert acquired
+    assert waited < 0.5  # разбудил release, а не таймаут
+    assert dict(capital.reserved) == {'bitget': 5, 'kucoin': 5}
+    assert capital.waiters == []
+
+
+def test_acquire_timeout():
+    async def run():
+        capital = CapitalReservations({'bitget': 10})
+        assert capital.reserve({'bitget': 10})
+        acquired = await capital.acquire({'bitget': 5}, timeout=0.05)
+        return acquired, capital
+
+    acquired, capital = asyncio.run(run())
+    assert not acquired
+    assert dict(capital.reserved) == {'bitget': 10}  # неудачное ожидание ничего не резервирует
+    assert capital.waiters == []
+
+
+def test_duplicate_route_replaces_pending():
+    async def run():
+        handled = []
+
+        async def handler(key, item):
+            handled.append((key, item))
+
+        queue = SignalQueue(handler)
+        assert queue.submit(ROUTE, 'первый')
+        assert queue.submit(ROUTE, 'второй')  # воркеры еще не запущены: сигнал ждет в очереди
+        queue.start()
+        await queue.join()
+        await queue.close()
+        return handled, queue
+
+    handled, queue = asyncio.run(run())
+    assert handled == [(ROUTE, 'второй')]  # обработан только самый свежий сигнал
+    assert queue.stats() == {'pending': 0, 'coalesced': 1, 'dropped': 0, 'processed': 1}
+
+
+def test_full_queue_drops():
+    async def run():
+        async def handler(key, item):
+            pass
+
+        queue = SignalQueue(handler, maxsize=2)
+        results = [queue.submit(('A/USDT', 'okx', 'gate'), 1), queue.submit(('B/USDT', 'okx', 'gate'), 2),
+                   queue.submit(('C/USDT', 'okx', 'gate'), 3), queue.submit(('A/USDT', 'okx', 'gate'), 4)]
+        return results, queue
+
+    results, queue = asyncio.run(run())
+    assert results == [True, True, False, True]  # сигнал уже ожидающего маршрута объединяется и при полной очереди
+    assert queue.stats() == {'pending': 2, 'coalesced': 1, 'dropped': 1, 'processed': 0}
+
+
+def run_bot_signals(signal_ttl: float, delay: float = 0.2):
+    """Два одновременных сигнала по одному маршруту при капитале на одну сделку"""
+    with open(FIXTURE, 'r', encoding='utf-8') as f:
+        fixture = json.load(f)
+
+    async def run(snapshot_dir):
+        bot = make_bot(fixture, snapshot_dir)
+        bot.journal.path = None
+        bot.signal_ttl = signal_ttl
+        bot.capital = CapitalReservations({venue: bot.deposit for venue in (fixture['buy_exchange'],
+                                                                           fixture['sell_exchange'])})
+        calculations = []
+        calculate_prices = bot.calculate_prices
+        execute_trades = bot.execute_trades
+
+        async def counting_calculate_prices(*args):
+            calculations.append(time.monotonic())
+            return await calculate_prices(*args)
+
+        async def slow_execute_trades(*args):
+            await asyncio.sleep(delay)  # капитал занят, пока идет первая сделка
+            return await execute_trades(*args)
+
+        bot.calculate_prices = counting_calculate_prices
+        bot.execute_trades = slow_execute_trades
+        try:
+            args = (fixture['symbol'], fixture['buy_exchange'], fixture['sell_exchange'])
+            results = await asyncio.gather(bot.process_signal(*args, 'первый', datetime.now()),
+                                           bot.process_signal(*args, 'второй', datetime.now()))
+            return results, calculations, dict(bot.capital.reserved)
+        finally:
+            await bot.close()
+
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        return asyncio.run(run(snapshot_dir))
+
+
+def test_signal_revalidated_after_capital_wait():
+    results, calculations, reserved = run_bot_signals(signal_ttl=5.0)
+    assert results == [True, True]
+    # Два расчета до ожидания и один повторный у сигнала, дождавшегося капитала
+    assert len(calculations) == 3
+    assert calculations[-1] - calculations[0] >= 0.2
+    assert all(amount == 0 for amount in reserved.values())
+
+
+def test_signal_expires_while_waiting_for_capital():
+    results, calculations, reserved = run_bot_signals(signal_ttl=0.05)
+    assert results == [True, False]  # второй сигнал устарел, пока капитал был занят
+    assert len(calculations) == 2
+    assert all(amount == 0 for amount in reserved.values())
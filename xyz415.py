@@ -1,35 +1,68 @@
 import asyncio
-import subprocess
+import sys
+import threading
+from collections import defaultdict
 from telethon import TelegramClient, events
 import os
 from dotenv import load_dotenv
 import time
-import ccxt
-import requests
+import ccxt.async_support as ccxt
+import ccxt.pro as ccxtpro
 import re
-from src.utils import extract_symbol, extract_exchange, is_borrowable_gate
 from datetime import datetime, timedelta
 from src.utils import calculate_average_buy_price, calculate_average_sell_price
-from typing import Dict, List, Optional, Tuple
+from src.executors import FillResult, TradeExecutor, create_executor
+from src.orderbook import OrderBookCache
+from src.markets import MarketIndex
+from src.borrow import BorrowabilityService
+from src.accounts import BalanceLedger
+from src.fills import FillTracker
+from src.http_pool import HttpPool, RetryingSession
+from src.ratelimit import RateLimiter
+from src.tracing import TRACER, attach, finish_trace, record, span, start_trace
+from src.signal_queue import CapitalReservations, SignalQueue
+from src.replay import SignalRecorder
+from src.signals import parse_message
+from src.paper import PaperBroker
+from src.scanner import OpportunityScanner
+from src.journal import JOURNAL_PATH, TradeJournal, note
+from src.runtime import RUNTIME_CONFIG_PATH, RuntimeConfig
+from src.health import Heartbeat
+from src.logs import LOG_PATH, get_logger, setup_logging, shutdown_logging
+from typing import Dict, FrozenSet, List, Optional, Tuple
 
 load_dotenv()
 
+log = get_logger('bot')
+
 class ArbitrageBot:
-    def __init__(self):
+    def __init__(self, client: TelegramClient = None):
         self.api_id = os.getenv('APP_ID')
         self.api_hash = os.getenv('APP_HASH')
-        self.deposit = 10  # депозит в долларах
-        self.use_validation = True  # True - с проверкой, False - без проверки
+        self.deposit = float(os.getenv('DEPOSIT', '10'))  # депозит в долларах
+        self.use_validation = os.getenv('CHECK_ENABLED', '1') == '1'  # True - с проверкой, False - без проверки
         self.simultaneously = True  # True - одновременно, False - нет
-        self.last_signal_time = None
-        self.min_interval = timedelta(minutes=1)
-        
-        # Rate limiting для API запросов
-        self.api_call_times = {}
-        self.max_api_calls_per_minute = 60
-        
-        # Инициализация клиента Telegram
-        self.client = TelegramClient(
+        self.reconcile_tolerance = 0.01  # допустимое расхождение ног при одновременных сделках (доля)
+        self.last_signal_times = {}  # время последнего сигнала по маршруту (символ, покупка, продажа)
+        self.min_interval = timedelta(0)  # пауза между сигналами по одному маршруту (0 - без паузы)
+        self.min_spread = 0.0  # минимальный спред (sell - buy) / buy для сделки, доля
+        # Запись сигналов со стаканами для src/replay.py (путь к JSONL в RECORD_SIGNALS)
+        self.signal_recorder = SignalRecorder(os.getenv('RECORD_SIGNALS')) if os.getenv('RECORD_SIGNALS') else None
+        # Сигналы по одному символу обрабатываются строго по очереди,
+        # по разным символам - параллельно
+        self.symbol_locks = defaultdict(asyncio.Lock)
+        # Очередь сигналов: повторы по маршруту объединяются, маршруты обрабатываются параллельно
+        self.max_concurrent_signals = int(os.getenv('MAX_CONCURRENT_SIGNALS', '4'))
+        self.signal_queue = SignalQueue(self._process_queued, maxsize=int(os.getenv('SIGNAL_QUEUE_SIZE', '100')),
+                                        concurrency=self.max_concurrent_signals)
+        # Сколько секунд с прихода сигнал остается актуальным (столько он может ждать занятый капитал)
+        self.signal_ttl = float(os.getenv('SIGNAL_TTL', '5'))
+        
+        # Лимиты частоты запросов по биржам и классам эндпоинтов (ccxt и прямой REST)
+        self.rate_limiter = RateLimiter()
+        
+        # Инициализация клиента Telegram (готовый клиент передают бенчмарки и прогоны на фикстурах)
+        self.client = client if client is not None else TelegramClient(
             'arbitrage_session245',
             self.api_id,
             self.api_hash,
@@ -41,9 +74,15 @@ class ArbitrageBot:
         
         # Кэш для бирж и их рынков
         self.exchanges = {}
-        self.markets_cache = {}
-        self.markets_cache_time = None
-        self.cache_duration = timedelta(minutes=5)
+        self.stream_exchanges = {}  # клиенты ccxt.pro для приватных потоков
+        self.executors = {}
+        # Пул keep-alive соединений по биржам для прямых REST-запросов Gate и KuCoin
+        self.http = HttpPool(limiter=self.rate_limiter)
+        # Живые стаканы по WebSocket для символов, по которым недавно были сигналы
+        self.order_books = OrderBookCache(self.get_exchange, self.get_http_session)
+        # Списки маржинальных валют бирж продажи и кэш максимального займа Gate
+        self.borrow = BorrowabilityService(self.get_http_session)
+        self.markets_ttl = {}  # TTL рынков по биржам, сек (по умолчанию 5 минут)
         
         # Конфигурация бирж
         self.exchange_configs = {
@@ -90,63 +129,149 @@ class ArbitrageBot:
         # Маппинг бирж для покупки и продажи
         self.buyer_exchanges = ['bitget', 'okx', 'mexc']
         self.seller_exchanges = ['gate', 'kucoin']
+        # Включенные биржи: выключенная не участвует в новых сделках (клиенты и кэши остаются прогретыми)
+        self.enabled_venues = frozenset(self.buyer_exchanges + self.seller_exchanges)
+        # Настройки, которые панель меняет на ходу (src/runtime.py)
+        self.runtime = RuntimeConfig(os.getenv('RUNTIME_CONFIG', RUNTIME_CONFIG_PATH))
+        # Состояние процесса для супервизора панели (BOT_STATUS - путь к файлу, src/health.py)
+        self.role = 'starting'  # standby - резерв, прогрет и ждет команды; active - обрабатывает сигналы
+        self.ready = False
+        self.heartbeat = Heartbeat(os.getenv('BOT_STATUS'), self.health)
+
+        # Балансы бирж в памяти: приватные WebSocket-потоки, где их нет - опрос по REST
+        self.balances = BalanceLedger(self.get_exchange, self.get_http_session, self.get_stream_client,
+                                      self.buyer_exchanges + self.seller_exchanges)
+        # Исполнение ордеров: события приватных потоков ордеров, опрос по REST как запасной путь
+        self.fills = FillTracker(self.get_stream_client, self.buyer_exchanges + self.seller_exchanges)
+
+        # Резерв капитала по биржам под параллельные сделки (VENUE_CAPITAL - капитал каждой биржи, USDT)
+        venue_capital = os.getenv('VENUE_CAPITAL')
+        self.capital = CapitalReservations(
+            {venue: float(venue_capital) for venue in self.buyer_exchanges + self.seller_exchanges}
+            if venue_capital else None
+        )
+
+        # Бумажная торговля: DRY_RUN=1 - ордера исполняются по живым стаканам на виртуальных счетах
+        self.dry_run = os.getenv('DRY_RUN', '0') == '1'
+        self.paper = PaperBroker(
+            self.fetch_order_book, self.buyer_exchanges + self.seller_exchanges,
+            initial_balance=float(os.getenv('PAPER_BALANCE', '1000')),
+            slippage_bps=float(os.getenv('PAPER_SLIPPAGE_BPS', '0')),
+        ) if self.dry_run else None
+
+        # Журнал сделок (SQLite): сигналы, цены, проверки, ноги сделок и задержки этапов
+        self.journal = TradeJournal(os.getenv('JOURNAL_PATH', JOURNAL_PATH), paper=self.dry_run)
+
+        # Индекс рынков с фоновым обновлением и таблицей маршрутов покупка -> продажа
+        self.markets = MarketIndex(self.get_exchange, self.buyer_exchanges, self.seller_exchanges,
+                                   default_ttl=timedelta(minutes=5).total_seconds(), ttl=self.markets_ttl)
+
+        # Сканер спредов по всем маршрутам (SCANNER=1): найденное идет в ту же очередь, что и сигналы
+        self.scanner_enabled = os.getenv('SCANNER', '0') == '1'
+        self.scanner = OpportunityScanner(
+            self.get_exchange, self.markets, self.fetch_order_book, self.on_opportunity, lambda: self.deposit,
+            min_spread=float(os.getenv('SCANNER_MIN_SPREAD', '0.005')),
+            interval=float(os.getenv('SCANNER_INTERVAL', '5')),
+            top_n=int(os.getenv('SCANNER_TOP_N', '20')),
+            workers=int(os.getenv('SCANNER_WORKERS')) if os.getenv('SCANNER_WORKERS') else None,
+        )
         
-        print(f"🔍 Запуск бота с депозитом ${self.deposit} | "
-              f"Проверка {'включена' if self.use_validation else 'выключена'} | "
-              f"{'Одновременные сделки' if self.simultaneously else 'Последовательные сделки'}")
+        if self.dry_run:
+            log.info("📝 Бумажная торговля: реальные ордера не отправляются")
+        log.info(f"🔍 Запуск бота с депозитом ${self.deposit} | "
+                 f"Проверка {'включена' if self.use_validation else 'выключена'} | "
+                 f"{'Одновременные сделки' if self.simultaneously else 'Последовательные сделки'}")
 
     def get_exchange(self, exchange_name: str):
         """Получить или создать экземпляр биржи"""
         if exchange_name not in self.exchanges:
             if exchange_name in self.exchange_configs:
                 config = self.exchange_configs[exchange_name]
-                self.exchanges[exchange_name] = config['class'](config['params'])
+                self.exchanges[exchange_name] = self.rate_limiter.install(config['class'](config['params']),
+                                                                         exchange_name)
             else:
                 raise ValueError(f"Неизвестная биржа: {exchange_name}")
         return self.exchanges[exchange_name]
 
-    def get_markets(self, exchange_name: str) -> List[str]:
-        """Получить список доступных символов для биржи с кэшированием"""
-        current_time = datetime.now()
-        
-        # Проверяем, нужно ли обновить кэш
-        if (self.markets_cache_time is None or 
-            current_time - self.markets_cache_time > self.cache_duration):
-            self.markets_cache = {}
-            self.markets_cache_time = current_time
-        
-        if exchange_name not in self.markets_cache:
-            try:
-                exchange = self.get_exchange(exchange_name)
-                markets = exchange.load_markets()
-                self.markets_cache[exchange_name] = list(markets.keys())
-                print(f"Загружены рынки для {exchange_name}: {len(self.markets_cache[exchange_name])} символов")
-            except Exception as e:
-                print(f"Ошибка загрузки рынков для {exchange_name}: {e}")
-                self.markets_cache[exchange_name] = []
-        
-        return self.markets_cache[exchange_name]
+    def get_stream_client(self, exchange_name: str):
+        """Клиент ccxt.pro для приватных потоков биржи (рынки берутся у REST-клиента)"""
+        if exchange_name not in self.stream_exchanges:
+            config = self.exchange_configs[exchange_name]
+            client = self.rate_limiter.install(getattr(ccxtpro, exchange_name)(config['params']), exchange_name)
+            rest = self.get_exchange(exchange_name)
+            if rest.markets:
+                client.set_markets(rest.markets)
+            self.stream_exchanges[exchange_name] = client
+        return self.stream_exchanges[exchange_name]
 
-    def calculate_prices(self, symbol: str, buy_exchange: str, sell_exchange: str) -> Tuple[Optional[float], Optional[float]]:
-        """Рассчитать цены покупки и продажи"""
-        buy_price = None
-        sell_price = None
-        
+    def get_http_session(self, exchange_name: str = 'default') -> RetryingSession:
+        """Пуловая keep-alive HTTP-сессия биржи для прямых REST-запросов"""
+        return self.http.session(exchange_name)
+
+    async def close(self):
+        """Закрыть соединения бирж и HTTP-сессию"""
+        await self.heartbeat.close()
+        await TRACER.close()
+        await self.runtime.close()
+        await self.scanner.close()
+        await self.signal_queue.close()
+        await self.order_books.close()
+        await self.markets.close()
+        await self.borrow.close()
+        await self.balances.close()
+        await self.fills.close()
+        self.journal.close()
+        for exchange in list(self.exchanges.values()) + list(self.stream_exchanges.values()):
+            await exchange.close()
+        await self.http.close()
+
+    async def get_markets(self, exchange_name: str) -> FrozenSet[str]:
+        """Множество доступных символов биржи (обновляется в фоне до истечения TTL)"""
+        return await self.markets.get(exchange_name)
+
+    async def fetch_order_book(self, exchange_name: str, symbol: str) -> Optional[dict]:
+        """Стакан из WebSocket-кэша, при промахе - REST; None при ошибке"""
+        with span(f'book_ws.{exchange_name}'):
+            book = self.order_books.get(exchange_name, symbol)
+        if book is not None:
+            return book
+        await self.order_books.track(exchange_name, symbol)
         try:
-            # Расчет цены покупки
-            if buy_exchange in self.buyer_exchanges:
-                exchange = self.get_exchange(buy_exchange)
-                buy_price = calculate_average_buy_price(self.deposit, symbol, exchange)
-                print(f"Цена покупки на {buy_exchange}: {buy_price}")
-            
-            # Расчет цены продажи
-            if sell_exchange in self.seller_exchanges:
-                exchange = self.get_exchange(sell_exchange)
-                sell_price = calculate_average_sell_price(self.deposit, symbol, exchange)
-                print(f"Цена продажи на {sell_exchange}: {sell_price}")
-                
+            with span(f'book_rest.{exchange_name}'):
+                return await self.get_exchange(exchange_name).fetch_order_book(symbol)
         except Exception as e:
-            print(f"Ошибка расчета цен: {e}")
+            log.error(f"Ошибка получения стакана: {e}", venue=exchange_name, symbol=symbol)
+            return None
+
+    async def calculate_prices(self, symbol: str, buy_exchange: str, sell_exchange: str,
+                               books: dict = None) -> Tuple[Optional[float], Optional[float]]:
+        """Рассчитать цены покупки и продажи по стаканам, запрошенным параллельно.
+        В books (если передан) складываются полученные стаканы: {биржа: {символ: стакан}}"""
+        buy_price = None
+        sell_price = None
+
+        async def no_book():
+            return None
+
+        buy_book, sell_book = await asyncio.gather(
+            self.fetch_order_book(buy_exchange, symbol) if buy_exchange in self.buyer_exchanges else no_book(),
+            self.fetch_order_book(sell_exchange, symbol) if sell_exchange in self.seller_exchanges else no_book(),
+        )
+        if books is not None:
+            books.update({name: {symbol: book} for name, book in ((buy_exchange, buy_book), (sell_exchange, sell_book))
+                          if book is not None})
+        
+        # Расчет цены покупки
+        if buy_book is not None:
+            with span('price_calc'):
+                buy_price = calculate_average_buy_price(self.deposit, symbol, buy_book)
+            log.info("Цена покупки", venue=buy_exchange, symbol=symbol, price=buy_price)
+        
+        # Расчет цены продажи
+        if sell_book is not None:
+            with span('price_calc'):
+                sell_price = calculate_average_sell_price(self.deposit, symbol, sell_book)
+            log.info("Цена продажи", venue=sell_exchange, symbol=symbol, price=sell_price)
         
         return buy_price, sell_price
 
@@ -156,7 +281,7 @@ class ArbitrageBot:
         
         for exchange_name in exchanges_to_check:
             if exchange_name not in self.exchange_configs:
-                print(f"❌ Неизвестная биржа: {exchange_name}")
+                log.error(f"❌ Неизвестная биржа: {exchange_name}")
                 return False
             
             config = self.exchange_configs[exchange_name]
@@ -165,287 +290,481 @@ class ArbitrageBot:
             # Проверяем наличие обязательных ключей
             for key in required_keys:
                 if not config['params'].get(key):
-                    print(f"❌ Отсутствует {key} для {exchange_name.upper()}")
+                    log.error(f"❌ Отсутствует {key} для {exchange_name.upper()}")
                     return False
             
             # Дополнительная проверка для бирж с паролем
             if exchange_name in ['bitget', 'okx', 'kucoin']:
                 if not config['params'].get('password'):
-                    print(f"❌ Отсутствует password для {exchange_name.upper()}")
+                    log.error(f"❌ Отсутствует password для {exchange_name.upper()}")
                     return False
         
-        print("✅ API ключи валидны")
-        return True
-
-    def _sanitize_log_output(self, output: str) -> str:
-        """Очистить логи от чувствительных данных"""
-        if not output:
-            return output
-        
-        # Список паттернов для маскировки
-        sensitive_patterns = [
-            (r'api[_-]?key["\']?\s*[:=]\s*["\']?([^"\'\s]+)', r'api_key="***"'),
-            (r'secret["\']?\s*[:=]\s*["\']?([^"\'\s]+)', r'secret="***"'),
-            (r'password["\']?\s*[:=]\s*["\']?([^"\'\s]+)', r'password="***"'),
-            (r'token["\']?\s*[:=]\s*["\']?([^"\'\s]+)', r'token="***"'),
-        ]
-        
-        sanitized = output
-        for pattern, replacement in sensitive_patterns:
-            sanitized = re.sub(pattern, replacement, sanitized, flags=re.IGNORECASE)
-        
-        return sanitized
-
-    def _check_rate_limit(self, exchange_name: str) -> bool:
-        """Проверить rate limiting для API"""
-        current_time = datetime.now()
-        minute_ago = current_time - timedelta(minutes=1)
-        
-        # Очищаем старые записи
-        if exchange_name in self.api_call_times:
-            self.api_call_times[exchange_name] = [
-                call_time for call_time in self.api_call_times[exchange_name]
-                if call_time > minute_ago
-            ]
-        else:
-            self.api_call_times[exchange_name] = []
-        
-        # Проверяем лимит
-        if len(self.api_call_times[exchange_name]) >= self.max_api_calls_per_minute:
-            print(f"⚠️ Rate limit превышен для {exchange_name}")
-            return False
-        
-        # Добавляем текущий вызов
-        self.api_call_times[exchange_name].append(current_time)
+        log.info("✅ API ключи валидны")
         return True
 
-    def check_margin_availability(self, symbol: str, sell_exchange: str = None) -> bool:
+    async def check_margin_availability(self, symbol: str, sell_exchange: str = None) -> bool:
         """Проверить доступность маржинальной торговли"""
         try:
             base, quote = symbol.split("/")
             
-            # Проверка для Gate.io
-            if sell_exchange == 'gate':
-                return is_borrowable_gate(f"{base}_USDT", "https://api.gateio.ws", "/api/v4")
-            
-            # Проверка для KuCoin
-            elif sell_exchange == 'kucoin':
-                url = 'https://api.kucoin.com/api/v1/margin/config'
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()
-                data = response.json()
-                
-                if data.get("code") != "200000":
-                    print(f"Ошибка получения конфигурации маржи KuCoin: {data}")
-                    return False
-                
-                currency_list = data.get("data", {}).get("currencyList", [])
-                return base in currency_list
-            
-            # По умолчанию проверяем Gate.io (для обратной совместимости)
-            else:
-                return is_borrowable_gate(f"{base}_USDT", "https://api.gateio.ws", "/api/v4")
+            # Списки маржинальных валют Gate и KuCoin держит BorrowabilityService;
+            # по умолчанию проверяем Gate.io (для обратной совместимости)
+            venue = sell_exchange if sell_exchange in self.borrow.venues else 'gate'
+            return await self.borrow.is_borrowable(venue, base)
                 
         except Exception as e:
-            print(f"Ошибка проверки маржинальной торговли для {sell_exchange or 'gate'}: {e}")
+            log.error(f"Ошибка проверки маржинальной торговли для {sell_exchange or 'gate'}: {e}")
             return False
 
-    def validate_arbitrage(self, symbol: str, buy_exchange: str, sell_exchange: str, 
+    async def validate_arbitrage(self, symbol: str, buy_exchange: str, sell_exchange: str, 
                           buy_price: float, sell_price: float) -> bool:
         """Проверить валидность арбитражной сделки"""
-        print('🚀 Начало проверок...')
+        log.info('🚀 Начало проверок...')
         
         # Проверка 0: Валидация API ключей
-        if not self._validate_api_keys(buy_exchange, sell_exchange):
+        if not self.dry_run and not self._validate_api_keys(buy_exchange, sell_exchange):
             return False
         
         # Проверка 1: Доступность символа на биржах
         if buy_exchange not in self.buyer_exchanges:
-            print('❌ Указаны неверные биржи для покупки')
+            log.info('❌ Указаны неверные биржи для покупки', venue=buy_exchange)
             return False
             
         if sell_exchange not in self.seller_exchanges:
-            print('❌ Указаны неверные биржи для продажи')
+            log.info('❌ Указаны неверные биржи для продажи', venue=sell_exchange)
             return False
         
-        buy_markets = self.get_markets(buy_exchange)
-        sell_markets = self.get_markets(sell_exchange)
+        with span('check.markets'):
+            buy_markets, sell_markets = await asyncio.gather(
+                self.get_markets(buy_exchange), self.get_markets(sell_exchange)
+            )
         
         if symbol not in buy_markets:
-            print(f'❌ Символ не найден на бирже покупки: {buy_exchange.upper()}')
+            log.info(f'❌ Символ не найден на бирже покупки: {buy_exchange.upper()}', symbol=symbol)
             return False
             
         if symbol not in sell_markets:
-            print(f'❌ Символ не найден на бирже продажи: {sell_exchange.upper()}')
+            log.info(f'❌ Символ не найден на бирже продажи: {sell_exchange.upper()}', symbol=symbol)
             return False
         
         # Проверка 2: Прибыльность сделки
         if buy_price is None or sell_price is None:
-            print('❌ Не удалось получить цены')
+            log.info('❌ Не удалось получить цены', symbol=symbol)
             return False
             
         if buy_price >= sell_price:
-            print('❌ Проверка 2 - Сделка отклонена: нет прибыли')
+            log.info('❌ Проверка 2 - Сделка отклонена: нет прибыли', symbol=symbol,
+                     buy_price=buy_price, sell_price=sell_price)
+            return False
+
+        spread = (sell_price - buy_price) / buy_price
+        if spread < self.min_spread:
+            log.info(f'❌ Проверка 2 - Сделка отклонена: спред {spread:.2%} ниже порога {self.min_spread:.2%}',
+                     symbol=symbol, spread=round(spread, 6))
             return False
         
         # Проверка 3: Доступность маржинальной торговли
-        if not self.check_margin_availability(symbol, sell_exchange):
-            print('❌ Проверка 3 - Сделка отклонена: нет заемных средств')
+        with span('check.margin'):
+            margin_available = await self.check_margin_availability(symbol, sell_exchange)
+        if not margin_available:
+            log.info('❌ Проверка 3 - Сделка отклонена: нет заемных средств', symbol=symbol,
+                     venue=sell_exchange)
             return False
         
-        print(f'✅ Проверка 1 - символ доступен на {buy_exchange.upper()} и {sell_exchange.upper()}')
-        print('✅ Проверка 2 - цена покупки ниже цены продажи')
-        print('✅ Проверка 3 - маржинальная торговля доступна')
+        log.info(f'✅ Проверка 1 - символ доступен на {buy_exchange.upper()} и {sell_exchange.upper()}')
+        log.info('✅ Проверка 2 - цена покупки ниже цены продажи')
+        log.info('✅ Проверка 3 - маржинальная торговля доступна')
         return True
 
-    def execute_trades(self, symbol: str, buy_exchange: str, sell_exchange: str):
-        str_deposit = str(self.deposit)
+    def get_executor(self, exchange_name: str) -> TradeExecutor:
+        """Получить исполнитель сделок поверх прогретого клиента биржи (в dry run - бумажный)"""
+        if exchange_name not in self.executors:
+            if self.paper is not None:
+                self.executors[exchange_name] = self.paper.executor(exchange_name)
+            else:
+                self.executors[exchange_name] = create_executor(
+                    exchange_name, self.get_exchange(exchange_name), self.get_http_session(exchange_name),
+                    self.borrow, self.balances, self.fills,
+                )
+        return self.executors[exchange_name]
+
+    async def execute_trades(self, symbol: str, buy_exchange: str, sell_exchange: str,
+                             buy_price: float = None) -> Tuple[Optional[FillResult], Optional[FillResult]]:
+        """Исполнить арбитраж: одновременно обе ноги или последовательно; (покупка, продажа)"""
+        if self.simultaneously and buy_price:
+            return await self._execute_simultaneously(symbol, buy_exchange, sell_exchange, buy_price)
+        return await self._execute_sequentially(symbol, buy_exchange, sell_exchange)
+
+    async def _execute_sequentially(self, symbol: str, buy_exchange: str, sell_exchange: str):
         # Покупка
-        filled_amount = self._run_trade_script(buy_exchange, symbol, str_deposit, "Покупка", wait=True)
+        buy_result = await self._run_executor(buy_exchange, symbol, "Покупка")
         # Продажа с передачей количества купленных монет
-        if filled_amount:
-            self._run_trade_script(sell_exchange, symbol, str_deposit, "Продажа", wait=False, filled_amount=filled_amount)
+        if buy_result and buy_result.success and buy_result.filled:
+            log.info("📊 Получено количество монет", symbol=symbol, filled=buy_result.filled)
+            sell_result = await self._run_executor(sell_exchange, symbol, "Продажа", filled_amount=buy_result.filled)
+            return buy_result, sell_result
+        log.error("❌ Не удалось получить количество купленных монет", symbol=symbol)
+        return buy_result, None
+
+    async def _execute_simultaneously(self, symbol: str, buy_exchange: str, sell_exchange: str,
+                                      buy_price: float):
+        """Отправить обе ноги одновременно; объём продажи - целевое количество по цене покупки"""
+        target_amount = self._target_amount(symbol, sell_exchange, self.deposit / buy_price)
+        log.info("⚡ Одновременное исполнение", symbol=symbol, buy_venue=buy_exchange, sell_venue=sell_exchange,
+                 deposit=self.deposit, sell_amount=target_amount)
+
+        buy_result, sell_result = await asyncio.gather(
+            self._run_executor(buy_exchange, symbol, "Покупка"),
+            self._run_executor(sell_exchange, symbol, "Продажа", target_amount),
+        )
+        with span('reconcile'):
+            await self._reconcile(symbol, buy_exchange, sell_exchange, buy_result, sell_result, buy_price)
+        return buy_result, sell_result
+
+    def _target_amount(self, symbol: str, exchange_name: str, amount: float) -> float:
+        """Округлить целевое количество под шаг биржи продажи"""
+        try:
+            return float(self.get_exchange(exchange_name).amount_to_precision(symbol, amount))
+        except Exception:
+            return round(amount, 6)
+
+    async def _reconcile(self, symbol: str, buy_exchange: str, sell_exchange: str,
+                   buy_result: Optional[FillResult], sell_result: Optional[FillResult], buy_price: float):
+        """Выровнять позиции после одновременного исполнения"""
+        bought = buy_result.filled if buy_result and buy_result.success else 0.0
+        sold = sell_result.filled if sell_result and sell_result.success else 0.0
+        diff = bought - sold
+        log.info("📊 Сверка", symbol=symbol, bought=bought, sold=sold, diff=diff)
+
+        if not bought and not sold:
+            log.error("❌ Сверка: обе ноги не исполнены, выравнивать нечего", symbol=symbol)
+            return
+
+        if abs(diff) <= max(bought, sold) * self.reconcile_tolerance:
+            log.info("✅ Позиции совпадают")
+            return
+
+        if diff > 0:
+            # Куплено больше, чем продано - докидываем продажу на бирже продажи
+            amount = self._target_amount(symbol, sell_exchange, diff)
+            result = await self._run_executor(sell_exchange, symbol, "Довыравнивание продажи", filled_amount=amount)
         else:
-            print("❌ Не удалось получить количество купленных монет")
+            # Продано больше, чем куплено - докупаем недостающее на бирже покупки
+            result = await self._run_executor(buy_exchange, symbol, "Довыравнивание покупки",
+                                        deposit=-diff * buy_price)
 
-    def _run_trade_script(self, exchange: str, symbol: str, deposit: str, 
-                         operation: str, wait: bool = False, filled_amount: float = None):
-        """Запустить торговый скрипт"""
+        if result and result.success:
+            log.info("✅ Расхождение закрыто", symbol=symbol, venue=result.exchange, filled=result.filled)
+        else:
+            log.error("❌ Не удалось выровнять позиции", symbol=symbol, diff=diff)
+
+    async def _run_executor(self, exchange: str, symbol: str, operation: str,
+                      filled_amount: float = None, deposit: float = None) -> Optional[FillResult]:
+        """Исполнить ногу сделки внутри процесса"""
         try:
-            # Валидация параметров для предотвращения command injection
-            if not re.match(r'^[a-z]+$', exchange):
-                print(f"❌ Недопустимое имя биржи: {exchange}")
-                return None
-            
             if not re.match(r'^[A-Z0-9]+/[A-Z0-9]+$', symbol):
-                print(f"❌ Недопустимый символ: {symbol}")
+                log.error(f"❌ Недопустимый символ: {symbol}")
                 return None
-                
-            if not re.match(r'^\d+$', deposit):
-                print(f"❌ Недопустимый депозит: {deposit}")
-                return None
-            
-            script_path = f'./src/{exchange}.py'
-            print(f"🚀 {operation} - Запуск {exchange}.py...")
-            
-            cmd = ['python3', script_path, symbol, deposit]
-            if filled_amount is not None:
-                if not isinstance(filled_amount, (int, float)) or filled_amount < 0:
-                    print(f"❌ Недопустимое количество: {filled_amount}")
-                    return None
-                cmd.append(str(filled_amount))
-            
-            # Безопасное выполнение с ограничениями
-            process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.PIPE, 
-                text=True,
-                cwd=os.getcwd(),  # Ограничиваем рабочую директорию
-                env=os.environ    # Передаем только безопасные переменные окружения
-            )
-            
-            if wait:
-                stdout, stderr = process.communicate()
-                success = process.returncode == 0
-                
-                # Безопасное логирование (скрываем чувствительные данные)
-                safe_stdout = self._sanitize_log_output(stdout)
-                print(f"📋 {exchange}.py stdout:\n{safe_stdout}")
-                if stderr:
-                    safe_stderr = self._sanitize_log_output(stderr)
-                    print(f"📋 {exchange}.py stderr:\n{safe_stderr}")
-                print(f"📋 {exchange}.py return code: {process.returncode}")
-                
-                if not success:
-                    print(f"⚠️ {exchange}.py завершился с ошибкой")
-                    if stderr:
-                        print(f"Ошибка: {stderr}")
-                    return None
-                
-                # Извлекаем количество купленных монет из вывода
-                for line in stdout.split('\n'):
-                    if line.startswith('FILLED_AMOUNT:'):
-                        try:
-                            amount = float(line.split(':', 1)[1])
-                            print(f"📊 Получено количество монет: {amount}")
-                            return amount
-                        except (ValueError, IndexError) as e:
-                            print(f"⚠️ Не удалось извлечь количество монет из вывода: {e}")
-                            print(f"⚠️ Проблемная строка: {line}")
-                            return None
-                
-                print("⚠️ Количество монет не найдено в выводе")
-                print("⚠️ Доступные строки вывода:")
-                for i, line in enumerate(stdout.split('\n')):
-                    if line.strip():
-                        print(f"  {i}: {line}")
+
+            if filled_amount is not None and filled_amount < 0:
+                log.error(f"❌ Недопустимое количество: {filled_amount}")
                 return None
-            else:
-                return True
-                
+
+            executor = self.get_executor(exchange)
+            log.info(f"🚀 {operation} - {exchange.upper()}...", venue=exchange, symbol=symbol)
+            started = time.perf_counter()
+            side = 'buy' if exchange in self.buyer_exchanges else 'sell'
+            result = None
+            try:
+                with span(f'order.{exchange}'):
+                    if side == 'buy':
+                        result = await executor.buy(symbol, deposit or self.deposit)
+                    else:
+                        result = await executor.sell(symbol, deposit or self.deposit, filled_amount)
+            finally:
+                self.journal.fill(operation, exchange, symbol, side, result,
+                                  round((time.perf_counter() - started) * 1000, 3))
+
+            if not result.success:
+                log.warning(f"⚠️ {exchange.upper()} - {operation} завершилась с ошибкой", venue=exchange, symbol=symbol,
+                            error=result.error)
+            return result
+
         except Exception as e:
-            print(f"⚠️ Ошибка запуска {exchange}.py: {e}")
+            log.exception(f"⚠️ Ошибка исполнения на {exchange}: {e}", venue=exchange, symbol=symbol)
             return None
 
     async def handle_message(self, event):
         """Обработать входящее сообщение"""
         current_time = datetime.now()
-        print("TELETHON - 📨 Новое сообщение от @ArbitrageSmartBot")
-        
-        # Проверка интервала между сигналами
-        if (self.last_signal_time and 
-            (current_time - self.last_signal_time) < self.min_interval):
-            print(f"TELETHON - ⏳ Сигнал проигнорирован: слишком частые сообщения "
-                  f"(интервал < {self.min_interval.seconds} сек)")
-            return
+        trace = start_trace('signal')  # отсчет задержек от прихода сообщения
+        log.info("TELETHON - 📨 Новое сообщение от @ArbitrageSmartBot")
         
-        sender = await event.get_sender()
+        with span('telegram.sender'):
+            sender = await event.get_sender()
         
         if not (sender.bot and not event.fwd_from):
-            print("TELETHON - ⏭️ Сообщение проигнорировано (не от бота)")
+            log.info("TELETHON - ⏭️ Сообщение проигнорировано (не от бота)")
             return
         
-        self.last_signal_time = current_time
         text = event.message.message
-        
-        # Извлечение данных из сообщения
-        symbol = extract_symbol(text)
-        buy_exchange, sell_exchange = extract_exchange(text)
-        
-        if not symbol:
-            print("TELETHON - ❌ Символ не найден в сообщении")
+        route = self.parse_signal(text, current_time)
+        if route:
+            self.signal_queue.submit(route, (text, current_time, trace, time.perf_counter_ns()))
+
+    async def on_opportunity(self, symbol: str, buy_exchange: str, sell_exchange: str, spread: float):
+        """Возможность от сканера - в очередь сигналов в формате сообщения @ArbitrageSmartBot"""
+        current_time = datetime.now()
+        trace = start_trace('scanner')
+        text = (f"🔎 {symbol}\nExchanges: {buy_exchange.upper()}→{sell_exchange.upper()}\n"
+                f"Spread: {spread * 100:.2f}%")
+        route = self.parse_signal(text, current_time)
+        if route:
+            self.signal_queue.submit(route, (text, current_time, trace, time.perf_counter_ns()))
+
+    def runtime_values(self) -> dict:
+        """Текущие значения настроек, которые можно менять на ходу"""
+        return {
+            'deposit': self.deposit,
+            'use_validation': self.use_validation,
+            'simultaneously': self.simultaneously,
+            'min_spread': self.min_spread,
+            'min_interval': self.min_interval.total_seconds(),
+            'reconcile_tolerance': self.reconcile_tolerance,
+            'venues': sorted(self.enabled_venues),
+            'scanner_min_spread': self.scanner.min_spread,
+        }
+
+    def apply_config(self, config: dict):
+        """Применить настройки из общей конфигурации без перезапуска"""
+        current = self.runtime_values()
+        changed = {name: value for name, value in config.items() if name in current and current[name] != value}
+        if not changed:
             return
+        for name, value in changed.items():
+            if name == 'min_interval':
+                self.min_interval = timedelta(seconds=value)
+            elif name == 'venues':
+                self.enabled_venues = frozenset(value)
+            elif name == 'scanner_min_spread':
+                self.scanner.min_spread = value
+            else:
+                setattr(self, name, value)
+        log.info("⚙️ Настройки обновлены", **changed)
+
+    def parse_signal(self, text: str, received_at: datetime) -> Optional[Tuple[str, str, str]]:
+        """Разбор сигнала и пауза по маршруту; (символ, биржа покупки, биржа продажи) или None"""
+        config = self.runtime.poll()  # изменения из панели - до разбора сигнала
+        if config is not None:
+            self.apply_config(config)
+        # Извлечение данных из сообщения
+        with span('parse'):
+            signal = parse_message(text)
         
-        print(f"💱 Найден символ: {symbol}")
-        print(f"📊 Биржа покупки: {buy_exchange.upper()} → Биржа продажи: {sell_exchange.upper()}")
+        if signal is None or not signal.symbol:
+            log.info("TELETHON - ❌ Символ не найден в сообщении")
+            return None
+
+        if not signal.buy_exchange or not signal.sell_exchange:
+            log.info("TELETHON - ❌ Биржи не найдены в сообщении", symbol=signal.symbol)
+            return None
+
+        disabled = [venue for venue in (signal.buy_exchange, signal.sell_exchange) if venue not in self.enabled_venues]
+        if disabled:
+            log.info(f"TELETHON - ⏸️ Сигнал {signal.symbol} пропущен: биржа выключена в настройках",
+                     symbol=signal.symbol, venues=disabled)
+            return None
         
-        # Расчет цен
-        buy_price, sell_price = self.calculate_prices(symbol, buy_exchange, sell_exchange)
+        # Проверка интервала между сигналами по одному маршруту
+        route = signal.route
+        symbol, buy_exchange, sell_exchange = route
+        last_signal_time = self.last_signal_times.get(route)
+        if last_signal_time and (received_at - last_signal_time) < self.min_interval:
+            log.info(f"TELETHON - ⏳ Сигнал {symbol} проигнорирован: слишком частые сообщения "
+                     f"(интервал < {self.min_interval.seconds} сек)")
+            return None
+        self.last_signal_times[route] = received_at
         
-        # Выполнение сделок
-        if self.use_validation:
-            if self.validate_arbitrage(symbol, buy_exchange, sell_exchange, buy_price, sell_price):
-                self.execute_trades(symbol, buy_exchange, sell_exchange)
-        else:
-            print('🚀 Запуск без проверок...')
-            self.execute_trades(symbol, buy_exchange, sell_exchange)
+        log.info(f"💱 Найден символ: {symbol}", symbol=symbol)
+        log.info(f"📊 Биржа покупки: {buy_exchange.upper()} → Биржа продажи: {sell_exchange.upper()}",
+                 symbol=symbol, buy_venue=buy_exchange, sell_venue=sell_exchange, signal_spread=signal.spread)
+        return route
+
+    async def on_signal(self, text: str, received_at: datetime) -> bool:
+        """Разбор и обработка сигнала без очереди; received_at - время прихода
+        (при воспроизведении - записанное). True, если дело дошло до исполнения"""
+        route = self.parse_signal(text, received_at)
+        if not route:
+            return False
+        return await self.run_signal(*route, text, received_at)
 
-    async def start(self):
-        """Запустить бота"""
+    async def _process_queued(self, route: Tuple[str, str, str], item: tuple):
+        """Обработчик очереди сигналов: продолжает трассу сигнала в задаче очереди"""
+        text, received_at, trace, queued_ns = item
+        attach(trace)
+        record('queue_wait', queued_ns)
+        await self.run_signal(*route, text, received_at)
+
+    async def run_signal(self, symbol: str, buy_exchange: str, sell_exchange: str, text: str,
+                         received_at: datetime) -> bool:
+        """Обработка сигнала под блокировкой символа с закрытием трассы"""
+        async with self.symbol_locks[symbol]:
+            entry = self.journal.open_signal(symbol, buy_exchange, sell_exchange, text, received_at)
+            try:
+                return await self.process_signal(symbol, buy_exchange, sell_exchange, text, received_at)
+            except Exception:
+                entry.outcome = 'error'
+                raise
+            finally:
+                self.journal.close_signal(entry, finish_trace())
+
+    async def process_signal(self, symbol: str, buy_exchange: str, sell_exchange: str, text: str = None,
+                             received_at: datetime = None) -> bool:
+        """Расчет цен, проверки и исполнение сделки по сигналу; True, если исполнена хотя бы одна нога"""
+        books = {} if self.signal_recorder is not None else None
+        # Депозит резервируется на обеих биржах, пока сделка исполняется
+        reservation = {buy_exchange: self.deposit, sell_exchange: self.deposit}
+        reserved = False
+        try:
+            while True:
+                with span('prices'):
+                    buy_price, sell_price = await self.calculate_prices(symbol, buy_exchange, sell_exchange, books)
+                note(buy_price=buy_price, sell_price=sell_price)
+
+                if self.use_validation:
+                    with span('validate'):
+                        valid = await self.validate_arbitrage(symbol, buy_exchange, sell_exchange, buy_price, sell_price)
+                    note(valid=valid)
+                    if not valid:
+                        note(outcome='rejected')
+                        return False
+                else:
+                    log.info('🚀 Запуск без проверок...')
+                if reserved or self.capital.reserve(reservation):
+                    reserved = True
+                    break
+                # Капитал занят другими сделками: сигнал ждет освобождения, пока актуален,
+                # после ожидания цены и проверка повторяются - за это время они могли уйти
+                ttl = self.signal_ttl
+                if received_at is not None:
+                    ttl -= (datetime.now() - received_at).total_seconds()
+                log.info(f"⏸️ Капитал {buy_exchange.upper()}/{sell_exchange.upper()} занят другими сделками, "
+                         f"сигнал {symbol} ждет до {max(ttl, 0):.1f} сек", symbol=symbol)
+                with span('capital_wait'):
+                    reserved = await self.capital.acquire(reservation, ttl)
+                if not reserved:
+                    log.info(f"⏸️ Сигнал {symbol} пропущен: капитал не освободился, пока сигнал был актуален",
+                             symbol=symbol)
+                    note(outcome='capital_busy')
+                    return False
+
+            # Выполнение сделок; исход - по исполненным ногам: обе, одна (partial) или ни одной (failed)
+            legs = await self.execute_trades(symbol, buy_exchange, sell_exchange, buy_price)
+            filled = sum(1 for result in legs if result is not None and result.success and result.filled)
+            note(outcome='executed' if filled == len(legs) else 'partial' if filled else 'failed')
+            return filled > 0
+        finally:
+            if reserved:
+                self.capital.release(reservation)
+            # Запись - после исполнения, чтобы не добавлять задержку перед ордерами
+            if books is not None:
+                self.signal_recorder.record(text, books, received_at=received_at)
+            if self.paper is not None:
+                self.paper.save()
+
+    def health(self) -> dict:
+        """Состояние для файла BOT_STATUS: роль, готовность, Telegram, очередь сигналов"""
+        return {
+            'role': self.role,
+            'ready': self.ready,
+            'telegram': self.client.is_connected(),
+            'signals': self.signal_queue.processed,
+            'queued': len(self.signal_queue.pending),
+        }
+
+    async def warm_up(self):
+        """Прогрев резерва: клиенты бирж, рынки, списки займа и исполнители - все, кроме Telegram"""
+        self.markets.start()
+        self.borrow.start()
+        await asyncio.gather(*(self.markets.get(name) for name in self.markets.exchanges))
+        for name in self.buyer_exchanges + self.seller_exchanges:
+            self.get_executor(name)
+        self.ready = True
+        log.info("🟡 Резервный бот прогрет и ждет команды супервизора")
+
+    async def wait_for_promotion(self) -> bool:
+        """Ждать строку 'start' от супервизора в stdin; False - stdin закрыт (супервизора нет)"""
+        loop = asyncio.get_running_loop()
+        promoted = loop.create_future()
+
+        def read_commands():
+            for line in sys.stdin:
+                if line.strip() == 'start':
+                    loop.call_soon_threadsafe(promoted.set_result, True)
+                    return
+            loop.call_soon_threadsafe(promoted.set_result, False)
+
+        threading.Thread(target=read_commands, name='standby', daemon=True).start()
+        return await promoted
+
+    async def start(self, standby: bool = False):
+        """Запустить бота. standby - резерв супервизора: прогреться без входа в Telegram
+        и ждать команды; до нее общие настройки не трогаются"""
         @self.client.on(events.NewMessage(chats='ArbitrageSmartBot'))
         async def handler(event):
             await self.handle_message(event)
         
-        await self.client.start()
-        print("TELETHON - 🔍 Отслеживание сообщений от @ArbitrageSmartBot...")
-        await self.client.run_until_disconnected()
+        self.role = 'standby' if standby else 'starting'
+        self.heartbeat.start()
+        TRACER.start()  # сводка задержек в latency.json раз в секунду, вне пути сигнала
+        self.markets.load_snapshot()  # рынки из снимка на диске - без сети; свежие догрузятся в фоне
+        self.http.start()  # TLS-рукопожатия с Gate и KuCoin - пока идет вход в Telegram
+        try:
+            if standby:
+                await self.warm_up()
+                if not await self.wait_for_promotion():
+                    return
+                log.info("🟢 Резервный бот переведен в работу")
+            # Общая конфигурация с панелью - главная при любом запуске (холодном, перезапуске после сбоя,
+            # переводе резерва): сначала применяется то, что панель записала, пока бот не работал;
+            # окружение (DEPOSIT, CHECK_ENABLED) дописывает только поля, которых в файле еще нет
+            try:
+                if self.runtime.open():
+                    config = self.runtime.read()
+                    self.apply_config(config)
+                    missing = {name: value for name, value in self.runtime_values().items() if name not in config}
+                    if missing:
+                        self.runtime.update(**missing)
+                    self.runtime.start(self.apply_config)
+            except (OSError, ValueError) as e:
+                log.warning(f"⚠️ Общая конфигурация недоступна, настройки только из окружения: {e}")
+            self.signal_queue.start()
+            await self.client.start()
+            self.markets.start()
+            self.borrow.start()
+            if self.scanner_enabled:
+                self.scanner.start()
+            if self.paper is None:
+                self.balances.start()  # в dry run балансы ведет PaperBroker
+                self.fills.start()
+            self.role, self.ready = 'active', True
+            self.heartbeat.save()
+            log.info("TELETHON - 🔍 Отслеживание сообщений от @ArbitrageSmartBot...")
+            await self.client.run_until_disconnected()
+        finally:
+            await self.client.disconnect()
+            await self.close()
 
 def main():
     """Главная функция"""
-    bot = ArbitrageBot()
-    with bot.client:
-        bot.client.loop.run_until_complete(bot.start())
+    # JSON-лог с ротацией (его читает панель); LOG_CONSOLE=0 - без дублирования в stdout
+    setup_logging(os.getenv('LOG_FILE', LOG_PATH), console=os.getenv('LOG_CONSOLE', '1') == '1')
+    try:
+        bot = ArbitrageBot()
+        # BOT_STANDBY=1 - резерв супервизора панели (src/supervisor.py)
+        bot.client.loop.run_until_complete(bot.start(standby=os.getenv('BOT_STANDBY', '0') == '1'))
+    finally:
+        shutdown_logging()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file